@@ -0,0 +1,84 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import click
+
+from benchmarks.cases import ALL_CASES, BenchContext
+from benchmarks.harness import compare, environment, load_results, load_thresholds, measure
+
+LOGGER: logging.Logger = logging.getLogger()
+DEFAULT_DB_SIZES = "10000,100000"
+
+
+@click.command()
+@click.option("--baseline", help="Results to compare with", default="benchmarks/baseline.json")
+@click.option("--thresholds", help="Allowed slowdown per benchmark", default="benchmarks/thresholds.yaml")
+@click.option("--output_dir", help="Where the results of every run are kept", default="benchmarks/results")
+@click.option("--save_baseline", default=False, is_flag=True, help="Make this run the new baseline")
+@click.option("--db_sizes", help="Table sizes for the db benchmarks", default=DEFAULT_DB_SIZES)
+@click.option("--only", help="Only run the benchmarks whose name contains this", default="")
+def run(baseline: str, thresholds: str, output_dir: str, save_baseline: bool, db_sizes: str, only: str):
+    """
+    Runs the offline benchmarks (recorded pages, canned TFL answers, nothing goes over the network), stores the results
+    and compares them with the baseline. Exits with 1 if anything got slower (or, for the memory ones, bigger) than its
+    threshold allows.
+    """
+    if save_baseline and (only or db_sizes != DEFAULT_DB_SIZES):
+        # a baseline is one whole run: patching some of its entries would mix commits and machines
+        raise click.UsageError("--save_baseline records every benchmark: drop --only and --db_sizes")
+    LOGGER.setLevel(logging.WARNING)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        context = BenchContext(directory, [int(size) for size in db_sizes.split(",") if size])
+        for cases in ALL_CASES:
+            for benchmark in cases(context):
+                if only not in benchmark.name:
+                    continue
+                results[benchmark.name] = measure(benchmark)
+                result = results[benchmark.name]
+                click.echo(f"{benchmark.name:<32} {_format(result['median'], result.get('unit'))}")
+    current = {'environment': environment(), 'results': results}
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, time.strftime("%Y%m%d-%H%M%S.json")), "w") as f:
+        json.dump(current, f, indent=2)
+    if save_baseline:
+        with open(baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        click.echo(f"Saved as the new baseline in {baseline}")
+        return
+
+    previous = load_results(baseline)
+    if previous is None:
+        click.echo(f"No baseline in {baseline}. Run with --save_baseline to create one")
+        return
+    click.echo(f"\nCompared with the baseline from {previous['environment'].get('time')} "
+               f"(commit {previous['environment'].get('commit')})")
+    comparisons = compare(previous, current, load_thresholds(thresholds))
+    for comparison in comparisons:
+        verdict = "REGRESSION" if comparison.regressed else "ok"
+        unit = results[comparison.name].get('unit')
+        click.echo(f"{comparison.name:<32} {_format(comparison.baseline, unit)} -> {_format(comparison.current, unit)} "
+                   f"x{comparison.ratio:.2f} (allowed x{1 + comparison.threshold:.2f}) {verdict}")
+    regressions = [comparison.name for comparison in comparisons if comparison.regressed]
+    if regressions:
+        click.echo(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def _format(seconds: float, unit: str = None) -> str:
+    if unit == "bytes":
+        return f"{seconds / 1024:9.2f} KiB"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:9.2f} ms"
+    return f"{seconds:9.2f} s "
+
+
+if __name__ == '__main__':
+    run()
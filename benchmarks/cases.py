@@ -0,0 +1,271 @@
+import copy
+import dataclasses
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from typing import Callable, Dict, List
+
+import yaml
+from bs4 import BeautifulSoup
+
+from app import App
+from app_config import AppConfig
+from benchmarks.harness import Benchmark
+from db import DbConnOrm
+from http_client import FetchResult, Validators
+from keywords import KeywordMatcher
+from openrent_bs import OpenRentBeautifulSoup
+from openrent_http_search import SEARCH_PATH, extract_property_ids
+from property import Property
+from property_query import parse_query
+from scoring import ScoreBreakdown, Scoring
+from search_config import Crawler, SearchConfig
+from seen_properties import SeenProperties
+from slack_client import Slack
+from tfl_cache import TflJourneyCache
+from tfl_helper import TflHelper
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# what `python <script>.py` has to import before it can do anything (even print --help)
+SCRIPTS = ["main", "daemon", "rescore", "reparse", "query", "build_commute_matrix"]
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+# the pipeline writes in batches of this many (storage.write_batch_size)
+WRITE_BATCH = 50
+LOOKUP_IDS = 1000
+# listings built per memory sample
+MEMORY_LISTINGS = 200
+QUERY = parse_query("score > 70 AND 'south facing' within £2200")
+
+
+def _fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+class FakeHttpClient:
+    """
+    Answers search urls with the recorded search page and everything else with the recorded property page.
+    """
+
+    def __init__(self) -> None:
+        self.search_html = _fixture("search.html")
+        self.property_html = _fixture("property.html")
+
+    def get(self, url: str, validators: Validators = None, params: dict = None) -> FetchResult:
+        html_doc = self.search_html if SEARCH_PATH in url else self.property_html
+        return FetchResult(url, 200, html_doc, Validators())
+
+    def close(self) -> None:
+        pass
+
+
+class FakeTflResponse:
+    def __init__(self, text: str) -> None:
+        self.status_code = 200
+        self.text = text
+
+
+class FakeTflClient:
+    """
+    Stands in for tfl's RestClient: every journey gets the recorded journey planner answer.
+    """
+
+    def __init__(self) -> None:
+        self.response = FakeTflResponse(_fixture("tfl_journey.json"))
+
+    def send_request(self, path: str, params: dict = None) -> FakeTflResponse:
+        return self.response
+
+
+class FakeSlackClient:
+    def chat_postMessage(self, **kwargs) -> None:
+        pass
+
+
+class BenchContext:
+    """
+    What the cases share: the search config, a scratch directory and the dbs prefilled for the lookup benchmarks.
+    """
+
+    def __init__(self, directory: str, db_sizes: List[int]) -> None:
+        self.directory = directory
+        self.db_sizes = db_sizes
+        with open(CONFIG) as f:
+            self.search_config = SearchConfig.from_dict(yaml.safe_load(f))
+        # nothing but the benchmark should touch the disk
+        self.search_config.storage.keep_raw_html = False
+        self.search_config.metrics.prometheus_file = ""
+        self.search_config.metrics.summary_file = ""
+        self.search_config.tfl.commute_matrix.enabled = False
+        self.parser = OpenRentBeautifulSoup(Crawler(), FakeHttpClient())
+        self.details = self.parser.parse_property_html(1, "https://www.openrent.co.uk/1", _fixture("property.html"))
+        self.filled_dbs: Dict[int, DbConnOrm] = {}
+
+    def tfl(self) -> TflHelper:
+        tfl = TflHelper("", "", self.search_config.tfl)
+        tfl.client = FakeTflClient()
+        return tfl
+
+    def new_db(self) -> DbConnOrm:
+        return DbConnOrm(tempfile.mktemp(suffix=".db", dir=self.directory))
+
+    def properties(self, count: int, first_id: int = 1) -> List[Property]:
+        rng = random.Random(first_id)
+        properties = []
+        for property_id in range(first_id, first_id + count):
+            new_property = Property(property_id, self.parser)
+            new_property.property_details = dataclasses.replace(self.details, property_id=property_id,
+                                                                price=float(rng.randrange(1400, 4200, 25)))
+            new_property.score = rng.randrange(0, 100)
+            new_property.score_reasons = ["* Has garden"]
+            new_property.score_breakdown = ScoreBreakdown(new_property.score, new_property.score_reasons,
+                                                          {'price': 1.}, {"Bond Street": 34})
+            new_property.validators = Validators(etag=f'"{property_id}"')
+            properties.append(new_property)
+        return properties
+
+    def filled_db(self, size: int) -> DbConnOrm:
+        if size not in self.filled_dbs:
+            db = self.new_db()
+            properties = self.properties(size)
+            for start in range(0, size, 1000):
+                db.upsert_properties(properties[start:start + 1000])
+            self.filled_dbs[size] = db
+        return self.filled_dbs[size]
+
+
+def parsing_cases(context: BenchContext) -> List[Benchmark]:
+    html_doc = _fixture("property.html")
+    url = "https://www.openrent.co.uk/1623907"
+    soup_parser = OpenRentBeautifulSoup(Crawler(parser="beautifulsoup"), FakeHttpClient())
+    fast_parser = OpenRentBeautifulSoup(Crawler(parser="fast"), FakeHttpClient())
+    soup = BeautifulSoup(html_doc, 'lxml')
+    OpenRentBeautifulSoup._preprocess(soup)
+    features = OpenRentBeautifulSoup._parse_feature_table(soup)
+    search_html = _fixture("search.html")
+    return [
+        Benchmark("parse_property_data", lambda _: soup_parser.parse_property_data(1623907, url), number=20),
+        Benchmark("parse_property_data_fast", lambda _: fast_parser.parse_property_data(1623907, url), number=50),
+        Benchmark("soup_build", lambda _: BeautifulSoup(html_doc, 'lxml'), number=20),
+        Benchmark("preprocess", lambda _: OpenRentBeautifulSoup._preprocess(soup), number=200),
+        Benchmark("parse_feature_table", lambda _: OpenRentBeautifulSoup._parse_feature_table(soup), number=200),
+        Benchmark("parse_location_table", lambda _: OpenRentBeautifulSoup._parse_location_table(soup), number=200),
+        Benchmark("parse_overview_table", lambda _: OpenRentBeautifulSoup._parse_overview_table(soup), number=200),
+        Benchmark("available_from", lambda _: OpenRentBeautifulSoup._available_from(features), number=200),
+        Benchmark("post_code", lambda _: OpenRentBeautifulSoup._extract_post_code_from_bb_link(soup), number=200),
+        Benchmark("extract_property_ids", lambda _: extract_property_ids(search_html), number=10),
+    ]
+
+
+def scoring_cases(context: BenchContext) -> List[Benchmark]:
+    scoring = Scoring(context.search_config, "", "", context.tfl())
+    new_property = context.properties(1)[0]
+    description = context.details.description
+    # the cost of a scan should barely move with the number of rules
+    matchers = {count: KeywordMatcher([f'"shared garden" OR (term{idx} NEAR/3 "other term {idx}")'
+                                       for idx in range(count)]) for count in (1, 100)}
+    return [
+        Benchmark("compute_likeness_score", lambda _: scoring.compute_likeness_score(new_property), number=200),
+        Benchmark("keyword_match_1_rule", lambda _: matchers[1].match(description), number=1000),
+        Benchmark("keyword_match_100_rules", lambda _: matchers[100].match(description), number=1000),
+    ]
+
+
+def db_cases(context: BenchContext) -> List[Benchmark]:
+    cases = []
+    for size in context.db_sizes:
+        properties = context.properties(size)
+        # big tables take long enough that a few samples are plenty
+        repeat = 3 if size <= 10000 else 1
+
+        def upsert(db: DbConnOrm, properties=properties) -> None:
+            for start in range(0, len(properties), WRITE_BATCH):
+                db.upsert_properties(properties[start:start + WRITE_BATCH])
+
+        # half of them stored, half never seen
+        lookup_ids = random.Random(size).sample(range(1, size + 1), LOOKUP_IDS // 2) + list(
+            range(size + 1, size + 1 + LOOKUP_IDS // 2))
+
+        cases += [
+            Benchmark(f"db_upsert_{size}", upsert, setup=context.new_db, teardown=lambda db: db.engine.dispose(),
+                      repeat=repeat),
+            Benchmark(f"seen_properties_{size}", lambda seen, ids=lookup_ids: seen.contains_many(ids),
+                      setup=lambda size=size: SeenProperties(context.filled_db(size).engine), number=10),
+            Benchmark(f"check_states_{size}", lambda db, ids=lookup_ids: db.get_check_states(ids),
+                      setup=lambda size=size: context.filled_db(size), number=10),
+            # every stored description has the phrase in it: the worst case for the full text condition
+            Benchmark(f"query_properties_{size}", lambda db: list(db.query_properties(QUERY, limit=20)),
+                      setup=lambda size=size: context.filled_db(size), number=10),
+        ]
+    return cases
+
+
+def memory_cases(context: BenchContext) -> List[Benchmark]:
+    html_doc = _fixture("property.html")
+    parser = OpenRentBeautifulSoup(Crawler(parser="fast"), FakeHttpClient())
+
+    def parsed(_) -> List:
+        # every listing parsed from its own copy of the page, the way a crawl builds them
+        return [parser.parse_property_html(property_id, parser.property_url(property_id), html_doc)
+                for property_id in range(1, MEMORY_LISTINGS + 1)]
+
+    def scored(_) -> List[Property]:
+        properties = []
+        for details in parsed(None):
+            new_property = Property(details.property_id, parser)
+            new_property.property_details = details
+            new_property.score = 80
+            new_property.score_reasons = ["* Has garden"]
+            properties.append(new_property)
+        return properties
+
+    return [
+        Benchmark("property_details_bytes", parsed, number=MEMORY_LISTINGS, repeat=3, memory=True),
+        Benchmark("property_bytes", scored, number=MEMORY_LISTINGS, repeat=3, memory=True),
+    ]
+
+
+def import_cases(context: BenchContext) -> List[Benchmark]:
+    # the same module search path as the scripts get, with the repo root for the scripts themselves
+    source_dirs = [ROOT] + [os.path.join(ROOT, "openrent", name) for name in ("", "dao", "utils", "html_parsing")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(source_dirs))
+
+    def import_script(script: str) -> None:
+        # a new interpreter every time: nothing is imported yet, like when the script is started. the scripts log to
+        # dream_home.log in the working directory, hence the scratch directory
+        subprocess.run([sys.executable, "-c", f"import {script}"], env=env, cwd=context.directory, check=True)
+
+    return [Benchmark(f"import_{script}", lambda _, script=script: import_script(script)) for script in SCRIPTS]
+
+
+def end_to_end_cases(context: BenchContext) -> List[Benchmark]:
+    search_config = copy.deepcopy(context.search_config)
+    search_config.crawler.search_engine = "http"
+    search_config.crawler.parse_workers = 0
+    # the fake slack answers right away, the rate limit would only measure itself
+    search_config.notifications.messages_per_second = 10000
+    search_config.search_fields.areas.seed_locations = search_config.search_fields.areas.seed_locations[:1]
+
+    def setup() -> App:
+        app = App(AppConfig("", "", "token", "channel", tempfile.mktemp(suffix=".db", dir=context.directory)))
+        app.providers = [OpenRentBeautifulSoup(search_config.crawler, FakeHttpClient())]
+        app.slack = Slack("token", "channel", search_config.notifications)
+        app.slack.slack_client = FakeSlackClient()
+        app.tfl_cache = TflJourneyCache(app.db_connector.engine, search_config.tfl)
+        app.tfl = context.tfl()
+        app.tfl.cache = app.tfl_cache
+        return app
+
+    def teardown(app: App) -> None:
+        app.close()
+        app.db_connector.engine.dispose()
+
+    return [Benchmark("search_properties_e2e", lambda app: app.search_properties(search_config), setup=setup,
+                      teardown=teardown, repeat=3)]
+
+
+ALL_CASES: List[Callable[[BenchContext], List[Benchmark]]] = [parsing_cases, scoring_cases, db_cases,
+                                                               memory_cases, import_cases, end_to_end_cases]
@@ -0,0 +1,136 @@
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+
+@dataclass
+class Benchmark:
+    """
+    `run` is timed `number` times in a row per sample. `setup` runs before every sample, outside the timing, and what
+    it returns is handed to `run` (e.g. a fresh db). `teardown` gets it back once the sample is done.
+    With `memory` it's bytes instead of seconds: `run` is called once per sample and must return the `number` objects
+    it built. What they keep allocated, divided by `number`, is the sample.
+    """
+    name: str
+    run: Callable[[Any], Any]
+    setup: Callable[[], Any] = lambda: None
+    teardown: Callable[[Any], None] = lambda state: None
+    number: int = 1
+    repeat: int = 5
+    memory: bool = False
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline: float
+    current: float
+    threshold: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else 1.
+
+    @property
+    def regressed(self) -> bool:
+        return self.ratio > 1 + self.threshold
+
+
+def measure(benchmark: Benchmark) -> Dict[str, Any]:
+    """
+    Seconds per call of every sample, summarised. The median is what gets compared, it shrugs off the odd slow sample.
+    """
+    if benchmark.memory:
+        return measure_memory(benchmark)
+    samples = []
+    for _ in range(benchmark.repeat):
+        state = benchmark.setup()
+        try:
+            start = time.perf_counter()
+            for _ in range(benchmark.number):
+                benchmark.run(state)
+            samples.append((time.perf_counter() - start) / benchmark.number)
+        finally:
+            benchmark.teardown(state)
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'mean': statistics.fmean(samples),
+        'samples': len(samples),
+        'number': benchmark.number,
+    }
+
+
+def measure_memory(benchmark: Benchmark) -> Dict[str, Any]:
+    """
+    Bytes per object still allocated once `run` returns, as seen by tracemalloc. Whatever `run` allocated and let go
+    of (e.g. while parsing) is not counted.
+    """
+    samples = []
+    for _ in range(benchmark.repeat):
+        state = benchmark.setup()
+        try:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                kept = benchmark.run(state)
+                gc.collect()
+                samples.append((tracemalloc.get_traced_memory()[0] - before) / benchmark.number)
+            finally:
+                tracemalloc.stop()
+            del kept
+        finally:
+            benchmark.teardown(state)
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'mean': statistics.fmean(samples),
+        'samples': len(samples),
+        'number': benchmark.number,
+        'unit': 'bytes',
+    }
+
+
+def environment() -> Dict[str, str]:
+    try:
+        # -dirty: what was measured isn't exactly that commit
+        commit = subprocess.run(["git", "describe", "--always", "--dirty", "--abbrev=7"], capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'system': platform.system(),
+            'commit': commit, 'time': time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def load_results(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_thresholds(path: str) -> Callable[[str], float]:
+    with open(path) as f:
+        thresholds = yaml.safe_load(f) or {}
+    default = thresholds.get('default', .25)
+    per_benchmark = thresholds.get('benchmarks') or {}
+    return lambda name: per_benchmark.get(name, default)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold_for: Callable[[str], float]) -> List[Comparison]:
+    """
+    Median against median for every benchmark in both runs. New or dropped benchmarks are not compared.
+    """
+    return [Comparison(name, baseline['results'][name]['median'], result['median'], threshold_for(name))
+            for name, result in current['results'].items() if name in baseline['results']]
@@ -0,0 +1,55 @@
+import logging
+
+import click
+import yaml
+
+from commute_matrix import CommuteMatrixBuilder
+from db import DbConnOrm
+from http_client import HttpClient
+from search_config import SearchConfig
+from tfl_async import AsyncTflHelper
+from tfl_cache import TflJourneyCache
+
+LOGGER: logging.Logger = logging.getLogger()
+handler = logging.FileHandler("dream_home.log")
+handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+LOGGER.addHandler(handler)
+
+
+@click.command()
+@click.option("--tfl_app_id", help="TFP App ID")
+@click.option("--tfl_app_key", help="TFP App Key")
+@click.option("--db_name", help="Name of sqlite db", default="dream_home.db")
+@click.option("--force", default=False, is_flag=True, help="Rebuild even if the matrix is not stale yet")
+@click.option("--debug", default=False, is_flag=True)
+def build(tfl_app_id: str, tfl_app_key: str, db_name: str, force: bool, debug: bool):
+    """
+    Precomputes the commute time from every postcode district and station within the search radius to every work
+    location. Meant to run once a week (e.g. from cron). It's a no-op while the current matrix is still fresh.
+    """
+    LOGGER.setLevel(logging.INFO)
+    if debug:
+        LOGGER.setLevel(logging.DEBUG)
+
+    with open("config.yaml", "r") as f:
+        data = yaml.safe_load(f)
+        search_config = SearchConfig.from_dict(data)
+
+    db_connector = DbConnOrm(db_name)
+    tfl = AsyncTflHelper(tfl_app_id, tfl_app_key, search_config.tfl,
+                         TflJourneyCache(db_connector.engine, search_config.tfl))
+    http_client = HttpClient(search_config.crawler)
+    builder = CommuteMatrixBuilder(db_connector.engine, tfl, http_client, tfl_app_id, tfl_app_key)
+    try:
+        if not force and not builder.is_stale(search_config.tfl.commute_matrix):
+            LOGGER.info("Commute matrix is still fresh. Nothing to do")
+            return
+        rows = builder.build(search_config)
+        LOGGER.info(f"Commute matrix built: {rows} entries")
+    finally:
+        tfl.close()
+        http_client.close()
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,50 @@
+import logging
+import signal
+import threading
+
+import click
+
+from app_config import AppConfig
+from scheduler import AdaptiveSchedule, load_config, poll_forever
+
+LOGGER: logging.Logger = logging.getLogger()
+handler = logging.FileHandler("dream_home.log")
+handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+LOGGER.addHandler(handler)
+
+
+@click.command()
+@click.option("--tfl_app_id", help="TFP App ID")
+@click.option("--tfl_app_key", help="TFP App Key")
+@click.option("--slack_token", help="Slack token for your workspace")
+@click.option("--slack_channel", help="Slack channel where the bot should post updates")
+@click.option("--db_name", help="Name of sqlite db", default="dream_home.db")
+@click.option("--config", "config_path", help="Search config, reloaded when it changes", default="config.yaml")
+@click.option("--debug", default=False, is_flag=True)
+def run(tfl_app_id: str, tfl_app_key: str, slack_token: str, slack_channel: str, db_name: str, config_path: str,
+        debug: bool):
+    LOGGER.setLevel(logging.INFO)
+    if debug:
+        LOGGER.setLevel(logging.DEBUG)
+
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        LOGGER.info(f"Got signal {signum}, stopping after the current poll")
+        stop.set()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    search_config = load_config(config_path)
+    # the app pulls in every client and parser: not worth waiting for when all we do is print --help
+    from app import App
+    app = App(AppConfig(tfl_app_id, tfl_app_key, slack_token, slack_channel, db_name))
+    schedule = AdaptiveSchedule(app.db_connector.engine, search_config.daemon)
+    try:
+        poll_forever(app, schedule, config_path, search_config, stop)
+    finally:
+        app.close()
+
+
+if __name__ == '__main__':
+    run()
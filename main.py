@@ -3,8 +3,8 @@ import logging
 import click
 import yaml
 
-from app import App
 from app_config import AppConfig
+from profiling import profiled
 from search_config import SearchConfig
 
 LOGGER: logging.Logger = logging.getLogger()
@@ -19,8 +19,10 @@ LOGGER.addHandler(handler)
 @click.option("--slack_token", help="Slack token for your workspace")
 @click.option("--slack_channel", help="Slack channel where the bot should post updates")
 @click.option("--db_name", help="Name of sqlite db", default="dream_home.db")
+@click.option("--profile", help="Write cProfile and tracemalloc output for the run", default=False, is_flag=True)
 @click.option("--debug", default=False, is_flag=True)
-def run(tfl_app_id: str, tfl_app_key: str, slack_token: str, slack_channel: str, db_name: str, debug: bool):
+def run(tfl_app_id: str, tfl_app_key: str, slack_token: str, slack_channel: str, db_name: str, profile: bool,
+        debug: bool):
     LOGGER.setLevel(logging.INFO)
     if debug:
         LOGGER.setLevel(logging.DEBUG)
@@ -30,7 +32,19 @@ def run(tfl_app_id: str, tfl_app_key: str, slack_token: str, slack_channel: str,
         search_config = SearchConfig.from_dict(data)
     app_config = AppConfig(tfl_app_id, tfl_app_key, slack_token, slack_channel,db_name)
 
-    App(app_config).search_properties(search_config)
+    # the app pulls in every client and parser: not worth waiting for when all we do is print --help
+    from app import App
+    app = App(app_config)
+    try:
+        if profile:
+            # worker processes aren't profiled, parsing on a thread keeps it in the profile
+            search_config.crawler.parse_workers = 0
+            with profiled(search_config.metrics):
+                app.search_properties(search_config)
+        else:
+            app.search_properties(search_config)
+    finally:
+        app.close()
 
 
 if __name__ == '__main__':
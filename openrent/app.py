@@ -1,71 +1,130 @@
 import logging
-import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
 
 from app_config import AppConfig
+from commute_matrix import PrecomputedCommutes
 from db import DbConnOrm
-from openrent_bs import OpenRentBeautifulSoup
-from property import Property
+from html_store import RawHtmlStore
+from metrics import METRICS
+from pipeline import Pipeline, PipelineStats, init_parser_process
+from provider import ListingProvider, create_providers
 from scoring import Scoring
 from search_config import SearchConfig
+from seen_properties import SeenProperties
 from slack_client import Slack
-
-INFINITE_SCROLL_SLEEP = 3
+from tfl_cache import TflJourneyCache
+from tfl_async import AsyncTflHelper
+from tfl_helper import TflHelper
 
 
 class App:
     def __init__(self, app_config: AppConfig):
         self.app_config = app_config
         self.db_connector = DbConnOrm(app_config.db_name)
-        self.slack = Slack(app_config.slack_token, app_config.slack_channel)
+        self.slack = None
         self.logger = logging.getLogger()
-        self.openrent_bs = OpenRentBeautifulSoup()
+        self.providers: List[ListingProvider] = []
+        self.parse_pool = None
+        self.tfl = None
+        self.tfl_cache = None
+        self.seen_properties = None
+        # the config the clients above were built with
+        self.client_config: Optional[SearchConfig] = None
 
-    def search_properties(self, search_config: SearchConfig, headless=True):
+    def search_properties(self, search_config: SearchConfig, headless=True,
+                          locations: List[str] = None, resume: bool = True) -> PipelineStats:
+        """
+        One run over the given seed locations (all of them by default). Clients, pools and caches are created on the
+        first run and kept warm for the next ones (see daemon.py). The ones whose config section changed since (the
+        daemon reloaded the config) are rebuilt.
+        """
+        self._close_outdated_clients(search_config)
+        if not self.providers:
+            # every provider has one pooled keep-alive session shared by all workers (and all runs of this App)
+            html_store = None
+            if search_config.storage.keep_raw_html:
+                html_store = RawHtmlStore(self.db_connector.engine, search_config.storage)
+            self.providers = create_providers(search_config.providers, search_config.crawler, html_store)
+        if self.slack is None:
+            # delivers in the background so the crawl never waits on slack
+            self.slack = Slack(self.app_config.slack_token, self.app_config.slack_channel, search_config.notifications)
         self.slack.send_message("!!!! Starting a new run !!!!!")
 
-        properties = {}
         # prepare the scoring class
-        scoring = Scoring(search_config, self.app_config.tfl_app_id, self.app_config.tfl_app_key)
+        if self.tfl is None:
+            self.tfl_cache = TflJourneyCache(self.db_connector.engine, search_config.tfl)
+            tfl_class = AsyncTflHelper if search_config.tfl.async_requests else TflHelper
+            self.tfl = tfl_class(self.app_config.tfl_app_id, self.app_config.tfl_app_key, search_config.tfl,
+                                 self.tfl_cache)
+        if self.seen_properties is None:
+            self.seen_properties = SeenProperties(self.db_connector.engine)
+        commute_matrix = None
+        if search_config.tfl.commute_matrix.enabled:
+            commute_matrix = PrecomputedCommutes(self.db_connector.engine, search_config.tfl.commute_matrix)
+            if commute_matrix.is_stale():
+                self.logger.warning("Commute matrix is missing or stale. Run build_commute_matrix.py to rebuild it")
+        scoring = Scoring(search_config, self.app_config.tfl_app_id, self.app_config.tfl_app_key, self.tfl,
+                          commute_matrix)
         # get seed locations for search
-        locations = search_config.search_fields.areas.seed_locations
-
-        # retrieve the list of already viewed properties. for now the hardcoded limit is fine.
-        already_viewed_properties = self.db_connector.get_latest_properties(10000)
-        self.logger.debug(already_viewed_properties)
+        if locations is None:
+            locations = search_config.search_fields.areas.seed_locations
 
-        # for each search location ( think center of circle of radius X) we do a search
-        for location in locations:
-            property_ids = self.openrent_bs.search_properties(search_config=search_config, location=location,
-                                                              headless=headless)
-            # remove all viewed properties
-            new_properties = property_ids - already_viewed_properties
+        pipeline = Pipeline(search_config, self.providers, scoring, self.slack, self.db_connector,
+                            self._parse_pool(search_config), self.seen_properties, resume)
+        try:
+            stats = pipeline.run(locations, headless=headless)
+        finally:
+            # a failed run is the one we most want numbers for
+            METRICS.write(search_config.metrics.prometheus_file, search_config.metrics.summary_file)
 
-            self.logger.info(
-                f"[Location: {location}] Received {len(property_ids)} property links. New ones: {len(new_properties)}")
-            # send message to slack channel so humans know we're working
-            if len(new_properties) == 0:
-                self.slack.send_message(f">>>> No new properties found for {location}")
-            else:
-                self.slack.send_message(f">>>> Yay!!! {len(new_properties)} new properties were found for {location}")
+        self.logger.info(f"Run finished: {stats}")
+        self.logger.info(self.tfl_cache.stats)
+        self.slack.send_message(f'!!!! Finished.  !!!!!')
+        self.slack.flush()
+        return stats
 
-            # could be done in parallel but let's be nice people and not overload their site.
-            notifications_sent = 0
-            for prop_id in new_properties:
-                new_property = Property(prop_id)
-                new_property.score, new_property.score_reasons = scoring.compute_likeness_score(new_property)
-                notification_sent = self.slack.notify(new_property, search_config.scoring.notify_at)
-                if notification_sent:
-                    notifications_sent += 1
-                time.sleep(1)
-                properties[prop_id] = new_property
-                self.logger.info(new_property.url)
-                self.logger.debug(f"\tScore: {new_property.score}, \n\treasons:{new_property.score_reasons}")
+    def _close_outdated_clients(self, search_config: SearchConfig) -> None:
+        previous, self.client_config = self.client_config, search_config
+        if previous is None:
+            return
+        if (previous.providers, previous.crawler, previous.storage) != (search_config.providers, search_config.crawler,
+                                                                        search_config.storage):
+            self.logger.info("Crawler, providers or storage config changed, restarting the providers")
+            for provider in self.providers:
+                provider.close()
+            self.providers = []
+            # its workers were started with the old crawler config
+            if self.parse_pool:
+                self.parse_pool.shutdown()
+                self.parse_pool = None
+        if previous.notifications != search_config.notifications and self.slack:
+            self.logger.info("Notifications config changed, restarting the slack client")
+            # close delivers what's queued first
+            self.slack.close()
+            self.slack = None
+        if previous.tfl != search_config.tfl and self.tfl:
+            self.logger.info("TFL config changed, restarting the TFL client")
+            self.tfl.close()
+            self.tfl = None
+            self.tfl_cache = None
 
-            if len(new_properties) != 0:
-                self.slack.send_message(
-                    f">>>>> Out of {len(new_properties)} only {notifications_sent} properties had a score above the notification threshold. <<<<<")
+    def _parse_pool(self, search_config: SearchConfig) -> Optional[ProcessPoolExecutor]:
+        if search_config.crawler.parse_workers <= 0:
+            return None
+        if self.parse_pool is None:
+            self.parse_pool = ProcessPoolExecutor(max_workers=search_config.crawler.parse_workers,
+                                                  initializer=init_parser_process,
+                                                  initargs=(search_config.crawler,
+                                                            [provider.name for provider in self.providers]))
+        return self.parse_pool
 
-        # insert all new properties
-        self.db_connector.insert_properties(properties)
-        self.slack.send_message(f'!!!! Finished.  !!!!!')
-        return properties
+    def close(self) -> None:
+        if self.tfl:
+            self.tfl.close()
+        if self.slack:
+            self.slack.close()
+        for provider in self.providers:
+            provider.close()
+        if self.parse_pool:
+            self.parse_pool.shutdown()
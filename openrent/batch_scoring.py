@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from property_details import ORPropertyDetails
+from scoring import NO_TFL, DescriptionMatcher, Scoring
+from search_config import SearchConfig
+
+
+@dataclass
+class PropertyBatch:
+    """
+    Columnar view of a set of properties: one numpy array per scoring input.
+    commute_minutes has one column per work location (in config order) and NaN where the time is unknown. Like in
+    Scoring, the known times of a row share the location weight, and a row without any is scored like a property whose
+    post code could not be detected.
+    keyword_matches has one column per keyword rule (in config order).
+    """
+    property_ids: np.ndarray
+    price: np.ndarray
+    bedrooms: np.ndarray
+    bathrooms: np.ndarray
+    has_garden: np.ndarray
+    private_garden: np.ndarray
+    commute_minutes: np.ndarray
+    keyword_matches: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.property_ids)
+
+    @classmethod
+    def from_details(cls, properties: Sequence[ORPropertyDetails], work_locations: List[str],
+                     times_to_work: Sequence[Optional[Dict[str, int]]],
+                     description_matcher: DescriptionMatcher = None) -> "PropertyBatch":
+        """
+        times_to_work holds, for every property, the commute time to each work location (None if unknown).
+        Descriptions are scanned once each, for the garden check and every keyword rule of the matcher.
+        """
+        description_matcher = description_matcher if description_matcher else DescriptionMatcher()
+        matches = np.array(description_matcher.match_many(p.description for p in properties), dtype=bool).reshape(
+            len(properties), 1 + len(description_matcher.rules))
+        return cls(
+            property_ids=np.fromiter((p.property_id for p in properties), dtype=np.int64, count=len(properties)),
+            price=np.fromiter((p.price for p in properties), dtype=np.float64, count=len(properties)),
+            bedrooms=np.fromiter((p.bedrooms for p in properties), dtype=np.int64, count=len(properties)),
+            bathrooms=np.fromiter((p.bathrooms for p in properties), dtype=np.int64, count=len(properties)),
+            # None (garden state unknown) is scored like no garden
+            has_garden=np.fromiter((bool(p.has_garden) for p in properties), dtype=bool, count=len(properties)),
+            private_garden=~matches[:, 0],
+            commute_minutes=commute_matrix(work_locations, times_to_work),
+            keyword_matches=matches[:, 1:],
+        )
+
+
+def commute_matrix(work_locations: List[str], times_to_work: Iterable[Optional[Dict[str, int]]]) -> np.ndarray:
+    rows = [[np.nan if not times or times.get(location) is None else times[location] for location in work_locations]
+            for times in times_to_work]
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(work_locations))
+
+
+@dataclass
+class BatchScores:
+    price: np.ndarray
+    bedrooms: np.ndarray
+    bathrooms: np.ndarray
+    garden: np.ndarray
+    location: np.ndarray
+    keywords: np.ndarray
+    total: np.ndarray
+
+    def components(self, idx: int) -> Dict[str, float]:
+        return {
+            'price': float(self.price[idx]),
+            'bedrooms': float(self.bedrooms[idx]),
+            'bathrooms': float(self.bathrooms[idx]),
+            'garden': float(self.garden[idx]),
+            'location': float(self.location[idx]),
+            'keywords': float(self.keywords[idx]),
+        }
+
+
+class BatchScoring:
+    """
+    Vectorized version of Scoring.compute_likeness_score. Every component and the total are computed for the whole
+    batch at once with the exact same formulas (and floating point operations, in the same order) so the totals match.
+    Reason strings are expensive and mostly thrown away, so they are only built on demand (e.g. for the properties that
+    cross notify_at) by the scalar Scoring code.
+    """
+
+    def __init__(self, search_config: SearchConfig):
+        self.search_config = search_config
+        # only used for the reason strings. no TFL calls are made: the batch already holds the commute times
+        self.scoring = Scoring(search_config, "", "", NO_TFL)
+
+    def score(self, batch: PropertyBatch) -> BatchScores:
+        sf = self.search_config.search_fields
+        sc = self.search_config.scoring
+
+        deviation = 100. * (batch.price - sf.price.sweet_spot) / sf.price.sweet_spot
+        price = np.where(batch.price <= sf.price.sweet_spot, float(sf.price.weight),
+                         np.maximum(0., sf.price.weight - deviation * sf.price.weight / 100))
+        bedrooms = np.where(batch.bedrooms < sf.bedrooms.min_bedrooms, 0., float(sf.bedrooms.weight))
+        bathrooms = np.where(batch.bathrooms < sc.bathrooms.min_bathrooms, 0., float(sc.bathrooms.weight))
+        garden = np.where(batch.has_garden & batch.private_garden, float(sc.has_garden.weight), 0.)
+        location = self._location_scores(batch.commute_minutes)
+        keywords = batch.keyword_matches @ np.array([rule.weight for rule in sc.keywords], dtype=np.float64)
+
+        total = 100 * (price + bedrooms + bathrooms + garden + location + keywords) // self.search_config.total_weight
+        return BatchScores(price, bedrooms, bathrooms, garden, location, keywords, total)
+
+    def notify_mask(self, scores: BatchScores) -> np.ndarray:
+        return scores.total >= self.search_config.scoring.notify_at
+
+    def reasons(self, batch: PropertyBatch, idx: int) -> List[str]:
+        work_locations = self.search_config.scoring.work_locations.locations
+        commute = batch.commute_minutes[idx]
+        times_to_work = {location: _as_number(minutes) for location, minutes in zip(work_locations, commute)
+                         if not np.isnan(minutes)}
+        reasons = [
+            self.scoring._get_price_score(float(batch.price[idx]))[1],
+            self.scoring._get_bedrooms_score(int(batch.bedrooms[idx]))[1],
+            self.scoring._get_bathrooms_score(int(batch.bathrooms[idx]))[1],
+            self.scoring._get_garden_score(bool(batch.has_garden[idx]), bool(batch.private_garden[idx]))[1],
+            self.scoring._get_commute_score(times_to_work)[1],
+        ]
+        keywords_reason = self.scoring._get_keywords_score([bool(match) for match in batch.keyword_matches[idx]])[1]
+        if keywords_reason:
+            reasons.append(keywords_reason)
+        return reasons
+
+    def _location_scores(self, commute_minutes: np.ndarray) -> np.ndarray:
+        query = self.search_config.scoring.work_locations
+        known = ~np.isnan(commute_minutes)
+        known_count = known.sum(axis=1)
+        # the known times share the weight
+        per_location = query.weight // np.maximum(known_count, 1)
+        desired = query.time_to_location_in_minutes
+
+        total = np.zeros(commute_minutes.shape[0])
+        # columns are summed one by one, like Scoring does, to get exactly the same floats. unknown ones add 0
+        for column in range(commute_minutes.shape[1]):
+            minutes = commute_minutes[:, column]
+            deviation = 100. * (minutes - desired) / desired
+            score = np.where(minutes <= desired, per_location, per_location - deviation * per_location / 100)
+            total = total + np.where(known[:, column], score, 0.)
+        # no commute known at all: full weight
+        return np.where(known_count == 0, float(query.weight), total)
+
+
+def _as_number(value) -> float:
+    value = float(value)
+    return int(value) if value.is_integer() else value
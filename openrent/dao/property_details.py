@@ -1,38 +1,149 @@
-from dataclasses import dataclass
-from typing import List
+import datetime
+import hashlib
+import json
+import sys
+import zlib
+from dataclasses import dataclass, field, fields
+from enum import Enum
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
+# rows of a table on the property page, e.g. (("Garden", "yes"), ("EPC Rating", "C"))
+Table = Tuple[Tuple[str, ...], ...]
 
-@dataclass
+
+class EpcRating(str, Enum):
+    """
+    One shared object per rating instead of a string per property. Compares (and is stored) as the plain letter.
+    """
+    A = "A"
+    B = "B"
+    C = "C"
+    D = "D"
+    E = "E"
+    F = "F"
+    G = "G"
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+    @classmethod
+    def parse(cls, rating: Optional[str]) -> Optional[Union["EpcRating", str]]:
+        # the odd listing has something like "Ask agent" in there. kept as it is
+        if rating is None:
+            return None
+        try:
+            return cls(rating.strip().upper())
+        except ValueError:
+            return sys.intern(rating)
+
+
+def compact_table(rows: Iterable[Iterable[str]]) -> Table:
+    """
+    Rows as tuples of interned strings. Feature names, the yes/no ticks and station names repeat across thousands of
+    listings, so every listing ends up pointing at the same string objects.
+    """
+    return tuple(tuple(sys.intern(cell) for cell in row) for row in rows)
+
+
+@dataclass(frozen=True, slots=True, init=False)
 class ORPropertyDetails:
     """
-    Simple object to hold information about a property.
-    When other providers for data will be added this might be turned into a base class for common properties and then
-    depending on the data each provider offers we could have different classes extending it.
+    Simple object to hold information about a property. Every provider (see provider.py) parses its pages into one of
+    these, the OR in the name is from the days OpenRent was the only one.
+
+    Parsed listings are kept around (the conditional GET cache, a daemon running for weeks) so they are kept small:
+    slots, tables as tuples of interned strings, the EPC rating as an enum and the description zlib compressed. The
+    description is only decompressed when somebody reads it. Use dataclasses.replace to get a modified copy.
     """
     # property ID.
     property_id: int
     # property title
     title: str
     # location data reported by OpenRent(closest underground/overground stations and distance)
-    location: List[List[str]]
+    location: Table
     # property price
     price: float
-    # property description
-    description: str
+    # zlib compressed description. read `description` instead
+    packed_description: bytes = field(repr=False)
     # date when property is available
     # TODO: this should factor in the search
     available_from: str
     # EPC rating
-    epc: str
-    # does the property report include a garden ( be careful here we need to distinguish between private/shared/etc)
-    has_garden: bool
+    epc: Optional[Union[EpcRating, str]]
+    # does the property report include a garden ( be careful here we need to distinguish between private/shared/etc).
+    # None when the listing doesn't say
+    has_garden: Optional[bool]
     # post code - if available. it comes from the broadband availability link
     post_code: str
     # list of features for the property as reported by OR
-    features: List[List[str]]
-    # OR url. can be computed from the property ID
+    features: Table
+    # url of the listing on the site it came from
     url: str
     # number of bedrooms
     bedrooms: int
     # number of bathrooms
     bathrooms: int
+    # name of the provider the listing came from
+    source: str = "openrent"
+
+    def __init__(self, property_id: int, title: str, location: Iterable[Iterable[str]], price: float,
+                 description: Optional[str] = None, available_from: str = "", epc: Optional[str] = None,
+                 has_garden: Optional[bool] = None, post_code: str = "", features: Iterable[Iterable[str]] = (),
+                 url: str = "", bedrooms: int = 0, bathrooms: int = 0, source: str = "openrent",
+                 packed_description: bytes = None) -> None:
+        # frozen, so every field is set the way dataclasses does it
+        set_field = object.__setattr__
+        set_field(self, "property_id", property_id)
+        set_field(self, "title", title)
+        set_field(self, "location", compact_table(location))
+        set_field(self, "price", price)
+        if description is not None or packed_description is None:
+            packed_description = zlib.compress((description or "").encode("utf-8"))
+        set_field(self, "packed_description", packed_description)
+        set_field(self, "available_from", sys.intern(available_from) if available_from else available_from)
+        set_field(self, "epc", EpcRating.parse(epc))
+        set_field(self, "has_garden", has_garden)
+        set_field(self, "post_code", post_code)
+        set_field(self, "features", compact_table(features))
+        set_field(self, "url", url)
+        set_field(self, "bedrooms", bedrooms)
+        set_field(self, "bathrooms", bathrooms)
+        set_field(self, "source", sys.intern(source))
+
+    @property
+    def description(self) -> str:
+        return zlib.decompress(self.packed_description).decode("utf-8")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Every field as plain json types, with the description decompressed in place of packed_description.
+        dataclasses.asdict would hand out the zlib bytes.
+        """
+        data = {}
+        for data_field in fields(self):
+            if data_field.name == "packed_description":
+                data["description"] = self.description
+            elif data_field.name in ("location", "features"):
+                data[data_field.name] = [list(row) for row in getattr(self, data_field.name)]
+            elif data_field.name == "epc":
+                data["epc"] = str(self.epc) if self.epc is not None else None
+            else:
+                data[data_field.name] = getattr(self, data_field.name)
+        return data
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the fields that matter when a listing changes. Same fingerprint, nothing worth re-scoring.
+        An availability date that has already come counts as "now": "Available From: Today" is parsed to the day it's
+        parsed on, and shouldn't look like a new version every day.
+        """
+        content = json.dumps([self.price, _stable_availability(self.available_from), self.description, self.features])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def _stable_availability(available_from: str) -> str:
+    try:
+        date = datetime.date.fromisoformat(available_from)
+    except (TypeError, ValueError):
+        return available_from
+    return "now" if date <= datetime.date.today() else available_from
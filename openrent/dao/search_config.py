@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import List, Dict
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
 
 from dataclasses_json import dataclass_json
 
@@ -17,6 +17,8 @@ class Bathrooms:
 class HasGarden:
     value: bool
     weight: int
+    # keyword expression (see keywords.py) for descriptions saying the garden is not a private one
+    not_private: str = '"shared garden" OR "shared gardens" OR "communal garden" OR "communal gardens"'
 
 
 @dataclass_json
@@ -27,6 +29,17 @@ class WorkLocations:
     weight: int
 
 
+@dataclass_json
+@dataclass
+class KeywordRule:
+    # shown in the score reasons
+    name: str
+    # e.g. '"floor heating" OR underfloor', 'garden NEAR/3 private AND NOT (shared OR communal)'. see keywords.py
+    expression: str
+    # added when the description matches. negative to penalise
+    weight: int
+
+
 @dataclass_json
 @dataclass
 class Scoring:
@@ -34,6 +47,7 @@ class Scoring:
     has_garden: HasGarden
     notify_at: int
     work_locations: WorkLocations
+    keywords: List[KeywordRule] = field(default_factory=list)
 
 
 @dataclass_json
@@ -68,11 +82,166 @@ class SearchFields:
     price: Price
 
 
+@dataclass_json
+@dataclass
+class Http:
+    # connection pools kept (one per host) and connections kept alive per pool. pool_maxsize should be >= max_workers
+    pool_connections: int = 4
+    pool_maxsize: int = 8
+    timeout_seconds: float = 30.
+    # retry policy: which status codes are retried and whether connection errors/timeouts are retried as well
+    retry_status_codes: List[int] = field(default_factory=lambda: [429, 500, 502, 503, 504])
+    retry_on_connection_errors: bool = True
+    # how many parsed properties (with their ETag/Last-Modified) we keep around to answer a 304
+    conditional_cache_size: int = 2048
+    user_agent: Optional[str] = None
+
+
+@dataclass_json
+@dataclass
+class Selenium:
+    # warm Chrome instances kept around and reused across locations/runs
+    pool_size: int = 1
+    # a driver is quit and replaced after this many pages or once it uses more memory than this
+    max_pages_per_driver: int = 20
+    max_memory_mb: int = 1024
+    # 'eager' returns as soon as the DOM is ready instead of waiting for every resource
+    page_load_strategy: str = "eager"
+    block_images: bool = True
+    # fonts and css are blocked through the dev tools protocol
+    blocked_urls: List[str] = field(
+        default_factory=lambda: ["*.css", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.png", "*.jpg", "*.jpeg", "*.gif",
+                                 "*.webp", "*.svg"])
+
+
+@dataclass_json
+@dataclass
+class Crawler:
+    # where listings are fetched from. point it at simulator.py for load tests
+    base_url: str = "https://www.openrent.co.uk"
+    # number of properties fetched/scored at the same time
+    max_workers: int = 4
+    # requests per second allowed against a single host (e.g. openrent.co.uk) and how many can go out in a burst
+    requests_per_second: float = 1.
+    burst: int = 2
+    # on 429/5xx we back off exponentially starting from backoff_seconds (or whatever Retry-After says)
+    max_retries: int = 5
+    backoff_seconds: float = 2.
+    # how property ids are discovered: 'selenium' scrolls the results in Chrome, 'http' fetches them without a browser
+    search_engine: str = "selenium"
+    # upper bound on the pages requested per location by the http search engine
+    max_search_pages: int = 50
+    # 'fast' walks an lxml tree once, 'beautifulsoup' is the original parser. both return the same data
+    parser: str = "fast"
+    # known listings that show up in a search again are re-checked (conditional GET) at most this often, to catch price
+    # and availability changes. a negative value turns re-checks off
+    recheck_after_hours: int = 24
+    # property pages are parsed on a pool of this many processes. 0 parses them on the fetching threads
+    parse_workers: int = 2
+    # max items waiting between two stages of the pipeline. a full queue makes the stage before it wait
+    queue_size: int = 32
+    http: Http = field(default_factory=Http)
+    selenium: Selenium = field(default_factory=Selenium)
+
+
+@dataclass_json
+@dataclass
+class CommuteMatrix:
+    # use the precomputed commute times (see build_commute_matrix.py) before calling TFL
+    enabled: bool = True
+    # the matrix is rebuilt once it's older than this
+    max_age_days: int = 7
+    # origins are looked up this far beyond the search radius
+    radius_margin_km: float = 2.
+    # used to add the walk to the closest stations when the post code is unknown
+    walking_minutes_per_mile: float = 20.
+
+
+@dataclass_json
+@dataclass
+class Tfl:
+    base_url: str = "https://api.tfl.gov.uk"
+    # only these transportation methods are considered, leaving at departure_time on the next working day
+    modes: str = "overground,tube"
+    departure_time: str = "0800"
+    # journey times are cached in the db. "no route" answers are cached too but for less time
+    cache_ttl_hours: int = 24 * 7
+    negative_cache_ttl_hours: int = 24
+    cache_max_entries: int = 50000
+    # query all work locations (and properties) at the same time, with at most max_concurrent_requests in flight
+    async_requests: bool = True
+    max_concurrent_requests: int = 8
+    commute_matrix: CommuteMatrix = field(default_factory=CommuteMatrix)
+
+
+@dataclass_json
+@dataclass
+class Storage:
+    # every fetched listing/search page is kept (compressed, content addressed) so it can be re-parsed offline
+    keep_raw_html: bool = True
+    raw_html_dir: str = "raw_html"
+    # "zstd" (needs the zstandard package) or "gzip"
+    codec: str = "gzip"
+    # scored properties are written in batches: whichever comes first
+    write_batch_size: int = 50
+    write_flush_seconds: float = 10.
+    # an interrupted run younger than this is resumed instead of starting over
+    resume_max_age_hours: int = 24
+
+
+@dataclass_json
+@dataclass
+class Notifications:
+    base_url: str = "https://slack.com/api/"
+    # slack allows about one message per second per channel
+    messages_per_second: float = 1.
+    # progress updates are merged into one message sent at most this often
+    digest_seconds: float = 60.
+    # attempts per message when slack rate limits us or fails
+    max_retries: int = 5
+
+
+@dataclass_json
+@dataclass
+class Daemon:
+    # every seed location is polled on its own schedule, somewhere between these two
+    min_interval_minutes: float = 10.
+    max_interval_minutes: float = 240.
+    # used until we have seen a location at a given hour of the week
+    initial_interval_minutes: float = 60.
+    # we aim to find about this many new listings per poll: busy hours get polled more often
+    target_new_per_poll: float = 2.
+    # weight of the latest poll in the new listings per hour average
+    ewma_alpha: float = 0.3
+    # how often config.yaml is checked for changes
+    reload_check_seconds: float = 30.
+
+
+@dataclass_json
+@dataclass
+class Metrics:
+    # written at the end of every run. empty to skip
+    prometheus_file: str = "metrics/dream_home.prom"
+    summary_file: str = "metrics/dream_home_metrics.json"
+    # main.py --profile leaves cProfile and tracemalloc output here
+    profile_dir: str = "profiles"
+    profile_top: int = 30
+    tracemalloc_frames: int = 10
+
+
 @dataclass_json
 @dataclass
 class SearchConfig:
     scoring: Scoring
     search_fields: SearchFields
+    crawler: Crawler = field(default_factory=Crawler)
+    tfl: Tfl = field(default_factory=Tfl)
+    storage: Storage = field(default_factory=Storage)
+    notifications: Notifications = field(default_factory=Notifications)
+    daemon: Daemon = field(default_factory=Daemon)
+    metrics: Metrics = field(default_factory=Metrics)
+    # listing sites to search, by name (see provider.PROVIDERS) or as the import path of a ListingProvider class
+    providers: List[str] = field(default_factory=lambda: ["openrent"])
 
     def get_query_fields(self) -> Dict[str, str]:
         sf: SearchFields = self.search_fields
@@ -96,4 +265,6 @@ class SearchConfig:
         total_weight += self.scoring.work_locations.weight
         total_weight += self.scoring.bathrooms.weight
         total_weight += self.scoring.has_garden.weight
+        # negative keywords only take points away, they don't count towards the maximum
+        total_weight += sum(max(0, rule.weight) for rule in self.scoring.keywords)
         return total_weight
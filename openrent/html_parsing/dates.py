@@ -0,0 +1,45 @@
+import datetime
+import functools
+import logging
+from typing import Optional
+
+# what OpenRent puts in "Available From". anything else goes to dateparser
+TODAY = {"today", "now", "immediately"}
+FORMATS = ("%d %B, %Y", "%d %B %Y", "%d %b, %Y", "%d %b %Y")
+
+
+def parse_available_from(date_text: str) -> str:
+    """
+    "Today" or "25 March, 2023" as an ISO date (2023-03-25). Text that isn't a date comes back as it is.
+    dateparser is slow to import and slow to run, so it's only loaded for strings none of the known formats match.
+    """
+    text = date_text.strip()
+    if text.lower() in TODAY:
+        # not memoized: a daemon runs for days
+        return str(datetime.date.today())
+    parsed = _parse_known_format(text)
+    if parsed is not None:
+        return parsed
+    return _parse_with_dateparser(text)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_known_format(text: str) -> Optional[str]:
+    # a few hundred distinct dates across every listing, so each one is only parsed once
+    for date_format in FORMATS:
+        try:
+            return str(datetime.datetime.strptime(text, date_format).date())
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_with_dateparser(text: str) -> str:
+    import dateparser
+
+    logging.getLogger().debug(f"Unknown available from date {text!r}, using dateparser")
+    # relative dates ("tomorrow", "in 2 weeks") move with the day they're parsed on, so these aren't memoized
+    parsed = dateparser.parse(text)
+    if not parsed:
+        return text
+    return str(parsed.date())
@@ -0,0 +1,186 @@
+import atexit
+import contextlib
+import itertools
+import logging
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+from search_config import Selenium
+
+
+@dataclass
+class PooledDriver:
+    driver_id: int
+    driver: webdriver.Chrome
+    pages: int = 0
+
+
+class ChromeDriverPool:
+    """
+    Keeps a few warm headless Chrome instances around so we don't pay for a cold start on every search.
+    Drivers are recycled after `max_pages_per_driver` pages or once they go above `max_memory_mb`, which keeps memory
+    bounded when we run for days. Everything is torn down when the pool is closed (or when the interpreter exits).
+    """
+
+    def __init__(self, selenium_config: Selenium = None, headless: bool = True) -> None:
+        self.config = selenium_config if selenium_config else Selenium()
+        self.headless = headless
+        self.logger = logging.getLogger()
+        self.idle: "queue.LifoQueue[PooledDriver]" = queue.LifoQueue()
+        self.drivers: Dict[int, PooledDriver] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.closed = False
+        atexit.register(self.close)
+
+    @contextlib.contextmanager
+    def driver(self) -> Iterator[webdriver.Chrome]:
+        pooled = self._acquire()
+        healthy = False
+        try:
+            yield pooled.driver
+            healthy = True
+        finally:
+            pooled.pages += 1
+            self._release(pooled, healthy)
+
+    def memory_usage(self) -> Dict[int, Optional[float]]:
+        """
+        Resident memory in MB of each driver (chromedriver plus every Chrome process it started).
+        """
+        with self.lock:
+            drivers = list(self.drivers.values())
+        return {pooled.driver_id: self._driver_memory_mb(pooled) for pooled in drivers}
+
+    def close(self) -> None:
+        with self.lock:
+            # set first: from now on _acquire neither hands out idle drivers nor starts new ones
+            self.closed = True
+            drivers = list(self.drivers.values())
+            self.drivers.clear()
+            while not self.idle.empty():
+                self.idle.get_nowait()
+        for pooled in drivers:
+            # the ones still starting are quit by _acquire once they're up
+            if pooled.driver is not None:
+                self._quit(pooled)
+
+    def _acquire(self) -> PooledDriver:
+        while True:
+            with self.lock:
+                if self.closed:
+                    raise RuntimeError("Driver pool is closed")
+                try:
+                    return self.idle.get_nowait()
+                except queue.Empty:
+                    pass
+                can_start = len(self.drivers) < self.config.pool_size
+                if can_start:
+                    pooled = PooledDriver(next(self.ids), None)
+                    self.drivers[pooled.driver_id] = pooled
+            if can_start:
+                try:
+                    pooled.driver = self._start_driver()
+                except Exception:
+                    with self.lock:
+                        self.drivers.pop(pooled.driver_id, None)
+                    raise
+                with self.lock:
+                    closed = self.closed
+                if closed:
+                    self._quit(pooled)
+                    raise RuntimeError("Driver pool is closed")
+                self.logger.info(f"Started Chrome driver {pooled.driver_id}")
+                return pooled
+            # everyone is busy. wait for a driver to be handed back
+            try:
+                pooled = self.idle.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self.lock:
+                if not self.closed:
+                    return pooled
+
+    def _release(self, pooled: PooledDriver, healthy: bool) -> None:
+        memory = self._driver_memory_mb(pooled)
+        self.logger.info(f"Chrome driver {pooled.driver_id}: {pooled.pages} pages, memory {memory} MB")
+        recycle = (not healthy
+                   or pooled.pages >= self.config.max_pages_per_driver
+                   or (memory is not None and memory > self.config.max_memory_mb))
+        with self.lock:
+            closed = self.closed
+            if recycle or closed:
+                self.drivers.pop(pooled.driver_id, None)
+        if recycle or closed:
+            self.logger.info(f"Recycling Chrome driver {pooled.driver_id}")
+            self._quit(pooled)
+        else:
+            self.idle.put(pooled)
+
+    def _start_driver(self) -> webdriver.Chrome:
+        options = Options()
+        if self.headless:
+            options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--disable-extensions")
+        # don't wait for images/css/etc. DOMContentLoaded is all we need to start scrolling
+        options.page_load_strategy = self.config.page_load_strategy
+        if self.config.block_images:
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        driver = webdriver.Chrome(options=options)
+        if self.config.blocked_urls:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.config.blocked_urls})
+        return driver
+
+    def _quit(self, pooled: PooledDriver) -> None:
+        try:
+            pooled.driver.quit()
+        except Exception:
+            self.logger.exception(f"Could not quit Chrome driver {pooled.driver_id}")
+
+    def _driver_memory_mb(self, pooled: PooledDriver) -> Optional[float]:
+        try:
+            pid = pooled.driver.service.process.pid
+        except AttributeError:
+            return None
+        rss_kb = _process_tree_rss_kb(pid)
+        return round(rss_kb / 1024, 1) if rss_kb is not None else None
+
+
+def _process_tree_rss_kb(root_pid: int) -> Optional[int]:
+    """
+    Sums VmRSS for a process and all its descendants. Only works where /proc is available (i.e. Linux).
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    children: Dict[int, list] = {}
+    rss: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        pid = int(entry)
+        children.setdefault(int(status["PPid"].strip()), []).append(pid)
+        rss[pid] = int(status["VmRSS"].split()[0]) if "VmRSS" in status else 0
+
+    if root_pid not in rss:
+        return None
+    total = 0
+    to_visit = [root_pid]
+    while to_visit:
+        pid = to_visit.pop()
+        total += rss.get(pid, 0)
+        to_visit.extend(children.get(pid, []))
+    return total
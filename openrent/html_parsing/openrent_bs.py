@@ -1,72 +1,192 @@
 import logging
+import threading
 import time
 import urllib.parse
-from typing import Optional, Set
-from urllib.parse import urlencode
+from collections import OrderedDict
+from typing import Iterator, Optional, Set, Tuple
 
-import dateparser
-import requests
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 
+from dates import parse_available_from
+from html_store import RawHtmlStore
+from http_client import HttpClient, Validators
+from metrics import METRICS
+from openrent_http_search import OpenRentHttpSearch, extract_property_ids, search_url
 from property_details import ORPropertyDetails
-from search_config import SearchConfig
+from provider import ListingProvider
+from search_config import Crawler, SearchConfig
 
+INFINITE_SCROLL_SLEEP = 3
 
-class OpenRentBeautifulSoup:
+
+class OpenRentBeautifulSoup(ListingProvider):
     """
-    This class includes all the html parsing code to retrieve:
+    The OpenRent provider. This class includes all the html parsing code to retrieve:
     * a list of properties available based on a search
     * information about each property.
 
-    If I add other websites there should be a base class defining the interface and each class should overwrite it with
-    customized HTML parsing for each site.
+    OpenRent ids are used as they are (id_offset 0), so everything stored before there were other providers stays valid.
 
     Bits of the html parsing code inspired by https://github.com/afiodorov/openrent
     """
+    name = "openrent"
+    id_offset = 0
 
-    def __init__(self):
+    def __init__(self, crawler_config: Crawler = None, http_client: HttpClient = None,
+                 html_store: RawHtmlStore = None):
         self.logger = logging.getLogger()
+        self.crawler_config = crawler_config if crawler_config else Crawler()
+        # shared by every worker so the whole process reuses the same connections and stays within the per host budget
+        self.http_client = http_client if http_client else HttpClient(self.crawler_config)
+        # url -> (validators, parsed property). lets a 304 skip both the download and the parsing
+        self.conditional_cache = OrderedDict()
+        self.conditional_cache_lock = threading.Lock()
+        # started on the first search since that's when we know if the browser should be headless or not
+        self.driver_pool = None
+        self.http_search = None
+        # raw html of everything we fetch, for offline re-parsing
+        self.html_store = html_store
+        self.fast_extractor = None
 
     def search_properties(self, search_config: SearchConfig, location: str, headless=True) -> Set[int]:
         """
         Returns a set of all property ids matching a query.
         """
+        property_ids = set()
+        for page_ids in self.iter_property_ids(search_config, location, headless):
+            property_ids |= page_ids
+        return property_ids
 
-        params = search_config.get_query_fields()
-        # Configure Selenium
-        options = Options()
-        options.headless = headless
-        driver = webdriver.Chrome(options=options)
+    def iter_property_ids(self, search_config: SearchConfig, location: str, headless=True) -> Iterator[Set[int]]:
+        """
+        Yields the property ids matching a query as they are found. The selenium engine only knows them once it
+        scrolled to the end of the results, the http one yields them page by page.
+        """
+        if self.crawler_config.search_engine == "http":
+            if self.http_search is None:
+                self.http_search = OpenRentHttpSearch(self.http_client, self.crawler_config, self.keep_raw_html)
+            yield from self.http_search.iter_property_ids(search_config, location)
+        else:
+            yield self._search_properties_selenium(search_config, location, headless)
+
+    def _search_properties_selenium(self, search_config: SearchConfig, location: str, headless=True) -> Set[int]:
+        if self.driver_pool is None:
+            # selenium takes a while to import and the http search engine doesn't need it
+            from driver_pool import ChromeDriverPool
+            self.driver_pool = ChromeDriverPool(self.crawler_config.selenium, headless=headless)
 
         # since we can have our search start around various locations each location requires its own query
-        params['term'] = location
-        query_string = urlencode(
-            params)
-
-        url = f"http://www.openrent.co.uk/properties-to-rent/?{query_string}"
+        url = search_url(search_config, location)
         self.logger.debug(url)
-        driver.get(url)
+        with self.driver_pool.driver() as driver:
+            with METRICS.timer("search_page_load_seconds", "Search page loads"):
+                driver.get(url)
+
+            # since the site has infinite scrolling we need to scroll to the bottom to capture all results
+            scrolls = METRICS.counter("search_scroll_iterations_total", "Infinite scroll iterations")
+            with METRICS.timer("search_scroll_seconds", "Scrolling to the end of the search results"):
+                current_offset = -1
+                while driver.execute_script("return window.pageYOffset;") != current_offset:
+                    current_offset = driver.execute_script("return window.pageYOffset;")
+                    time.sleep(INFINITE_SCROLL_SLEEP)
+                    driver.execute_script("window.scrollTo(0,document.body.scrollHeight)")
+                    scrolls.inc()
+
+            html_doc = driver.page_source
+
+        self.keep_raw_html(url, html_doc, "search")
+        # get all property ids
+        return set(extract_property_ids(html_doc))
 
-        # since the site has infinite scrolling we need to scroll to the bottom to capture all results
-        current_offset = -1
-        while driver.execute_script("return window.pageYOffset;") != current_offset:
-            current_offset = driver.execute_script("return window.pageYOffset;")
-            time.sleep(3)
-            driver.execute_script("window.scrollTo(0,document.body.scrollHeight)")
+    def keep_raw_html(self, url: str, html_doc: str, kind: str, property_id: int = None) -> None:
+        if self.html_store is None:
+            return
+        try:
+            self.html_store.put(url, html_doc, kind, property_id)
+        except Exception:
+            # losing a copy of the page is not worth failing the property for
+            self.logger.exception(f"Could not store html for {url}")
 
-        html_doc = driver.page_source
-        # get all property ids
-        soup = BeautifulSoup(html_doc, 'html.parser')
-        property_ids = [x['href'][1:] for x in soup.find_all("a", {'class': "pli clearfix"})]
-        return set([int(property_id) for property_id in property_ids])
+    def property_url(self, property_id: int) -> str:
+        return f"{self.crawler_config.base_url.rstrip('/')}/{property_id}"
+
+    def close(self) -> None:
+        if self.driver_pool:
+            self.driver_pool.close()
+        self.http_client.close()
 
     def parse_property_data(self, property_id: int, url: str) -> ORPropertyDetails:
         """
            Retrieve data about a property from OR.
         """
-        html_doc = requests.get(url,timeout=30).text
+        return self.fetch_property(property_id, url)[0]
+
+    def fetch_property(self, property_id: int, url: str,
+                       validators: Validators = None) -> Tuple[Optional[ORPropertyDetails], Validators]:
+        """
+        Fetches and parses a property, returning its details and the validators to re-check it with later.
+        With validators (e.g. stored from a previous run) the GET is conditional: if the page didn't change, and we
+        don't have it parsed in memory either, the details are None.
+        """
+        html_doc, cached, validators = self.fetch_property_page(property_id, url, validators)
+        if html_doc is None:
+            return cached, validators
+        property_details = self.parse_property_html(property_id, url, html_doc)
+        self.remember_property(url, validators, property_details)
+        return property_details, validators
+
+    def fetch_property_page(self, property_id: int, url: str, validators: Validators = None) -> Tuple[
+            Optional[str], Optional[ORPropertyDetails], Validators]:
+        """
+        The download half of fetch_property: (html, None, validators) or, when the page was not modified,
+        (None, details we parsed earlier if we still have them, validators).
+        """
+        with self.conditional_cache_lock:
+            cached_validators, cached = self.conditional_cache.get(url, (None, None))
+        if cached:
+            validators = cached_validators
+
+        with METRICS.timer("property_fetch_seconds", "Property page downloads"):
+            result = self.http_client.get(url, validators=validators)
+        if result.not_modified:
+            METRICS.counter("property_not_modified_total", "Property pages that did not change").inc()
+            self.logger.debug(f"{url} not modified")
+            if cached:
+                with self.conditional_cache_lock:
+                    self.conditional_cache.move_to_end(url)
+            return None, cached, validators
+
+        self.keep_raw_html(url, result.text, "property", property_id)
+        return result.text, None, result.validators
+
+    def remember_property(self, url: str, validators: Validators, property_details: ORPropertyDetails) -> None:
+        """
+        Keeps the parsed page so a 304 on the next visit skips the parsing as well.
+        """
+        if not validators:
+            return
+        with self.conditional_cache_lock:
+            self.conditional_cache[url] = (validators, property_details)
+            self.conditional_cache.move_to_end(url)
+            while len(self.conditional_cache) > self.crawler_config.http.conditional_cache_size:
+                self.conditional_cache.popitem(last=False)
+
+    def parse_property_html(self, property_id: int, url: str, html_doc: str) -> ORPropertyDetails:
+        """
+           Extract data about a property from its html page.
+        """
+        if self.crawler_config.parser == "fast":
+            if self.fast_extractor is None:
+                # imported here since openrent_fast reuses the helpers of this class
+                from openrent_fast import OpenRentFastExtractor
+                self.fast_extractor = OpenRentFastExtractor()
+            return self.fast_extractor.parse_property_html(property_id, url, html_doc)
+        return self.parse_property_soup(property_id, url, html_doc)
+
+    def parse_property_soup(self, property_id: int, url: str, html_doc: str) -> ORPropertyDetails:
+        """
+           Extract data about a property by walking a full BeautifulSoup tree of the page.
+        """
         soup = BeautifulSoup(html_doc, 'lxml')
         self._preprocess(soup)
         price = soup.find_all("h3", {"class": "price-title"})[0]
@@ -150,10 +270,7 @@ class OpenRentBeautifulSoup:
     @staticmethod
     def _available_from(features) -> str:
         date_text = [x[1] for x in features if x[0] == "Available From"][0]
-        parsed = dateparser.parse(date_text)
-        if not parsed:
-            return date_text
-        return str(parsed.date())
+        return parse_available_from(date_text)
 
     @staticmethod
     def _bedrooms(overview) -> int:
@@ -0,0 +1,170 @@
+import threading
+import urllib.parse
+from typing import Dict, List, Optional
+
+from lxml import etree
+
+from openrent_bs import OpenRentBeautifulSoup
+from property_details import ORPropertyDetails
+
+TICKS = {"fa fa-check": "yes", "fa fa-times": "no"}
+# regions whose table rows we collect
+FEATURES, OVERVIEW, TRANSPORT = "features", "overview", "transport"
+
+
+def _classes(element) -> List[str]:
+    return (element.get("class") or "").split()
+
+
+def _has_class(element, value: str) -> bool:
+    # same rule as BeautifulSoup: one of the classes or the whole (normalized) attribute
+    classes = _classes(element)
+    return value in classes or value == " ".join(classes)
+
+
+def _text(element) -> str:
+    """
+    Text of an element the way BeautifulSoup's get_text() sees it: comments are skipped and whitespace only strings
+    are collapsed to a single newline (or space), except inside <pre>/<textarea>.
+    """
+    chunks = []
+
+    def add(chunk: Optional[str], node) -> None:
+        if not chunk:
+            return
+        if chunk.isspace() and not _preserves_whitespace(node):
+            chunk = "\n" if "\n" in chunk else " "
+        chunks.append(chunk)
+
+    def walk(node) -> None:
+        add(node.text, node)
+        for child in node:
+            if isinstance(child.tag, str):
+                walk(child)
+            add(child.tail, node)
+
+    walk(element)
+    return "".join(chunks)
+
+
+def _preserves_whitespace(node) -> bool:
+    while node is not None:
+        if node.tag in ("pre", "textarea"):
+            return True
+        node = node.getparent()
+    return False
+
+
+class OpenRentFastExtractor:
+    """
+    Extracts the same ORPropertyDetails as OpenRentBeautifulSoup.parse_property_html but without building a
+    BeautifulSoup tree. The page is parsed by lxml and then walked exactly once: every field (and the tick icons that
+    have to be rewritten to yes/no) is picked up as the walk goes past it. Only the few elements we need are turned
+    into python strings.
+    """
+
+    def __init__(self):
+        # lxml parsers must not be shared between threads
+        self.local = threading.local()
+
+    def parse_property_html(self, property_id: int, url: str, html_doc: str) -> ORPropertyDetails:
+        if not hasattr(self.local, "parser"):
+            self.local.parser = etree.HTMLParser()
+        root = etree.fromstring(html_doc, self.local.parser)
+        if root is None:
+            raise ValueError(f"Empty page for property {property_id}")
+
+        title = price = description = description_element = broadband_link = None
+        found_regions = set()
+        # region -> element that opened it. a region ends when we leave that element
+        open_regions: Dict[str, etree._Element] = {}
+        rows: Dict[str, List[List[str]]] = {FEATURES: [], OVERVIEW: [], TRANSPORT: []}
+        # rows of the region's tables as we see them (None while outside a row)
+        current_rows: Dict[str, Optional[List[str]]] = {}
+        transport_rows_seen = 0
+
+        for event, element in etree.iterwalk(root, events=("start", "end")):
+            tag = element.tag
+            if not isinstance(tag, str):
+                # comments and processing instructions
+                continue
+            if event == "start":
+                if tag == "div":
+                    if FEATURES not in found_regions and element.get("id") == "Features":
+                        found_regions.add(FEATURES)
+                        open_regions[FEATURES] = element
+                    if TRANSPORT not in found_regions and element.get("id") == "LocalTransport":
+                        found_regions.add(TRANSPORT)
+                        open_regions[TRANSPORT] = element
+                    if OVERVIEW not in found_regions and " ".join(_classes(element)) == "card manage-card mb-0":
+                        found_regions.add(OVERVIEW)
+                        open_regions[OVERVIEW] = element
+                    if description_element is None and _has_class(element, "description"):
+                        description_element = element
+                elif tag == "tr":
+                    for region in open_regions:
+                        if region == TRANSPORT:
+                            transport_rows_seen += 1
+                            # first row is the header
+                            if transport_rows_seen == 1:
+                                continue
+                        current_rows[region] = []
+                elif tag == "a" and broadband_link is None and "comparebroadband" in (element.get("href") or ""):
+                    broadband_link = element.get("href")
+                continue
+
+            # end events: the element and everything in it has been seen
+            if tag == "i" and element.get("class"):
+                tick = TICKS.get(" ".join(_classes(element)))
+                if tick and _text(element) == "":
+                    for child in element:
+                        element.remove(child)
+                    element.text = tick
+            elif tag == "td":
+                cell = None
+                for region, row in current_rows.items():
+                    if row is not None:
+                        if cell is None:
+                            cell = _text(element).strip()
+                        if cell:
+                            row.append(cell)
+            elif tag == "tr":
+                for region, row in current_rows.items():
+                    if row is not None:
+                        rows[region].append(row)
+                        current_rows[region] = None
+            elif tag == "div":
+                for region, opened_by in list(open_regions.items()):
+                    if opened_by is element:
+                        del open_regions[region]
+                if element is description_element:
+                    description = _text(element).strip()
+            elif tag == "h1" and title is None and _has_class(element, "property-title"):
+                title = _text(element).strip()
+            elif tag == "h3" and price is None and _has_class(element, "price-title"):
+                price = float(_text(element)[1:].replace(',', ''))
+
+        if price is None or description is None or title is None:
+            raise ValueError(f"Price, description or title missing for property {property_id}")
+        if FEATURES not in found_regions or OVERVIEW not in found_regions:
+            raise ValueError(f"Features or overview missing for property {property_id}")
+        if broadband_link is None:
+            raise ValueError(f"Broadband link missing for property {property_id}")
+
+        features = rows[FEATURES]
+        overview = rows[OVERVIEW]
+        return ORPropertyDetails(
+            property_id=property_id,
+            title=title,
+            location=rows[TRANSPORT],
+            price=price,
+            description=description,
+            available_from=OpenRentBeautifulSoup._available_from(features),
+            epc=OpenRentBeautifulSoup._epc_rating(features),
+            has_garden=OpenRentBeautifulSoup._has_garden(features),
+            post_code=urllib.parse.unquote(broadband_link.split("=")[1]),
+            features=features,
+            url=url,
+            bedrooms=OpenRentBeautifulSoup._bedrooms(overview),
+            bathrooms=OpenRentBeautifulSoup._bathrooms(overview),
+        )
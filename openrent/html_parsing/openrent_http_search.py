@@ -0,0 +1,70 @@
+import json
+import logging
+import re
+from typing import Callable, Iterator, List, Set
+from urllib.parse import urlencode
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from http_client import HttpClient
+from metrics import METRICS
+from search_config import Crawler, SearchConfig
+
+SEARCH_PATH = "/properties-to-rent/"
+
+# the search page ships the ids of every match in a js array which the infinite scroll then pages through
+PROPERTY_IDS_PATTERN = re.compile(r"PROPERTYIDS\s*=\s*(\[[\d,\s]*\])")
+# listing cards link to /<property id>
+LISTING_LINKS = SoupStrainer("a", class_=re.compile(r"\bpli\b"))
+
+
+def search_url(search_config: SearchConfig, location: str, **extra_params) -> str:
+    params = search_config.get_query_fields()
+    params['term'] = location
+    params.update(extra_params)
+    return f"{search_config.crawler.base_url.rstrip('/')}{SEARCH_PATH}?{urlencode(params)}"
+
+
+def extract_property_ids(html_doc: str) -> List[int]:
+    """
+    Reads the property ids out of a search page. Only the listing links get parsed, the rest of the page is skipped.
+    """
+    soup = BeautifulSoup(html_doc, 'lxml', parse_only=LISTING_LINKS)
+    return [int(link['href'].strip("/")) for link in soup.find_all("a", href=True) if link['href'].strip("/").isdigit()]
+
+
+class OpenRentHttpSearch:
+    """
+    Browserless search. Instead of scrolling the results in Chrome we ask for the listing data over plain HTTP
+    and hand back the ids page by page, as soon as each page arrives.
+    """
+
+    def __init__(self, http_client: HttpClient, crawler_config: Crawler = None,
+                 keep_raw_html: Callable[[str, str, str], None] = None):
+        self.http_client = http_client
+        self.crawler_config = crawler_config if crawler_config else Crawler()
+        # called with (url, html, "search") for every page we get
+        self.keep_raw_html = keep_raw_html
+        self.logger = logging.getLogger()
+
+    def iter_property_ids(self, search_config: SearchConfig, location: str) -> Iterator[Set[int]]:
+        seen: Set[int] = set()
+        for page in range(self.crawler_config.max_search_pages):
+            url = search_url(search_config, location, skip=len(seen)) if page else search_url(search_config, location)
+            self.logger.debug(url)
+            with METRICS.timer("search_page_load_seconds", "Search page loads"):
+                html_doc = self.http_client.get(url).text
+            if self.keep_raw_html:
+                self.keep_raw_html(url, html_doc, "search")
+
+            embedded = PROPERTY_IDS_PATTERN.search(html_doc)
+            if embedded:
+                # every match is listed in the first response. no need to page
+                yield set(json.loads(embedded.group(1))) - seen
+                return
+
+            new_ids = set(extract_property_ids(html_doc)) - seen
+            if not new_ids:
+                return
+            seen |= new_ids
+            yield new_ids
@@ -0,0 +1,89 @@
+import importlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from html_store import RawHtmlStore
+from http_client import Validators
+from property_details import ORPropertyDetails
+from search_config import Crawler, SearchConfig
+
+# every provider maps its own listing ids into a range of this size so they can share the properties table
+ID_RANGE = 10 ** 10
+
+# name in config.yaml -> provider class. a name with a dot in it is taken as the import path of a plugin class
+PROVIDERS: Dict[str, str] = {
+    "openrent": "openrent_bs.OpenRentBeautifulSoup",
+}
+
+
+@dataclass(frozen=True)
+class Listing:
+    """
+    A search result. Sites that show the address and price in their results can fill in the dedup key so a listing
+    we already have from another site is not even fetched.
+    """
+    property_id: int
+    dedup_key: Optional[str] = None
+
+
+class ListingProvider:
+    """
+    A listing site: searching it and parsing its property pages. The pipeline only talks to providers through these
+    methods, so adding a site is a matter of subclassing this and registering the class in PROVIDERS.
+
+    Ids of a provider are its native listing ids plus `id_offset` (see ID_RANGE): they stay unique across sites, and
+    the provider a stored property came from can be told from its id alone.
+    Every provider has its own http client, so each site gets its own rate budget and connection pool.
+    """
+    name = ""
+    id_offset = 0
+
+    def owns(self, property_id: int) -> bool:
+        return self.id_offset <= property_id < self.id_offset + ID_RANGE
+
+    def iter_property_ids(self, search_config: SearchConfig, location: str, headless=True) -> Iterator[Set[int]]:
+        raise NotImplementedError
+
+    def iter_listings(self, search_config: SearchConfig, location: str, headless=True) -> Iterator[List[Listing]]:
+        """
+        Search results as they are found. Providers that know more than the ids from their search pages override it.
+        """
+        for property_ids in self.iter_property_ids(search_config, location, headless):
+            yield [Listing(property_id) for property_id in property_ids]
+
+    def property_url(self, property_id: int) -> str:
+        raise NotImplementedError
+
+    def fetch_property(self, property_id: int, url: str,
+                       validators: Validators = None) -> Tuple[Optional[ORPropertyDetails], Validators]:
+        raise NotImplementedError
+
+    def fetch_property_page(self, property_id: int, url: str, validators: Validators = None) -> Tuple[
+            Optional[str], Optional[ORPropertyDetails], Validators]:
+        raise NotImplementedError
+
+    def parse_property_html(self, property_id: int, url: str, html_doc: str) -> ORPropertyDetails:
+        raise NotImplementedError
+
+    def remember_property(self, url: str, validators: Validators, property_details: ORPropertyDetails) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def provider_class(name: str) -> type:
+    path = PROVIDERS.get(name, name)
+    if "." not in path:
+        raise ValueError(f"Unknown provider {name}. Known ones: {', '.join(PROVIDERS)}")
+    module_name, class_name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_providers(names: List[str], crawler_config: Crawler,
+                     html_store: RawHtmlStore = None) -> List[ListingProvider]:
+    providers = [provider_class(name)(crawler_config, html_store=html_store) for name in names]
+    offsets = [provider.id_offset for provider in providers]
+    if len(set(offsets)) != len(offsets):
+        raise ValueError(f"Providers {names} share an id range")
+    return providers
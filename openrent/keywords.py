@@ -0,0 +1,222 @@
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# where a term was found: (start, end) in the lowercased text
+Hits = Dict[str, List[Tuple[int, int]]]
+Predicate = Callable[[Hits, str], bool]
+
+# words of a phrase can be split by any whitespace or a hyphen ("en-suite", "en suite")
+SEPARATOR = r"[\s-]+"
+WORD = re.compile(r"\w+")
+# past this many distinct first words the str.find calls cost more than they save
+MAX_PREFILTER_WORDS = 8
+TOKEN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|NEAR/(\d+)\b|(AND|OR|NOT)\b|([\w\'-]+)|(\S))')
+
+
+class KeywordExpressionError(ValueError):
+    pass
+
+
+def normalize_term(text: str) -> str:
+    return " ".join(re.split(SEPARATOR, text.strip().lower()))
+
+
+class KeywordMatcher:
+    """
+    Boolean keyword expressions, all compiled into one regex and matched with a single scan of the text no matter how
+    many there are. An expression is made of:
+    * words (garden) and "quoted phrases" ("floor heating"), matched as whole words, case insensitive
+    * a NEAR/n b: both terms with at most n words between them, in any order
+    * AND (or just a space), OR, NOT and parentheses. NOT binds tighter than AND, AND tighter than OR
+    e.g. '"floor heating" OR underfloor', 'garden NEAR/3 private AND NOT (shared OR communal)'
+
+    The regex is a trie of every term (common prefixes factored out) run over a lowercased copy of the text. That's a
+    lot faster than a case insensitive regex and keeps the cost of a scan flat as terms are added. With only a handful
+    of distinct first words (the usual config) a str.find for each of them skips the regex over text that can't match.
+    """
+
+    def __init__(self, expressions: Iterable[str]) -> None:
+        self.terms: Dict[str, int] = {}
+        self.predicates: List[Predicate] = [_Parser(expression, self.terms).parse() for expression in expressions]
+        # a hit on "garden flat" is a hit on "garden" as well: the regex only reports the longest term at a position
+        self.implied: Dict[str, List[str]] = {
+            term: [other for other in self.terms if term == other or term.startswith(other + " ")]
+            for term in self.terms}
+        self.pattern = re.compile(_trie_regex(list(self.terms)) + r"(?!\w)") if self.terms else None
+        first_words = {re.split(SEPARATOR, term)[0] for term in self.terms}
+        self.first_words = sorted(first_words) if len(first_words) <= MAX_PREFILTER_WORDS else None
+
+    def scan(self, text: str) -> Tuple[Hits, str]:
+        text = text.lower()
+        hits: Hits = {}
+        if self.pattern is None:
+            return hits, text
+        pos = 0
+        if self.first_words is not None:
+            # every match starts with one of the first words, so start the regex at the earliest one
+            found = [index for index in (text.find(word) for word in self.first_words) if index >= 0]
+            if not found:
+                return hits, text
+            pos = min(found)
+        while True:
+            match = self.pattern.search(text, pos)
+            if match is None:
+                return hits, text
+            start = match.start()
+            # the regex has no leading \b (it would cost the fast first character scan), so check it here
+            if start == 0 or not _is_word_char(text[start - 1]):
+                matched = normalize_term(match.group())
+                for term in self.implied[matched]:
+                    hits.setdefault(term, []).append((start, match.end() if term == matched else start + len(term)))
+            # next search from the next character so terms overlapping this one are found too
+            pos = start + 1
+
+    def match(self, text: str) -> List[bool]:
+        """
+        For every expression, in order, whether the text matches it.
+        """
+        hits, text = self.scan(text)
+        return [predicate(hits, text) for predicate in self.predicates]
+
+    def match_many(self, texts: Iterable[Optional[str]]) -> List[List[bool]]:
+        return [self.match(text or "") for text in texts]
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _trie_regex(terms: List[str]) -> str:
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _node_regex(trie)
+
+
+def _node_regex(node: Dict) -> str:
+    branches = [(SEPARATOR if char == " " else re.escape(char)) + _node_regex(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    ends_here = "" in node
+    if len(branches) == 1 and not ends_here:
+        return branches[0]
+    # greedy: the longest term wins, backtracking to a shorter one if the longer one doesn't end on a word boundary
+    return "(?:" + "|".join(branches) + ")" + ("?" if ends_here else "")
+
+
+class _Parser:
+    def __init__(self, expression: str, terms: Dict[str, int]) -> None:
+        self.expression = expression
+        self.terms = terms
+        self.tokens = self._tokenize(expression)
+        self.pos = 0
+
+    def parse(self) -> Predicate:
+        if not self.tokens:
+            raise KeywordExpressionError(f"Empty keyword expression {self.expression!r}")
+        predicate = self._or()
+        if self.pos < len(self.tokens):
+            raise self._error(f"unexpected {self.tokens[self.pos][1]!r}")
+        return predicate
+
+    def _tokenize(self, expression: str) -> List[Tuple[str, str]]:
+        tokens = []
+        for match in TOKEN.finditer(expression.strip()):
+            opening, closing, phrase, near, operator, word, other = match.groups()
+            if other is not None:
+                raise KeywordExpressionError(f"Unexpected {other!r} in keyword expression {expression!r}")
+            if opening or closing:
+                tokens.append(("paren", opening or closing))
+            elif phrase is not None:
+                tokens.append(("term", phrase))
+            elif near is not None:
+                tokens.append(("near", near))
+            elif operator:
+                tokens.append((operator, operator))
+            else:
+                tokens.append(("term", word))
+        return tokens
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _error(self, message: str) -> KeywordExpressionError:
+        return KeywordExpressionError(f"{message} in keyword expression {self.expression!r}")
+
+    def _or(self) -> Predicate:
+        operands = [self._and()]
+        while self._peek() == ("OR", "OR"):
+            self.pos += 1
+            operands.append(self._and())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda hits, text: any(operand(hits, text) for operand in operands)
+
+    def _and(self) -> Predicate:
+        operands = [self._not()]
+        while True:
+            token = self._peek()
+            if token == ("AND", "AND"):
+                self.pos += 1
+            elif token is None or (token[0] not in ("term", "NOT") and token != ("paren", "(")):
+                break
+            # two operands next to each other are ANDed as well
+            operands.append(self._not())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda hits, text: all(operand(hits, text) for operand in operands)
+
+    def _not(self) -> Predicate:
+        if self._peek() == ("NOT", "NOT"):
+            self.pos += 1
+            operand = self._not()
+            return lambda hits, text: not operand(hits, text)
+        return self._near()
+
+    def _near(self) -> Predicate:
+        token = self._peek()
+        if token == ("paren", "("):
+            self.pos += 1
+            predicate = self._or()
+            if self._peek() != ("paren", ")"):
+                raise self._error("missing )")
+            self.pos += 1
+            return predicate
+        first = self._term()
+        if self._peek() is None or self._peek()[0] != "near":
+            return lambda hits, text: first in hits
+        max_words = int(self._peek()[1])
+        self.pos += 1
+        second = self._term()
+        return lambda hits, text: _near(hits.get(first, ()), hits.get(second, ()), max_words, text)
+
+    def _term(self) -> str:
+        token = self._peek()
+        if token is None or token[0] != "term":
+            raise self._error(f"expected a word or a phrase, got {token[1]!r}" if token else "expected a word or a phrase")
+        self.pos += 1
+        term = normalize_term(token[1])
+        if not term:
+            raise self._error("empty phrase")
+        self.terms.setdefault(term, len(self.terms))
+        return term
+
+
+def _near(first: List[Tuple[int, int]], second: List[Tuple[int, int]], max_words: int, text: str) -> bool:
+    for first_start, first_end in first:
+        for second_start, second_end in second:
+            # words strictly between the two, whichever comes first
+            if first_end <= second_start:
+                between = text[first_end:second_start]
+            elif second_end <= first_start:
+                between = text[second_end:first_start]
+            else:
+                # overlapping
+                return True
+            if len(WORD.findall(between)) <= max_words:
+                return True
+    return False
@@ -0,0 +1,441 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, TYPE_CHECKING
+
+from sqlalchemy.engine import Row
+
+from db import DbConnOrm
+from dedup import DedupIndex, dedup_key
+from http_client import Validators
+from metrics import METRICS
+from profiling import profile_thread
+from property import Property
+from property_details import ORPropertyDetails
+from property_writer import PropertyWriter
+from provider import ID_RANGE, Listing, ListingProvider, create_providers
+from run_journal import DONE, SEARCHED, SEARCHING, RunJournal
+from scoring import Scoring
+from search_config import Crawler, SearchConfig
+from seen_properties import SeenProperties
+
+if TYPE_CHECKING:
+    from slack_client import Slack
+
+# tells a stage worker that nothing else is coming
+_STOP = object()
+
+# one parser per provider per worker process
+_PARSERS: Dict[str, ListingProvider] = {}
+
+
+def init_parser_process(crawler_config: Crawler, provider_names: Sequence[str] = ("openrent",)) -> None:
+    global _PARSERS
+    _PARSERS = {provider.name: provider for provider in create_providers(list(provider_names), crawler_config)}
+
+
+def _parse_in_process(provider_name: str, property_id: int, url: str, html_doc: str) -> ORPropertyDetails:
+    return _PARSERS[provider_name].parse_property_html(property_id, url, html_doc)
+
+
+@dataclass
+class PipelineItem:
+    """
+    A property on its way through the pipeline. Every stage fills in its part and drops what's no longer needed
+    (e.g. the html once it's parsed).
+    """
+    location: str
+    property_id: int
+    # stored fingerprint/validators when this is a re-check of a known property
+    recheck_state: Optional[Row] = None
+    html_doc: Optional[str] = None
+    validators: Optional[Validators] = None
+    details: Optional[ORPropertyDetails] = None
+    new_property: Optional[Property] = None
+    # a re-check that found nothing worth re-scoring
+    unchanged: bool = False
+    # a new listing we already have from another provider
+    duplicate_of: Optional[int] = None
+    dedup_key: Optional[str] = None
+    error: Optional[BaseException] = None
+    found_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _LocationSearched:
+    location: str
+
+
+@dataclass
+class LocationProgress:
+    # the search is over: nothing else will be submitted for this location
+    searched: bool = False
+    found: int = 0
+    submitted: int = 0
+    processed: int = 0
+    new: int = 0
+    rechecks: int = 0
+    notifications_sent: int = 0
+    unchanged_checks: List[Dict] = field(default_factory=list)
+
+
+@dataclass
+class PipelineStats:
+    found: int = 0
+    new: int = 0
+    rechecked: int = 0
+    changed: int = 0
+    failed: int = 0
+    notified: int = 0
+    stored: int = 0
+    # listings skipped because another provider has them too
+    duplicates: int = 0
+
+
+class _Stage:
+    """
+    `workers` threads taking items from `inbox`, handing them to `handler` and putting the result in `outbox`.
+    The last worker to see _STOP tells every worker of the next stage to stop as well.
+    Items that failed in an earlier stage are passed along untouched so the sink (the stage without an outbox) can
+    account for them.
+    """
+
+    def __init__(self, name: str, workers: int, handler: Callable, inbox: queue.Queue,
+                 outbox: Optional[queue.Queue]) -> None:
+        self.name = name
+        self.handler = handler
+        self.inbox = inbox
+        self.outbox = outbox
+        self.logger = logging.getLogger()
+        self.next_stage: Optional[_Stage] = None
+        self.running = workers
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=profile_thread(self._work), name=f"{name}-{idx}", daemon=True)
+                        for idx in range(workers)]
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def join(self) -> None:
+        for thread in self.threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                with self.lock:
+                    self.running -= 1
+                    last = self.running == 0
+                if last and self.next_stage:
+                    for _ in self.next_stage.threads:
+                        self.outbox.put(_STOP)
+                return
+            try:
+                if self.outbox is None or not isinstance(item, PipelineItem) or item.error is None:
+                    self.handler(item)
+            except Exception as e:
+                if self.outbox is None:
+                    # nothing after us to report it
+                    self.logger.exception(f"{self.name} failed")
+                else:
+                    item.error = e
+            if self.outbox is not None:
+                self.outbox.put(item)
+
+
+class Pipeline:
+    """
+    One run as a stream: discover -> fetch -> parse -> score -> notify & persist.
+    Stages are connected by bounded queues so a slow stage makes the ones before it wait instead of piling up
+    properties in memory. Fetching and scoring (TFL) are I/O bound and run on threads; parsing is CPU bound and runs on
+    a process pool. Discovery moves on to the next location while the previous one is still being processed. Nothing is
+    kept once it's stored.
+
+    Every provider is searched by its own discovery thread (on the caller's thread when there is only one), all of them
+    feeding the same stages. With more than one provider, new listings are matched across providers by their dedup key
+    (see dedup.py): a listing another provider already has is remembered as an alias of that one and goes no further.
+    The key is checked on the search results when the provider has it there, else once the page is parsed, before
+    scoring, so a duplicate never costs TFL calls or a notification.
+    """
+
+    def __init__(self, search_config: SearchConfig, providers: List[ListingProvider], scoring: Scoring,
+                 slack: "Slack", db_connector: DbConnOrm, parse_pool: Executor = None,
+                 seen_properties: SeenProperties = None, resume: bool = True) -> None:
+        self.search_config = search_config
+        self.crawler_config = search_config.crawler
+        self.providers = providers
+        self.scoring = scoring
+        self.slack = slack
+        self.db_connector = db_connector
+        self.parse_pool = parse_pool
+        self.logger = logging.getLogger()
+        self.stats = PipelineStats()
+        self.progress: Dict[str, LocationProgress] = {}
+        self.seen_properties = seen_properties if seen_properties else SeenProperties(db_connector.engine)
+        self.journal = RunJournal(db_connector.engine, search_config, resume)
+        self.writer = PropertyWriter(db_connector, search_config.storage)
+        # cross-provider matching only makes sense with more than one of them
+        self.dedup = DedupIndex(db_connector, lambda property_id: property_id // ID_RANGE) if len(
+            providers) > 1 else None
+        # ids found during this run (by any provider) are kept in memory. the ones stored before are filtered out batch
+        # by batch
+        self.found_this_run: Set[int] = set()
+        self.lock = threading.Lock()
+
+    def run(self, locations: Iterable[str], headless=True) -> PipelineStats:
+        queue_size = self.crawler_config.queue_size
+        fetch_q, parse_q, score_q, sink_q = (queue.Queue(maxsize=queue_size) for _ in range(4))
+        workers = self.crawler_config.max_workers
+        fetch = _Stage("fetch", workers, self._fetch, fetch_q, parse_q)
+        parse = _Stage("parse", max(1, self.crawler_config.parse_workers), self._parse, parse_q, score_q)
+        score = _Stage("score", workers, self._score, score_q, sink_q)
+        sink = _Stage("sink", 1, self._sink, sink_q, None)
+        fetch.next_stage, parse.next_stage, score.next_stage = parse, score, sink
+        stages = [fetch, parse, score, sink]
+        for stage in stages:
+            stage.start()
+
+        try:
+            self._discover_all(list(locations), fetch_q, sink_q, headless)
+        finally:
+            for _ in fetch.threads:
+                fetch_q.put(_STOP)
+            for stage in stages:
+                stage.join()
+            self.writer.close()
+        self.journal.finish()
+        self.stats.stored = self.writer.written
+        return self.stats
+
+    def _discover_all(self, locations: List[str], fetch_q: queue.Queue, sink_q: queue.Queue, headless: bool) -> None:
+        if len(self.providers) == 1:
+            self._discover(self.providers[0], locations, fetch_q, sink_q, headless)
+            return
+        errors: List[BaseException] = []
+
+        def discover(provider: ListingProvider) -> None:
+            try:
+                self._discover(provider, locations, fetch_q, sink_q, headless)
+            except BaseException as e:
+                self.logger.exception(f"[Provider: {provider.name}] Search failed")
+                errors.append(e)
+
+        threads = [threading.Thread(target=profile_thread(discover), args=(provider,), name=f"discover-{provider.name}", daemon=True)
+                   for provider in self.providers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def _location_key(self, provider: ListingProvider, location: str) -> str:
+        # with a single provider the journal, logs and messages stay as they were before there were providers
+        return location if len(self.providers) == 1 else f"{provider.name}:{location}"
+
+    def _discover(self, provider: ListingProvider, locations: List[str], fetch_q: queue.Queue, sink_q: queue.Queue,
+                  headless: bool) -> None:
+        for location in locations:
+            key = self._location_key(provider, location)
+            status = self.journal.status(key)
+            if status == DONE:
+                self.logger.info(f"[Location: {key}] Already done by the interrupted run. Skipping")
+                continue
+            progress = self.progress[key] = LocationProgress()
+            if status == SEARCHED:
+                # the interrupted run finished the search. no need to do it again
+                batches = [[Listing(property_id) for property_id in self.journal.discovered(key)]]
+            else:
+                self.journal.set_status(key, SEARCHING)
+                # listings come in as the search engine finds them so workers can start before the search is over
+                batches = provider.iter_listings(search_config=self.search_config, location=location,
+                                                 headless=headless)
+            for listings in batches:
+                property_ids = {listing.property_id for listing in listings}
+                progress.found += len(property_ids)
+                METRICS.counter("properties_found_total", "Property ids returned by searches").inc(len(property_ids))
+                self.journal.record_discovered(key, property_ids)
+                # remove all viewed properties (including the ones found for a previous location in this run)
+                with self.lock:
+                    new_ids = property_ids - self.found_this_run
+                    self.found_this_run |= new_ids
+                known_ids = self.seen_properties.contains_many(new_ids)
+                new_ids -= known_ids
+                new_ids -= self._skip_duplicates(new_ids, {listing.property_id: listing.dedup_key
+                                                           for listing in listings})
+                progress.new += len(new_ids)
+                for prop_id in new_ids:
+                    progress.submitted += 1
+                    fetch_q.put(PipelineItem(key, prop_id))
+                # known listings are re-checked (cheaply, they're conditional GETs) for price/content changes
+                for prop_id, state in self._due_for_recheck(known_ids).items():
+                    progress.submitted += 1
+                    progress.rechecks += 1
+                    fetch_q.put(PipelineItem(key, prop_id, recheck_state=state))
+            self.journal.set_status(key, SEARCHED)
+
+            self.logger.info(
+                f"[Location: {key}] Received {progress.found} property links. New ones: {progress.new}")
+            # send message to slack channel so humans know we're working
+            if progress.new == 0:
+                self.slack.send_message(f">>>> No new properties found for {key}")
+            else:
+                self.slack.send_message(f">>>> Yay!!! {progress.new} new properties were found for {key}")
+            # goes straight to the sink: once it has processed everything submitted so far, the location is done
+            sink_q.put(_LocationSearched(key))
+
+    def _skip_duplicates(self, property_ids: Set[int], dedup_keys: Dict[int, Optional[str]]) -> Set[int]:
+        """
+        The new listings that are duplicates of a listing of another provider: the ones known from earlier runs and
+        the ones whose search result already has a key somebody else claimed.
+        """
+        if self.dedup is None or not property_ids:
+            return set()
+        duplicates = set(self.db_connector.get_aliases(property_ids))
+        aliases = []
+        for prop_id in property_ids - duplicates:
+            owner = self.dedup.claim(dedup_keys.get(prop_id), prop_id)
+            if owner is not None:
+                duplicates.add(prop_id)
+                aliases.append({'property_id': prop_id, 'canonical_id': owner, 'dedup_key': dedup_keys[prop_id]})
+        self.db_connector.add_aliases(aliases)
+        if duplicates:
+            with self.lock:
+                self.stats.duplicates += len(duplicates)
+            METRICS.counter("properties_duplicate_total", "Listings another provider already had").inc(
+                len(duplicates))
+        return duplicates
+
+    def _provider(self, property_id: int) -> ListingProvider:
+        for provider in self.providers:
+            if provider.owns(property_id):
+                return provider
+        raise ValueError(f"No provider for property {property_id}")
+
+    def _due_for_recheck(self, property_ids: Set[int]) -> Dict[int, Row]:
+        recheck_after_hours = self.crawler_config.recheck_after_hours
+        if recheck_after_hours < 0 or not property_ids:
+            return {}
+        checked_before = time.time() - recheck_after_hours * 3600
+        return {prop_id: state for prop_id, state in self.db_connector.get_check_states(property_ids).items()
+                if not state.checked_unix or state.checked_unix < checked_before}
+
+    def _fetch(self, item: PipelineItem) -> None:
+        state = item.recheck_state
+        validators = Validators(state.etag, state.last_modified) if state else None
+        provider = self._provider(item.property_id)
+        item.html_doc, item.details, item.validators = provider.fetch_property_page(
+            item.property_id, provider.property_url(item.property_id), validators)
+
+    def _parse(self, item: PipelineItem) -> None:
+        if item.html_doc is None:
+            return
+        provider = self._provider(item.property_id)
+        url = provider.property_url(item.property_id)
+        # on the process pool this includes shipping the html over and the details back
+        with METRICS.timer("property_parse_seconds", "Property page parsing"):
+            if self.parse_pool:
+                item.details = self.parse_pool.submit(_parse_in_process, provider.name, item.property_id, url,
+                                                      item.html_doc).result()
+            else:
+                item.details = provider.parse_property_html(item.property_id, url, item.html_doc)
+        item.html_doc = None
+        provider.remember_property(url, item.validators, item.details)
+
+    def _score(self, item: PipelineItem) -> None:
+        state = item.recheck_state
+        if state is not None:
+            # rows stored before fingerprints existed just get one, there's nothing to compare with
+            if item.details is None or state.fingerprint is None or item.details.fingerprint() == state.fingerprint:
+                item.unchanged = True
+                return
+        if item.details is None:
+            raise ValueError(f"Property {item.property_id} was not modified but we have no details for it")
+        if state is None and self.dedup is not None:
+            item.dedup_key = dedup_key(item.details.title, item.details.post_code, item.details.price)
+            item.duplicate_of = self.dedup.claim(item.dedup_key, item.property_id)
+            if item.duplicate_of is not None:
+                return
+        new_property = Property(item.property_id, self._provider(item.property_id))
+        new_property.property_details = item.details
+        new_property.validators = item.validators
+        new_property.previous_fingerprint = state.fingerprint if state is not None else None
+        new_property.found_at = item.found_at
+        with METRICS.timer("scoring_seconds", "Scoring a property, TFL calls included"):
+            new_property.score_breakdown = self.scoring.compute_score_breakdown(new_property)
+        new_property.score = new_property.score_breakdown.total
+        new_property.score_reasons = new_property.score_breakdown.reasons
+        item.new_property = new_property
+
+    def _sink(self, item) -> None:
+        if isinstance(item, _LocationSearched):
+            self.progress[item.location].searched = True
+            self._maybe_finish_location(item.location)
+            return
+
+        progress = self.progress[item.location]
+        progress.processed += 1
+        try:
+            if item.recheck_state is not None:
+                self.stats.rechecked += 1
+                METRICS.counter("properties_rechecked_total", "Known properties re-checked").inc()
+            if item.error is not None:
+                # not stored so it will be picked up again on the next run
+                self.stats.failed += 1
+                METRICS.counter("properties_failed_total", "Properties that could not be processed").inc()
+                self.logger.error(f"Could not process property {item.property_id}", exc_info=item.error)
+            elif item.duplicate_of is not None:
+                with self.lock:
+                    self.stats.duplicates += 1
+                METRICS.counter("properties_duplicate_total", "Listings another provider already had").inc()
+                self.logger.info(f"Property {item.property_id} is a duplicate of {item.duplicate_of}")
+                self.db_connector.add_aliases([{'property_id': item.property_id, 'canonical_id': item.duplicate_of,
+                                                'dedup_key': item.dedup_key}])
+            elif item.unchanged:
+                progress.unchanged_checks.append({
+                    'property_id': item.property_id, 'etag': item.validators.etag if item.validators else None,
+                    'last_modified': item.validators.last_modified if item.validators else None,
+                    'details': item.details})
+            else:
+                new_property = item.new_property
+                if item.recheck_state is not None:
+                    self.stats.changed += 1
+                    METRICS.counter("properties_changed_total", "Known properties that changed").inc()
+                    self.logger.info(f"Property {item.property_id} changed since we last saw it")
+                else:
+                    self.stats.new += 1
+                    METRICS.counter("properties_new_total", "New properties scored").inc()
+                    self.seen_properties.add_many([item.property_id])
+                if self.slack.notify(new_property, self.search_config.scoring.notify_at):
+                    progress.notifications_sent += 1
+                    self.stats.notified += 1
+                    METRICS.counter("notifications_total", "Properties above notify_at").inc()
+                self.writer.add(new_property)
+                self.logger.info(new_property.url)
+                self.logger.debug(f"\tScore: {new_property.score}, \n\treasons:{new_property.score_reasons}")
+        finally:
+            # a failed item still counts, or its location would never be done
+            self._maybe_finish_location(item.location)
+
+    def _maybe_finish_location(self, location: str) -> None:
+        progress = self.progress[location]
+        if not progress.searched or progress.processed < progress.submitted:
+            return
+        # everything found for this location is stored before we call it done
+        self.writer.flush()
+        self.db_connector.mark_checked(progress.unchanged_checks)
+        if progress.rechecks:
+            self.logger.info(f"[Location: {location}] Re-checked {progress.rechecks} known properties. "
+                             f"{progress.rechecks - len(progress.unchanged_checks)} changed (or failed)")
+        self.seen_properties.save()
+        self.journal.set_status(location, DONE)
+        self.stats.found += progress.found
+        if progress.new != 0:
+            self.slack.send_message(
+                f">>>>> Out of {progress.new} only {progress.notifications_sent} properties had a score above the notification threshold. <<<<<")
+        del self.progress[location]
@@ -1,32 +1,51 @@
-import functools
 import logging
+from typing import Optional
 
 from openrent_bs import OpenRentBeautifulSoup
 from property_details import ORPropertyDetails
+from provider import ListingProvider
 
 
 class Property:
     """
-    This might not be needed after all. We can simplify it. But at the same time if we start querying other data sources
-    we might need this as a wrapper around some data.
+    A listing of one of the providers (OpenRent unless told otherwise) with its score. The details are fetched from the
+    provider the first time they're needed.
+    Slotted: no per instance dict, so a few hundred thousand of them stay cheap.
     """
+    __slots__ = ("property_id", "provider", "score", "score_reasons", "score_breakdown", "validators",
+                 "previous_fingerprint", "found_at", "_property_details")
 
-    def __init__(self, property_id: int) -> None:
+    def __init__(self, property_id: int, provider: ListingProvider = None) -> None:
         self.property_id = property_id
-        self.logger = logging.getLogger()
+        self.provider = provider if provider else OpenRentBeautifulSoup()
         self.score = None
         self.score_reasons = None
+        # components and commute times behind the score (a scoring.ScoreBreakdown)
+        self.score_breakdown = None
+        # ETag/Last-Modified of the page, stored so the listing can be re-checked cheaply later
+        self.validators = None
+        # set when a known listing changed (fingerprint of the stored version)
+        self.previous_fingerprint = None
+        # time.monotonic() of when the search found it
+        self.found_at = None
+        self._property_details: Optional[ORPropertyDetails] = None
 
-    @functools.cached_property
+    @property
     def property_details(self) -> ORPropertyDetails:
-        self.logger.debug(f"Processing property {self.property_id}")
-        pd = OpenRentBeautifulSoup().parse_property_data(self.property_id, self.url)
-        self.logger.debug(f"Property {pd}")
-        return pd
+        if self._property_details is None:
+            logger = logging.getLogger()
+            logger.debug(f"Processing property {self.property_id}")
+            self._property_details, self.validators = self.provider.fetch_property(self.property_id, self.url)
+            logger.debug(f"Property {self._property_details}")
+        return self._property_details
+
+    @property_details.setter
+    def property_details(self, property_details: ORPropertyDetails) -> None:
+        self._property_details = property_details
 
     @property
     def url(self) -> str:
-        return f"https://www.openrent.co.uk/{self.property_id}"
+        return self.provider.property_url(self.property_id)
 
     def __str__(self) -> str:
         return str(self.property_details)
@@ -0,0 +1,98 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np
+from sqlalchemy.engine import Row
+
+from batch_scoring import BatchScores, BatchScoring, PropertyBatch
+from search_config import SearchConfig
+
+if TYPE_CHECKING:
+    from commute_matrix import PrecomputedCommutes
+    from provider import ListingProvider
+
+
+@dataclass
+class ScoreChange:
+    property_id: int
+    old_score: Optional[float]
+    new_score: float
+    reasons: List[str]
+
+    def url(self, providers: Sequence["ListingProvider"]) -> str:
+        """
+        The listing on the site of the provider its id belongs to. Just the id if none of them owns it.
+        """
+        provider = next((provider for provider in providers if provider.owns(self.property_id)), None)
+        return provider.property_url(self.property_id) if provider else str(self.property_id)
+
+
+@dataclass
+class RescoreReport:
+    rescored: int = 0
+    # properties we have a post code for but no commute time to some (new) work location. They get full location
+    # weight, like properties without a post code
+    unknown_commutes: int = 0
+    crossed: List[ScoreChange] = field(default_factory=list)
+    dropped: List[ScoreChange] = field(default_factory=list)
+
+
+class Rescoring:
+    """
+    Applies a (new) search config to stored properties. Nothing goes to the network: commute times come from what was
+    stored when the property was scored and, for work locations we had no time for, from the commute matrix.
+    old_notify_at is the threshold the stored scores were notified with.
+    """
+
+    def __init__(self, search_config: SearchConfig, old_notify_at: int,
+                 commute_matrix: "PrecomputedCommutes" = None) -> None:
+        self.search_config = search_config
+        self.old_notify_at = old_notify_at
+        self.commute_matrix = commute_matrix
+        self.batch_scoring = BatchScoring(search_config)
+        self.work_locations = search_config.scoring.work_locations.locations
+
+    def rescore(self, rows: Sequence[Row], report: RescoreReport) -> Tuple[PropertyBatch, BatchScores]:
+        times = [self._times_to_work(row) for row in rows]
+        report.rescored += len(rows)
+        report.unknown_commutes += sum(1 for row, row_times in zip(rows, times)
+                                       if row.post_code and len(row_times) < len(self.work_locations))
+        batch = PropertyBatch.from_details(rows, self.work_locations, times,
+                                           self.batch_scoring.scoring.description_matcher)
+        scores = self.batch_scoring.score(batch)
+
+        old_scores = np.array([np.nan if row.score is None else row.score for row in rows], dtype=np.float64)
+        old_notified = old_scores >= self.old_notify_at
+        new_notified = self.batch_scoring.notify_mask(scores)
+        for idx in np.flatnonzero(new_notified & ~old_notified):
+            report.crossed.append(self._change(batch, scores, rows, idx))
+        for idx in np.flatnonzero(old_notified & ~new_notified):
+            report.dropped.append(self._change(batch, scores, rows, idx))
+        return batch, scores
+
+    def score_columns(self, batch: PropertyBatch, scores: BatchScores) -> List[Dict[str, Any]]:
+        """
+        The new scores in the shape DbConnOrm.update_scores wants them.
+        """
+        return [{'property_id': int(property_id), 'score': float(scores.total[idx]),
+                 'score_reasons': "\n".join(self.batch_scoring.reasons(batch, idx)),
+                 **{f"{name}_score": value for name, value in scores.components(idx).items()}}
+                for idx, property_id in enumerate(batch.property_ids)]
+
+    def _times_to_work(self, row: Row) -> Dict[str, int]:
+        times = dict(row.times_to_work or {})
+        if self.commute_matrix:
+            for location in self.work_locations:
+                if location in times:
+                    continue
+                if row.post_code:
+                    minutes = self.commute_matrix.by_post_code(row.post_code, location)
+                else:
+                    minutes = self.commute_matrix.by_stations(row.location or [], location)
+                if minutes is not None:
+                    times[location] = minutes
+        return times
+
+    def _change(self, batch: PropertyBatch, scores: BatchScores, rows: Sequence[Row], idx: int) -> ScoreChange:
+        return ScoreChange(int(batch.property_ids[idx]), rows[idx].score, float(scores.total[idx]),
+                           self.batch_scoring.reasons(batch, idx))
@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import yaml
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+from db import DBPollStats
+from search_config import Daemon, SearchConfig
+
+if TYPE_CHECKING:
+    from app import App
+
+
+def hour_of_week(unix_time: float) -> int:
+    moment = datetime.fromtimestamp(unix_time)
+    return moment.weekday() * 24 + moment.hour
+
+
+class AdaptiveSchedule:
+    """
+    Decides when every seed location gets polled next. We keep an exponentially weighted average of the new listings
+    per hour found at every hour of the week (persisted, so it survives restarts) and poll often enough to find about
+    target_new_per_poll listings each time: weekday mornings get polled a lot more than sunday nights.
+    """
+
+    def __init__(self, engine: Engine, daemon_config: Daemon = None) -> None:
+        self.engine = engine
+        self.config = daemon_config if daemon_config else Daemon()
+        self.logger = logging.getLogger()
+        # (location, hour of week) -> (new listings per hour, samples)
+        self.rates: Dict[Tuple[str, int], Tuple[float, int]] = {}
+        self.last_poll: Dict[str, float] = {}
+        self.due: Dict[str, float] = {}
+        with Session(self.engine) as session:
+            for row in session.scalars(select(DBPollStats)):
+                self.rates[(row.location, row.hour_of_week)] = (row.new_per_hour, row.samples)
+
+    def set_locations(self, locations: List[str], now: float = None) -> None:
+        """
+        New locations are due right away, removed ones are forgotten.
+        """
+        now = now if now is not None else time.time()
+        for location in locations:
+            self.due.setdefault(location, now)
+        for location in list(self.due):
+            if location not in locations:
+                del self.due[location]
+                self.last_poll.pop(location, None)
+
+    def next_due(self) -> Optional[Tuple[str, float]]:
+        if not self.due:
+            return None
+        location = min(self.due, key=self.due.get)
+        return location, self.due[location]
+
+    def record_poll(self, location: str, new_listings: Optional[int], now: float = None) -> float:
+        """
+        Updates the average with what the poll found and schedules the next one. Returns when it's due.
+        The first poll of a location since start up only schedules: we don't know what time span it covered.
+        A failed poll (new_listings None) only schedules too, the next one will cover its time span.
+        """
+        now = now if now is not None else time.time()
+        if new_listings is None:
+            self.due[location] = now + self.interval_seconds(location, now)
+            return self.due[location]
+        previous = self.last_poll.get(location)
+        self.last_poll[location] = now
+        if previous is not None and now > previous:
+            self._update_rate(location, hour_of_week(previous + (now - previous) / 2),
+                              new_listings / ((now - previous) / 3600))
+        self.due[location] = now + self.interval_seconds(location, now)
+        return self.due[location]
+
+    def interval_seconds(self, location: str, now: float) -> float:
+        rate = self.rates.get((location, hour_of_week(now)))
+        if rate is None:
+            minutes = self.config.initial_interval_minutes
+        elif rate[0] <= 0:
+            minutes = self.config.max_interval_minutes
+        else:
+            minutes = 60 * self.config.target_new_per_poll / rate[0]
+        return 60 * min(self.config.max_interval_minutes, max(self.config.min_interval_minutes, minutes))
+
+    def _update_rate(self, location: str, hour: int, observed: float) -> None:
+        average, samples = self.rates.get((location, hour), (observed, 0))
+        average = self.config.ewma_alpha * observed + (1 - self.config.ewma_alpha) * average
+        self.rates[(location, hour)] = (average, samples + 1)
+        with Session(self.engine) as session:
+            session.merge(DBPollStats(location=location, hour_of_week=hour, new_per_hour=average,
+                                      samples=samples + 1))
+            session.commit()
+
+
+def load_config(path: str) -> SearchConfig:
+    with open(path, "r") as f:
+        return SearchConfig.from_dict(yaml.safe_load(f))
+
+
+def poll_forever(app: "App", schedule: AdaptiveSchedule, config_path: str, search_config: SearchConfig,
+                 stop: threading.Event) -> None:
+    """
+    The daemon loop: polls whichever seed location is due next until `stop` is set, reloading the config whenever the
+    file changes.
+    """
+    logger = logging.getLogger()
+    config_mtime = os.path.getmtime(config_path)
+    while not stop.is_set():
+        mtime = os.path.getmtime(config_path)
+        if mtime != config_mtime:
+            config_mtime = mtime
+            try:
+                search_config = load_config(config_path)
+                schedule.config = search_config.daemon
+                logger.info(f"Reloaded {config_path}")
+            except Exception:
+                logger.exception(f"Could not reload {config_path}, keeping the previous config")
+        schedule.set_locations(search_config.search_fields.areas.seed_locations)
+
+        next_due = schedule.next_due()
+        if next_due is None:
+            logger.warning(f"No seed locations in {config_path}, nothing to poll")
+            stop.wait(search_config.daemon.reload_check_seconds)
+            continue
+        location, due = next_due
+        wait = due - time.time()
+        if wait > 0:
+            # wake up now and then to pick up config changes
+            stop.wait(min(wait, search_config.daemon.reload_check_seconds))
+            continue
+
+        new_listings = None
+        try:
+            stats = app.search_properties(search_config, locations=[location], resume=False)
+            new_listings = stats.new
+        except Exception:
+            logger.exception(f"Polling {location} failed")
+        next_poll = schedule.record_poll(location, new_listings)
+        logger.info(f"Polled {location}: {new_listings} new, next poll in {(next_poll - time.time()) / 60:.0f} min")
@@ -1,34 +1,115 @@
-from typing import Tuple, List
+import functools
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple, List, Optional, TYPE_CHECKING
 
-from property import Property
+from keywords import KeywordMatcher
 from property_details import ORPropertyDetails
-from search_config import SearchConfig
-from tfl_helper import TflHelper
+from search_config import HasGarden, KeywordRule, SearchConfig
+
+if TYPE_CHECKING:
+    # only needed for the annotations. re-scoring doesn't pull in the parsers and the TFL client this way
+    from commute_matrix import PrecomputedCommutes
+    from property import Property
+    from tfl_helper import TflHelper
+
+
+@dataclass
+class ScoreBreakdown:
+    """
+    Everything a score was computed from and made of. Stored with the property so it can be re-scored offline.
+    times_to_work is None when the commute could not be computed (no post code), and only has the work locations the
+    precomputed matrix knows about when there's no post code but the stations near the property are in it.
+    """
+    total: float
+    reasons: List[str]
+    components: Dict[str, float]
+    times_to_work: Optional[Dict[str, int]]
+
+
+class DescriptionMatcher:
+    """
+    Everything scoring looks for in a description, the garden check and every keyword rule, compiled into one
+    KeywordMatcher so a description is scanned once for all of them.
+    """
+
+    def __init__(self, not_private_garden: str = HasGarden.not_private, rules: List[KeywordRule] = ()) -> None:
+        self.rules = list(rules)
+        self.matcher = KeywordMatcher([not_private_garden] + [rule.expression for rule in self.rules])
+
+    def match(self, description: str) -> Tuple[bool, List[bool]]:
+        """
+        Whether the garden is a private one and, for every keyword rule, whether it matched.
+        """
+        matches = self.matcher.match(description)
+        return not matches[0], matches[1:]
+
+    def match_many(self, descriptions: Iterable[Optional[str]]) -> List[List[bool]]:
+        """
+        Raw matches, one row per description: "garden is not private" first, then the rules.
+        """
+        return self.matcher.match_many(descriptions)
+
+
+class _NoTfl:
+    """
+    Stands in for the TFL client where scoring must only use commute times it's given (e.g. batch re-scoring): building
+    a TflHelper loads the TFL and requests clients for nothing.
+    """
+
+    def get_best_times(self, start: str, locations: List[str]) -> Dict[str, int]:
+        raise RuntimeError(f"Scoring was created without TFL access, can't look up the commute from {start}")
+
+
+NO_TFL = _NoTfl()
 
 
 class Scoring:
-    def __init__(self, search_config: SearchConfig, tfl_app_id: str, tfl_app_key: str):
+    def __init__(self, search_config: SearchConfig, tfl_app_id: str, tfl_app_key: str, tfl: "TflHelper" = None,
+                 commute_matrix: "PrecomputedCommutes" = None):
+        """
+        tfl: the client commute times are asked from. One is built from the app id and key if not given, pass NO_TFL
+        to never call TFL.
+        """
         self.search_config = search_config
-        self.tfl = TflHelper(tfl_app_id, tfl_app_key)
+        if tfl is None:
+            from tfl_helper import TflHelper
+            tfl = TflHelper(tfl_app_id, tfl_app_key)
+        self.tfl = tfl
+        self.commute_matrix = commute_matrix
+
+    @functools.cached_property
+    def description_matcher(self) -> DescriptionMatcher:
+        # compiled on first use, then used for every property
+        return DescriptionMatcher(self.search_config.scoring.has_garden.not_private,
+                                  self.search_config.scoring.keywords)
 
     # for every criterion that has a weight we compute the actual weight of the property based on some custom logic
     # for example having a garden is a binary value. you either get the score or not
     # but price can be a bit more complicated. since we establish a sweet spot for the price. anything bellow it gets
     # full points anything above it loses points (until 0)
-    def compute_likeness_score(self, new_property: Property) -> Tuple[float, List[str]]:
+    def compute_likeness_score(self, new_property: "Property") -> Tuple[float, List[str]]:
+        breakdown = self.compute_score_breakdown(new_property)
+        return breakdown.total, breakdown.reasons
+
+    def compute_score_breakdown(self, new_property: "Property") -> ScoreBreakdown:
         total_weight = self.search_config.total_weight
         pd: ORPropertyDetails = new_property.property_details
         price_score, price_reason = self._get_price_score(property_price=pd.price)
         bedroom_score, bedroom_reason = self._get_bedrooms_score(property_bedrooms=pd.bedrooms)
         bathroom_score, bathroom_reason = self._get_bathrooms_score(property_bathrooms=pd.bathrooms)
-        garden_score, garden_reason = self._get_garden_score(has_garden=pd.has_garden,
-                                                             description=pd.description.lower())
-        location_score, location_reason = self._get_location_score(precise_location=pd.post_code,
-                                                                   nearby_stations=pd.location)
-        total_score = 100 * (
-                price_score + bedroom_score + bathroom_score + garden_score + location_score) // total_weight
+        private_garden, keyword_matches = self.description_matcher.match(pd.description)
+        garden_score, garden_reason = self._get_garden_score(has_garden=pd.has_garden, private_garden=private_garden)
+        times_to_work = self._get_times_to_work(pd.post_code, pd.location)
+        location_score, location_reason = self._get_commute_score(times_to_work)
+        keywords_score, keywords_reason = self._get_keywords_score(keyword_matches)
+        total_score = 100 * (price_score + bedroom_score + bathroom_score + garden_score + location_score +
+                             keywords_score) // total_weight
         reasons = [price_reason, bedroom_reason, bathroom_reason, garden_reason, location_reason]
-        return total_score, reasons
+        if keywords_reason:
+            reasons.append(keywords_reason)
+        components = {'price': price_score, 'bedrooms': bedroom_score, 'bathrooms': bathroom_score,
+                      'garden': garden_score, 'location': location_score, 'keywords': keywords_score}
+        return ScoreBreakdown(total_score, reasons, components, times_to_work)
 
     def _get_price_score(self, property_price: float) -> Tuple[float, str]:
         price_query = self.search_config.search_fields.price
@@ -55,8 +136,7 @@ class Scoring:
             bathroom_query.weight, f"* Enough bathrooms ({property_bathrooms})")
 
     # gardens are always a plus
-    def _get_garden_score(self, has_garden, description) -> Tuple[float, str]:
-        private_garden = not (description.find("shared garden") >= 0 or description.find("communal garden") >= 0)
+    def _get_garden_score(self, has_garden, private_garden: bool) -> Tuple[float, str]:
         if has_garden and private_garden:
             return self.search_config.scoring.has_garden.weight, "* Has garden"
         elif not has_garden:
@@ -66,37 +146,81 @@ class Scoring:
         else:
             return 0, "* Garden state unknown"
 
+    def _get_keywords_score(self, keyword_matches: List[bool]) -> Tuple[float, Optional[str]]:
+        """
+        Sum of the weights of the rules the description matched. No reason at all when there are no rules.
+        """
+        rules = self.search_config.scoring.keywords
+        if not rules:
+            return 0, None
+        matched = [rule for rule, rule_matched in zip(rules, keyword_matches) if rule_matched]
+        if not matched:
+            return 0, "* No keywords matched"
+        return sum(rule.weight for rule in matched), "* Keywords: " + ", ".join(
+            f"{rule.name} ({rule.weight:+d})" for rule in matched)
+
     # Target locations are the ones where family members work. So we try to compute how fast each of us can get to
     # our offices. Now, this can be further refined but for now it's a decent metric.
 
     def _get_location_score(self, precise_location: str, nearby_stations: List[List[str]]) -> Tuple[float, str]:
+        return self._get_commute_score(self._get_times_to_work(precise_location, nearby_stations))
+
+    def _get_commute_score(self, times_to_work: Optional[Dict[str, int]]) -> Tuple[float, str]:
         work_locations_query = self.search_config.scoring.work_locations
         total_location_weight = work_locations_query.weight
-        per_location = total_location_weight // len(work_locations_query.locations)
         output = []
         total_score = 0
 
-        # if we have a precise location it means we could compute the post code for the property
-        if precise_location:
-            # for every member of the family
-            for location in work_locations_query.locations:
-                score = 0
-                # use the TFL api to get time to work
-                time_to_work = self.tfl.get_best_time(precise_location, location)
-                # compare with desired commute time
-                if time_to_work <= work_locations_query.time_to_location_in_minutes:
-                    score = per_location
-                    output.append(
-                        f"* Trip time {time_to_work} to {location} is lower or equal to desired one {work_locations_query.time_to_location_in_minutes}")
-                else:
-                    deviation = 100. * (
-                            time_to_work - work_locations_query.time_to_location_in_minutes) / work_locations_query.time_to_location_in_minutes
-                    score = per_location - deviation * per_location / 100
-                    output.append(
-                        f"* Trip time {time_to_work} to {location} is greater than desired one {work_locations_query.time_to_location_in_minutes}")
-                total_score += score
-            return total_score, "\n".join(output)
-        else:
-            # Since we could not detect the post code we should check trip time from any nearby stations and minimize it
-            # TODO: implement the above.
+        if not times_to_work:
             return work_locations_query.weight, "* Precise postcode could not be detected"
+        # only some of the times known (no post code, partly covered by the matrix): those locations share the weight
+        known = [location for location in work_locations_query.locations if location in times_to_work]
+        per_location = total_location_weight // len(known)
+
+        # for every member of the family
+        for location in work_locations_query.locations:
+            if location not in times_to_work:
+                output.append(f"* Trip time to {location} is unknown")
+                continue
+            score = 0
+            time_to_work = times_to_work[location]
+            # compare with desired commute time
+            if time_to_work <= work_locations_query.time_to_location_in_minutes:
+                score = per_location
+                output.append(
+                    f"* Trip time {time_to_work} to {location} is lower or equal to desired one {work_locations_query.time_to_location_in_minutes}")
+            else:
+                deviation = 100. * (
+                        time_to_work - work_locations_query.time_to_location_in_minutes) / work_locations_query.time_to_location_in_minutes
+                score = per_location - deviation * per_location / 100
+                output.append(
+                    f"* Trip time {time_to_work} to {location} is greater than desired one {work_locations_query.time_to_location_in_minutes}")
+            total_score += score
+        return total_score, "\n".join(output)
+
+    def _get_times_to_work(self, precise_location: str, nearby_stations: List[List[str]]) -> Optional[Dict[str, int]]:
+        """
+        Commute time to every work location. The precomputed matrix is checked first (by post code, or by the closest
+        stations when we could not detect the post code) and only what's missing is asked from TFL. Without a post
+        code TFL can't be asked, so the matrix times are returned even if they don't cover every location.
+        """
+        locations = self.search_config.scoring.work_locations.locations
+        times_to_work = {}
+        if self.commute_matrix:
+            for location in locations:
+                if precise_location:
+                    minutes = self.commute_matrix.by_post_code(precise_location, location)
+                else:
+                    minutes = self.commute_matrix.by_stations(nearby_stations, location)
+                if minutes is not None:
+                    times_to_work[location] = minutes
+
+        missing = [location for location in locations if location not in times_to_work]
+        if missing:
+            # if we have a precise location it means we could compute the post code for the property. without one
+            # whatever the matrix had is all we get
+            if not precise_location:
+                return times_to_work if times_to_work else None
+            # use the TFL api to get time to work. all locations are queried in one go
+            times_to_work.update(self.tfl.get_best_times(precise_location, missing))
+        return times_to_work
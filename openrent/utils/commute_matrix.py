@@ -0,0 +1,188 @@
+import json
+import logging
+import re
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from sqlalchemy import Engine, delete, func, select
+from sqlalchemy.orm import Session
+
+from db import DBCommuteTime
+from search_config import CommuteMatrix, SearchConfig
+
+if TYPE_CHECKING:
+    # the builder is handed its clients. scoring only reads the matrix and doesn't need to import them
+    from http_client import HttpClient
+    from tfl_helper import TflHelper
+
+POSTCODES_API = "https://api.postcodes.io"
+STATION_SUFFIXES = re.compile(r"\b(underground|overground|rail|dlr|tube)?\s*station\b|\(.*?\)")
+# array slot for an origin/destination pair that is not in the matrix
+MISSING = -1
+DISTANCE = re.compile(r"([\d.]+)\s*(mi|mile|miles|km)\b", re.IGNORECASE)
+
+
+def normalize_post_code(post_code: str) -> str:
+    return "".join(post_code.split()).upper()
+
+
+def district_key(post_code: str) -> Optional[str]:
+    """
+    NW10 5BU -> district:NW10. The inward code is always 3 characters so whatever is before it is the district.
+    Outward codes are at most 4 characters so anything shorter than 5 is already a district.
+    """
+    post_code = normalize_post_code(post_code)
+    if len(post_code) >= 5:
+        return f"district:{post_code[:-3]}"
+    if post_code:
+        return f"district:{post_code}"
+    return None
+
+
+def station_key(station_name: str) -> str:
+    name = STATION_SUFFIXES.sub(" ", station_name.lower())
+    return "station:" + " ".join(re.sub(r"[^a-z0-9& ]", " ", name).split())
+
+
+def station_distance_miles(row: List[str]) -> float:
+    for column in row[1:]:
+        match = DISTANCE.search(column)
+        if match:
+            distance = float(match.group(1))
+            return distance / 1.609 if match.group(2).lower() == "km" else distance
+    return 0.
+
+
+class PrecomputedCommutes:
+    """
+    In memory lookup table for the commute matrix: origin -> int16 array with the minutes to every work location.
+    Lookups never touch the network. Properties with a post code are looked up by their district, the rest by the best
+    of the stations OpenRent lists for them (plus the walk to the station).
+    """
+
+    def __init__(self, engine: Engine, matrix_config: CommuteMatrix = None) -> None:
+        self.engine = engine
+        self.config = matrix_config if matrix_config else CommuteMatrix()
+        self.destinations: Dict[str, int] = {}
+        self.table: Dict[str, array] = {}
+        self.built_unix = 0
+        self.load()
+
+    def load(self) -> None:
+        with Session(self.engine) as session:
+            rows = session.execute(select(DBCommuteTime.origin, DBCommuteTime.destination, DBCommuteTime.minutes,
+                                          DBCommuteTime.built_unix)).all()
+        destinations = sorted({row.destination for row in rows})
+        self.destinations = {destination: idx for idx, destination in enumerate(destinations)}
+        self.table = {}
+        for row in rows:
+            times = self.table.setdefault(row.origin, array('h', [MISSING] * len(destinations)))
+            times[self.destinations[row.destination]] = row.minutes
+        self.built_unix = min((row.built_unix for row in rows), default=0)
+
+    def is_stale(self) -> bool:
+        return self.built_unix < time.time() - self.config.max_age_days * 24 * 3600
+
+    def by_post_code(self, post_code: str, destination: str) -> Optional[int]:
+        key = district_key(post_code)
+        return self._minutes(key, destination) if key else None
+
+    def by_stations(self, stations: List[List[str]], destination: str) -> Optional[int]:
+        best = None
+        for row in stations:
+            if not row:
+                continue
+            minutes = self._minutes(station_key(row[0]), destination)
+            if minutes is None:
+                continue
+            minutes += round(station_distance_miles(row) * self.config.walking_minutes_per_mile)
+            best = minutes if best is None else min(best, minutes)
+        return best
+
+    def _minutes(self, origin: str, destination: str) -> Optional[int]:
+        times = self.table.get(origin)
+        idx = self.destinations.get(normalize_post_code(destination))
+        if times is None or idx is None:
+            return None
+        minutes = times[idx]
+        return None if minutes == MISSING else minutes
+
+
+class CommuteMatrixBuilder:
+    """
+    Offline job (see build_commute_matrix.py) computing the commute time from every postcode district and every station
+    within the search radius to every work location.
+    """
+
+    def __init__(self, engine: Engine, tfl: "TflHelper", http_client: "HttpClient", tfl_app_id: str,
+                 tfl_app_key: str) -> None:
+        self.engine = engine
+        self.tfl = tfl
+        self.http_client = http_client
+        self.tfl_token = {'app_id': tfl_app_id, 'app_key': tfl_app_key}
+        self.logger = logging.getLogger()
+
+    def build(self, search_config: SearchConfig) -> int:
+        matrix_config = search_config.tfl.commute_matrix
+        radius_m = int((search_config.search_fields.areas.radius + matrix_config.radius_margin_km) * 1000)
+        origins: Dict[str, Tuple[float, float]] = {}
+        for seed_location in search_config.search_fields.areas.seed_locations:
+            lat, lon = self._geocode(seed_location)
+            origins.update(self._districts(lat, lon, radius_m))
+            origins.update(self._stations(search_config.tfl.base_url, lat, lon, radius_m))
+        self.logger.info(f"Building commute matrix for {len(origins)} origins")
+
+        destinations = search_config.scoring.work_locations.locations
+        with ThreadPoolExecutor(max_workers=search_config.tfl.max_concurrent_requests) as executor:
+            times = executor.map(lambda coordinates: self.tfl.get_best_times(f"{coordinates[0]},{coordinates[1]}",
+                                                                             destinations),
+                                 origins.values())
+            rows = list(self._rows(origins.keys(), times))
+        with Session(self.engine) as session:
+            session.execute(delete(DBCommuteTime))
+            session.add_all(rows)
+            session.commit()
+        return len(rows)
+
+    def is_stale(self, matrix_config: CommuteMatrix) -> bool:
+        with Session(self.engine) as session:
+            built_unix = session.scalar(select(func.min(DBCommuteTime.built_unix)))
+        return not built_unix or built_unix < time.time() - matrix_config.max_age_days * 24 * 3600
+
+    @staticmethod
+    def _rows(origins: Iterable[str], times: Iterable[Dict[str, int]]) -> Iterable[DBCommuteTime]:
+        now = int(time.time())
+        for origin, destination_times in zip(origins, times):
+            for destination, minutes in destination_times.items():
+                yield DBCommuteTime(origin=origin, destination=normalize_post_code(destination), minutes=minutes,
+                                    built_unix=now)
+
+    def _geocode(self, post_code: str) -> Tuple[float, float]:
+        result = self._get_json(f"{POSTCODES_API}/postcodes/{normalize_post_code(post_code)}")["result"]
+        return result["latitude"], result["longitude"]
+
+    def _districts(self, lat: float, lon: float, radius_m: int) -> Dict[str, Tuple[float, float]]:
+        # postcodes.io caps the outcode radius at 25km
+        outcodes = self._get_json(f"{POSTCODES_API}/outcodes",
+                                  params={'lat': lat, 'lon': lon, 'radius': min(radius_m, 25000), 'limit': 100})
+        return {district_key(outcode["outcode"]): (outcode["latitude"], outcode["longitude"])
+                for outcode in outcodes["result"] or [] if outcode["latitude"] is not None}
+
+    def _stations(self, tfl_base_url: str, lat: float, lon: float, radius_m: int) -> Dict[str, Tuple[float, float]]:
+        # tfl.base_url, like every other TFL call, so a run pointed at the simulator doesn't reach the real API
+        stations = {}
+        page = 1
+        while True:
+            response = self._get_json(f"{tfl_base_url.rstrip('/')}/StopPoint", params={
+                'lat': lat, 'lon': lon, 'radius': radius_m, 'page': page,
+                'stopTypes': "NaptanMetroStation,NaptanRailStation", **self.tfl_token})
+            for stop_point in response["stopPoints"]:
+                stations[station_key(stop_point["commonName"])] = (stop_point["lat"], stop_point["lon"])
+            if page * response["pageSize"] >= response["total"]:
+                return stations
+            page += 1
+
+    def _get_json(self, url: str, params: dict = None) -> dict:
+        return json.loads(self.http_client.get(url, params=params).text)
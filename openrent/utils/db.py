@@ -1,12 +1,21 @@
 import time
-from typing import List, Set, Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
 
-from sqlalchemy import create_engine
+from sqlalchemy import JSON, ColumnElement, Connection, Engine, Index, Integer, LargeBinary, TextualSelect, column
+from sqlalchemy import bindparam, create_engine, event, exists, func, inspect, text, update
 from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import mapped_column, Mapped, DeclarativeBase
 
-from property import Property
+from dedup import dedup_key
+from property_details import ORPropertyDetails
+from property_query import PropertyQuery
+
+if TYPE_CHECKING:
+    # property -> openrent_bs -> html_store -> db
+    from property import Property
 
 
 class Base(DeclarativeBase):
@@ -35,6 +44,14 @@ class DBProperty(Base):
         """
 
     __tablename__ = "properties"
+    # covering indexes for query.py: whichever column a query filters or sorts on, the other filter columns are in the
+    # index as well, so rows are only read from the table once they match
+    __table_args__ = (
+        Index("ix_properties_score_cover", "score", "price", "bedrooms", "date_unix"),
+        Index("ix_properties_price_cover", "price", "bedrooms", "score", "date_unix"),
+        Index("ix_properties_bedrooms_cover", "bedrooms", "price", "score", "date_unix"),
+        Index("ix_properties_date_cover", "date_unix", "score", "price", "bedrooms"),
+    )
 
     property_id: Mapped[int] = mapped_column(primary_key=True)
     price: Mapped[int] = mapped_column()
@@ -47,6 +64,176 @@ class DBProperty(Base):
     score: Mapped[int] = mapped_column()
     score_reasons: Mapped[str] = mapped_column()
     date_unix: Mapped[int] = mapped_column()
+    # structured inputs and per component scores so the history can be re-scored offline (see rescore.py).
+    # NULL for the rows stored before these columns were added
+    title: Mapped[Optional[str]] = mapped_column()
+    epc: Mapped[Optional[str]] = mapped_column()
+    features: Mapped[Optional[list]] = mapped_column(JSON)
+    location: Mapped[Optional[list]] = mapped_column(JSON)
+    # work location -> minutes. JSON null when the commute could not be computed
+    times_to_work: Mapped[Optional[dict]] = mapped_column(JSON)
+    price_score: Mapped[Optional[float]] = mapped_column()
+    bedrooms_score: Mapped[Optional[float]] = mapped_column()
+    bathrooms_score: Mapped[Optional[float]] = mapped_column()
+    garden_score: Mapped[Optional[float]] = mapped_column()
+    location_score: Mapped[Optional[float]] = mapped_column()
+    keywords_score: Mapped[Optional[float]] = mapped_column()
+    # change detection: fingerprint of the stored content and the validators of the page it came from
+    fingerprint: Mapped[Optional[str]] = mapped_column()
+    etag: Mapped[Optional[str]] = mapped_column()
+    last_modified: Mapped[Optional[str]] = mapped_column()
+    checked_unix: Mapped[Optional[int]] = mapped_column()
+    # provider the listing came from and the key it's matched on against the listings of other providers
+    source: Mapped[Optional[str]] = mapped_column()
+    dedup_key: Mapped[Optional[str]] = mapped_column(index=True)
+
+
+class DBListingAlias(Base):
+    """
+    Listings that turned out to be one we already have from another provider. They are remembered so they're not
+    fetched again, but never scored or notified.
+    """
+    __tablename__ = "listing_aliases"
+
+    property_id: Mapped[int] = mapped_column(primary_key=True)
+    canonical_id: Mapped[int] = mapped_column()
+    dedup_key: Mapped[str] = mapped_column()
+    seen_unix: Mapped[int] = mapped_column()
+
+
+class DBTflJourney(Base):
+    """
+    Cached TFL journey times. A NULL duration means TFL could not find a route (cached as well so we don't keep asking).
+    """
+
+    __tablename__ = "tfl_journeys"
+
+    # normalized "origin|destination|modes|departure slot"
+    route_key: Mapped[str] = mapped_column(primary_key=True)
+    duration: Mapped[Optional[int]] = mapped_column()
+    # how long the API call took. used to report how much time the cache saved us
+    latency_ms: Mapped[int] = mapped_column()
+    created_unix: Mapped[int] = mapped_column()
+    last_used_unix: Mapped[int] = mapped_column(index=True)
+
+
+class DBCommuteTime(Base):
+    """
+    Precomputed commute times from a postcode district or a station (the origin) to a work location.
+    """
+
+    __tablename__ = "commute_matrix"
+
+    # "district:NW10" or "station:willesden green"
+    origin: Mapped[str] = mapped_column(primary_key=True)
+    # normalized work location post code
+    destination: Mapped[str] = mapped_column(primary_key=True)
+    minutes: Mapped[int] = mapped_column()
+    built_unix: Mapped[int] = mapped_column()
+
+
+class DBRawPage(Base):
+    """
+    Index of the raw html pages we fetched. The html itself lives in the content addressed store (see html_store.py).
+    """
+
+    __tablename__ = "raw_pages"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    url: Mapped[str] = mapped_column()
+    # "property" or "search"
+    kind: Mapped[str] = mapped_column()
+    property_id: Mapped[Optional[int]] = mapped_column(index=True)
+    sha256: Mapped[str] = mapped_column(index=True)
+    codec: Mapped[str] = mapped_column()
+    size: Mapped[int] = mapped_column()
+    fetched_unix: Mapped[int] = mapped_column()
+
+
+class DBBloomFilter(Base):
+    """
+    Persisted Bloom filters (see seen_properties.py). item_count is the number of rows the filter was built from, so we
+    can tell when the table it summarizes changed behind its back.
+    """
+
+    __tablename__ = "bloom_filters"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    bits: Mapped[bytes] = mapped_column(LargeBinary)
+    num_hashes: Mapped[int] = mapped_column()
+    capacity: Mapped[int] = mapped_column()
+    item_count: Mapped[int] = mapped_column()
+    updated_unix: Mapped[int] = mapped_column()
+
+
+class DBPropertyHistory(Base):
+    """
+    Every version of a listing we've seen: a new row whenever its content fingerprint changes, so price and
+    availability changes can be tracked over time. A listing going back to an earlier version gets a new row as well.
+    """
+
+    __tablename__ = "property_history"
+
+    # insertion order is the order the versions were seen in
+    id: Mapped[int] = mapped_column(primary_key=True)
+    property_id: Mapped[int] = mapped_column(index=True)
+    fingerprint: Mapped[str] = mapped_column()
+    price: Mapped[float] = mapped_column()
+    available_from: Mapped[str] = mapped_column()
+    first_seen_unix: Mapped[int] = mapped_column(index=True)
+    last_seen_unix: Mapped[int] = mapped_column()
+
+
+class DBRun(Base):
+    """
+    Run journal. A run that never got a finished_unix was interrupted and the next one (with the same config) resumes it.
+    """
+
+    __tablename__ = "runs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    config_hash: Mapped[str] = mapped_column()
+    started_unix: Mapped[int] = mapped_column()
+    finished_unix: Mapped[Optional[int]] = mapped_column()
+
+
+class DBRunLocation(Base):
+    """
+    Progress of a run for one seed location: "searching" -> "searched" (all ids discovered) -> "done".
+    """
+
+    __tablename__ = "run_locations"
+
+    run_id: Mapped[int] = mapped_column(primary_key=True)
+    location: Mapped[str] = mapped_column(primary_key=True)
+    status: Mapped[str] = mapped_column()
+    updated_unix: Mapped[int] = mapped_column()
+
+
+class DBRunDiscovered(Base):
+    """
+    Property ids a run's search found for a location, so a resumed run doesn't have to search again.
+    """
+
+    __tablename__ = "run_discovered"
+
+    run_id: Mapped[int] = mapped_column(primary_key=True)
+    location: Mapped[str] = mapped_column(primary_key=True)
+    property_id: Mapped[int] = mapped_column(primary_key=True)
+
+
+class DBPollStats(Base):
+    """
+    Average number of new listings per hour found for a seed location at a given hour of the week (see scheduler.py).
+    """
+
+    __tablename__ = "poll_stats"
+
+    location: Mapped[str] = mapped_column(primary_key=True)
+    # monday 00:00-00:59 is 0
+    hour_of_week: Mapped[int] = mapped_column(primary_key=True)
+    new_per_hour: Mapped[float] = mapped_column()
+    samples: Mapped[int] = mapped_column()
 
 
 class DbConnOrm:
@@ -57,28 +244,256 @@ class DbConnOrm:
     Ideas:
     1) A cleanup job will be needed to remove from the db properties that have been rented
     2) CRUD will be needed if I built an UI on top of this data. But at that point probably I'll not be using sqlite anymore
+       (browsing what's stored is covered by query_properties, see query.py)
     """
 
     def __init__(self, db_name:str, echo=False):
         self.engine = create_engine(f"sqlite:///{db_name}", echo=echo)
+        event.listen(self.engine, "connect", _set_sqlite_pragmas)
         Base.metadata.create_all(self.engine)
+        add_missing_columns(self.engine)
+        create_text_search(self.engine)
 
-    def get_latest_properties(self, limit: int) -> Set[int]:
+    def update_property_details(self, property_details: List[ORPropertyDetails]) -> int:
+        """
+        Overwrites the stored fields of existing properties (e.g. after re-parsing their html). Scores are left alone.
+        """
+        updated = 0
+        with Session(self.engine) as session:
+            for details in property_details:
+                db_property = session.get(DBProperty, details.property_id)
+                if db_property is None:
+                    continue
+                db_property.price = details.price
+                db_property.available_from = details.available_from
+                db_property.has_garden = details.has_garden
+                db_property.description = details.description
+                db_property.post_code = details.post_code
+                db_property.bedrooms = details.bedrooms
+                db_property.bathrooms = details.bathrooms
+                db_property.title = details.title
+                db_property.epc = details.epc
+                db_property.features = details.features
+                db_property.location = details.location
+                db_property.dedup_key = dedup_key(details.title, details.post_code, details.price)
+                updated += 1
+            session.commit()
+        return updated
+
+    def iter_scoring_inputs(self, chunk_size: int = 10000) -> Iterator[List[Row]]:
+        """
+        Everything scoring needs for every stored property, streamed in chunks so the whole history never has to be in
+        memory at once.
+        """
+        stmt = select(DBProperty.property_id, DBProperty.price, DBProperty.bedrooms, DBProperty.bathrooms,
+                      DBProperty.has_garden, DBProperty.description, DBProperty.post_code, DBProperty.location,
+                      DBProperty.times_to_work, DBProperty.score).order_by(DBProperty.property_id)
+        with Session(self.engine) as session:
+            for chunk in session.execute(stmt.execution_options(yield_per=chunk_size)).partitions():
+                yield chunk
+
+    def update_scores(self, scores: List[Dict[str, Any]]) -> None:
+        """
+        Bulk update of score columns. Every dict needs the property_id plus the columns to overwrite.
+        """
+        if not scores:
+            return
+        with Session(self.engine) as session:
+            session.execute(update(DBProperty), scores)
+            session.commit()
+
+    def insert_properties(self, properties: Dict[int, "Property"]) -> None:
+        self.upsert_properties(list(properties.values()))
+
+    def upsert_properties(self, properties: List["Property"]) -> None:
+        """
+        Inserts the properties in one statement. A property that is already stored is overwritten, except for
+        date_unix: it stays the time the property was first stored (checked_unix is the last time it was). The version
+        of every property goes in the history as well.
+        """
+        if not properties:
+            return
+        current_time = int(time.time())
+        rows = self.__convert_dao_to_rows(properties, current_time)
+        stmt = sqlite_insert(DBProperty)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DBProperty.property_id],
+            set_={column: stmt.excluded[column] for column in rows[0] if column not in ("property_id", "date_unix")})
+        with Session(self.engine) as session:
+            session.execute(stmt, rows)
+            self.__record_history(session, [(property_dao.property_id, property_dao.property_details)
+                                            for property_dao in properties], current_time)
+            session.commit()
+
+    def find_dedup_keys(self, keys: Iterable[str]) -> Dict[str, int]:
+        """
+        dedup key -> id of a stored property with that key, for the keys that are stored.
+        """
+        keys = list(keys)
+        owners = {}
+        with Session(self.engine) as session:
+            for start in range(0, len(keys), 500):
+                stmt = select(DBProperty.dedup_key, func.min(DBProperty.property_id)).where(
+                    DBProperty.dedup_key.in_(keys[start:start + 500])).group_by(DBProperty.dedup_key)
+                owners.update((key, property_id) for key, property_id in session.execute(stmt))
+        return owners
+
+    def get_aliases(self, property_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Duplicate id -> id of the listing it duplicates, for the given ids that are known duplicates.
+        """
+        property_ids = list(property_ids)
+        aliases = {}
         with Session(self.engine) as session:
-            stmt = select(DBProperty.property_id).order_by(DBProperty.date_unix.desc()).limit(limit)
-            return set(session.scalars(stmt))
+            for start in range(0, len(property_ids), 500):
+                stmt = select(DBListingAlias.property_id, DBListingAlias.canonical_id).where(
+                    DBListingAlias.property_id.in_(property_ids[start:start + 500]))
+                aliases.update((row.property_id, row.canonical_id) for row in session.execute(stmt))
+        return aliases
 
-    def insert_properties(self, properties: Dict[int, Property]) -> None:
+    def add_aliases(self, aliases: List[Dict[str, Any]]) -> None:
+        """
+        Every dict has the property_id of the duplicate, the canonical_id it duplicates and the dedup_key.
+        """
+        if not aliases:
+            return
         current_time = int(time.time())
-        orm = self.__convert_dao_to_orm(list(properties.values()), current_time)
+        stmt = sqlite_insert(DBListingAlias)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DBListingAlias.property_id],
+            set_={'canonical_id': stmt.excluded.canonical_id, 'dedup_key': stmt.excluded.dedup_key,
+                  'seen_unix': stmt.excluded.seen_unix})
         with Session(self.engine) as session:
-            session.add_all(orm)
+            session.execute(stmt, [{**alias, 'seen_unix': current_time} for alias in aliases])
             session.commit()
 
-    def __convert_dao_to_orm(self, properties: List[Property], current_time: int) -> List[DBProperty]:
-        orm_list = []
+    def get_check_states(self, property_ids: Iterable[int]) -> Dict[int, Row]:
+        """
+        Stored fingerprint, validators and last check time of the given properties.
+        """
+        property_ids = list(property_ids)
+        states = {}
+        with Session(self.engine) as session:
+            # sqlite limits the number of bound parameters per statement
+            for start in range(0, len(property_ids), 500):
+                stmt = select(DBProperty.property_id, DBProperty.fingerprint, DBProperty.etag,
+                              DBProperty.last_modified, DBProperty.checked_unix).where(
+                    DBProperty.property_id.in_(property_ids[start:start + 500]))
+                states.update((row.property_id, row) for row in session.execute(stmt))
+        return states
+
+    def mark_checked(self, checks: List[Dict[str, Any]]) -> None:
+        """
+        Records re-checks of known properties that didn't need re-scoring. Every dict has the property_id, the etag and
+        last_modified the page came back with and the details if the page was parsed (None on a 304).
+        """
+        if not checks:
+            return
+        current_time = int(time.time())
+        with Session(self.engine) as session:
+            session.execute(update(DBProperty), [
+                {'property_id': check['property_id'], 'etag': check['etag'],
+                 'last_modified': check['last_modified'], 'checked_unix': current_time,
+                 **({'fingerprint': check['details'].fingerprint()} if check['details'] else {})}
+                for check in checks])
+            self.__record_history(session, [(check['property_id'], check['details']) for check in checks
+                                            if check['details']], current_time)
+            session.commit()
+
+    def query_properties(self, query: PropertyQuery, order_by: str = "score", limit: Optional[int] = None,
+                         chunk_size: int = 500) -> Iterator[Row]:
+        """
+        Stored properties matching the query (see property_query.py), best score, lowest price or newest first.
+        Rows are streamed off the cursor as they are read, nothing is loaded as ORM objects.
+        """
+        conditions = [_COMPARISONS[operator](getattr(DBProperty, column), value)
+                      for column, operator, value in query.conditions]
+        with self.engine.connect() as conn:
+            if query.text_match():
+                conditions.append(self.__text_condition(conn, query.text_match()))
+            if query.text_exclude():
+                # checking rows one by one can't stop early here: nearly every row gets checked when most match
+                conditions.append(DBProperty.property_id.not_in(_text_matches(query.text_exclude())))
+            order = {"score": DBProperty.score.desc(), "price": DBProperty.price.asc(),
+                     "date": DBProperty.date_unix.desc()}[order_by]
+            # no tie breaker: sorting on just the indexed column is what lets a LIMIT stop at the first rows it reads
+            stmt = select(DBProperty.property_id, DBProperty.source, DBProperty.title, DBProperty.price,
+                          DBProperty.bedrooms, DBProperty.bathrooms, DBProperty.score, DBProperty.date_unix
+                          ).where(*conditions).order_by(order).limit(limit)
+            yield from conn.execution_options(yield_per=chunk_size).execute(stmt)
+
+    @staticmethod
+    def __text_condition(conn: Connection, expression: str) -> ColumnElement[bool]:
+        # a rare phrase: look its few rows up in the full text index and filter on those ids. a common one: listing
+        # all its rows costs more than checking the candidates one by one while walking the index of the sort column
+        probe = conn.execute(text(f"SELECT count(*) FROM (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} "
+                                  f"MATCH :expression LIMIT :limit)"),
+                             {"expression": expression, "limit": FTS_PROBE_LIMIT}).scalar()
+        if probe < FTS_PROBE_LIMIT:
+            return DBProperty.property_id.in_(_text_matches(expression))
+        return exists(text(f"SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE}.rowid = properties.property_id "
+                           f"AND {FTS_TABLE} MATCH :expression")
+                      .bindparams(bindparam("expression", expression, unique=True))
+                      .columns(column("one", Integer)))
+
+    def price_drops(self, days: int) -> List[Row]:
+        """
+        Properties whose price went down in the last `days` days: property_id, old_price, price, changed_unix.
+        Only the history of properties that changed in that window is looked at.
+        """
+        since = int(time.time()) - days * 24 * 3600
+        changed = select(DBPropertyHistory.property_id).where(DBPropertyHistory.first_seen_unix >= since)
+        versions = select(
+            DBPropertyHistory.property_id, DBPropertyHistory.price, DBPropertyHistory.first_seen_unix,
+            func.lag(DBPropertyHistory.price).over(partition_by=DBPropertyHistory.property_id,
+                                                   order_by=DBPropertyHistory.id).label("old_price")
+        ).where(DBPropertyHistory.property_id.in_(changed)).subquery()
+        stmt = (select(versions.c.property_id, versions.c.old_price, versions.c.price,
+                       versions.c.first_seen_unix.label("changed_unix"))
+                .where(versions.c.first_seen_unix >= since, versions.c.price < versions.c.old_price)
+                .order_by(versions.c.first_seen_unix.desc()))
+        with Session(self.engine) as session:
+            return list(session.execute(stmt))
+
+    @staticmethod
+    def __record_history(session: Session, versions: List[Tuple[int, ORPropertyDetails]], current_time: int) -> None:
+        # a version is new when it differs from the latest row of its property, else that row is just seen again
+        if not versions:
+            return
+        property_ids = list({property_id for property_id, _ in versions})
+        # property_id -> (id, fingerprint) of its latest row. id is None for the rows still to be inserted
+        latest: Dict[int, Tuple[Optional[int], str]] = {}
+        for start in range(0, len(property_ids), 500):
+            newest = select(func.max(DBPropertyHistory.id)).where(
+                DBPropertyHistory.property_id.in_(property_ids[start:start + 500])).group_by(
+                DBPropertyHistory.property_id)
+            stmt = select(DBPropertyHistory.id, DBPropertyHistory.property_id, DBPropertyHistory.fingerprint).where(
+                DBPropertyHistory.id.in_(newest))
+            latest.update((row.property_id, (row.id, row.fingerprint)) for row in session.execute(stmt))
+        seen_again, changed = [], []
+        for property_id, details in versions:
+            fingerprint = details.fingerprint()
+            row_id, latest_fingerprint = latest.get(property_id, (None, None))
+            if fingerprint == latest_fingerprint:
+                if row_id is not None:
+                    seen_again.append({'id': row_id, 'last_seen_unix': current_time})
+                continue
+            latest[property_id] = (None, fingerprint)
+            changed.append({'property_id': property_id, 'fingerprint': fingerprint, 'price': details.price,
+                            'available_from': details.available_from, 'first_seen_unix': current_time,
+                            'last_seen_unix': current_time})
+        if seen_again:
+            session.execute(update(DBPropertyHistory), seen_again)
+        if changed:
+            session.execute(sqlite_insert(DBPropertyHistory), changed)
+
+    @staticmethod
+    def __convert_dao_to_rows(properties: List["Property"], current_time: int) -> List[Dict[str, Any]]:
+        rows = []
         for property_dao in properties:
-            orm_list.append(DBProperty(
+            breakdown = property_dao.score_breakdown
+            components = breakdown.components if breakdown else {}
+            rows.append(dict(
                 property_id=property_dao.property_id,
                 price=property_dao.property_details.price,
                 available_from=property_dao.property_details.available_from,
@@ -90,5 +505,97 @@ class DbConnOrm:
                 score=property_dao.score,
                 score_reasons="\n".join(property_dao.score_reasons),
                 date_unix=current_time,
+                title=property_dao.property_details.title,
+                epc=property_dao.property_details.epc,
+                features=property_dao.property_details.features,
+                location=property_dao.property_details.location,
+                times_to_work=breakdown.times_to_work if breakdown else None,
+                price_score=components.get('price'),
+                bedrooms_score=components.get('bedrooms'),
+                bathrooms_score=components.get('bathrooms'),
+                garden_score=components.get('garden'),
+                location_score=components.get('location'),
+                keywords_score=components.get('keywords'),
+                fingerprint=property_dao.property_details.fingerprint(),
+                etag=property_dao.validators.etag if property_dao.validators else None,
+                last_modified=property_dao.validators.last_modified if property_dao.validators else None,
+                checked_unix=current_time,
+                source=property_dao.property_details.source,
+                dedup_key=dedup_key(property_dao.property_details.title, property_dao.property_details.post_code,
+                                    property_dao.property_details.price),
             ))
-        return orm_list
+        return rows
+
+
+_COMPARISONS = {">": lambda column, value: column > value, ">=": lambda column, value: column >= value,
+                "<": lambda column, value: column < value, "<=": lambda column, value: column <= value,
+                "=": lambda column, value: column == value, "!=": lambda column, value: column != value}
+
+FTS_TABLE = "properties_fts"
+# a text condition matching fewer properties than this is resolved through the full text index first
+FTS_PROBE_LIMIT = 1000
+
+
+def _text_matches(expression: str) -> TextualSelect:
+    return (text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression")
+            # unique: a query can have a match and an exclude, each with its own expression
+            .bindparams(bindparam("expression", expression, unique=True)).columns(column("rowid", Integer)))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # WAL lets readers (e.g. rescore/query) run while a crawl is writing and makes commits cheaper. With WAL,
+    # synchronous=NORMAL can only lose the last commits on power loss, it can't corrupt the db
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def add_missing_columns(engine: Engine) -> None:
+    """
+    create_all only creates missing tables. Columns added to a mapping later on are added to existing databases here.
+    They are all nullable so old rows just get NULLs.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            # and so are the indexes on them
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def create_text_search(engine: Engine) -> None:
+    """
+    Full text index (FTS5) over the title and the description of the properties. It's an external content table: the
+    text isn't stored twice, and triggers keep the index in sync with every insert, update and delete on properties.
+    A db created before the index existed gets it built from the stored rows.
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}).first()
+        conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                          f"title, description, content='properties', content_rowid='property_id')"))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS properties_fts_insert AFTER INSERT ON properties BEGIN
+                INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.property_id, new.title, new.description);
+            END"""))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS properties_fts_delete AFTER DELETE ON properties BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+                VALUES ('delete', old.property_id, old.title, old.description);
+            END"""))
+        # upserts rewrite every column: only re-index when the text actually changed
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS properties_fts_update AFTER UPDATE OF title, description ON properties
+            WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+                VALUES ('delete', old.property_id, old.title, old.description);
+                INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.property_id, new.title, new.description);
+            END"""))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
@@ -0,0 +1,85 @@
+import re
+import threading
+from typing import Callable, Dict, Hashable, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # db -> dedup for the keys it stores
+    from db import DbConnOrm
+
+POST_CODE_PATTERN = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})?\b")
+# abbreviation -> what it is written as in the key
+STREET_SUFFIXES = {
+    "road": "road", "rd": "road", "street": "street", "st": "street", "lane": "lane", "ln": "lane",
+    "avenue": "avenue", "ave": "avenue", "gardens": "gardens", "gdns": "gardens", "close": "close",
+    "place": "place", "pl": "place", "square": "square", "sq": "square", "crescent": "crescent",
+    "terrace": "terrace", "way": "way", "drive": "drive", "dr": "drive", "grove": "grove", "hill": "hill",
+    "court": "court", "ct": "court", "mews": "mews", "row": "row", "walk": "walk", "park": "park",
+}
+# prices are rounded to this many pounds, sites don't always agree on the odd pound or pcm/pw conversion
+PRICE_ROUNDING = 25
+
+
+def dedup_key(title: str, post_code: Optional[str], price: Optional[float]) -> Optional[str]:
+    """
+    Normalized postcode|street|price. The same flat listed on two sites ends up with the same key, whatever the
+    spacing, casing or abbreviations. None when there is not enough to tell listings apart.
+    """
+    if not price:
+        return None
+    post_code = _normalize_post_code(post_code) or _normalize_post_code(title)
+    if not post_code:
+        return None
+    street = _street(title or "")
+    # an outward code on its own (NW10) covers thousands of flats. not enough without a street
+    if len(post_code) <= 4 and not street:
+        return None
+    return f"{post_code}|{street}|{int(round(price / PRICE_ROUNDING)) * PRICE_ROUNDING}"
+
+
+def _normalize_post_code(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    match = POST_CODE_PATTERN.search(text.upper())
+    if not match:
+        return None
+    return match.group(1) + (match.group(2) or "")
+
+
+def _street(title: str) -> str:
+    words = re.findall(r"[a-z]+", title.lower())
+    for idx, word in enumerate(words):
+        if idx and word in STREET_SUFFIXES:
+            return f"{words[idx - 1]} {STREET_SUFFIXES[word]}"
+    return ""
+
+
+class DedupIndex:
+    """
+    Which listing owns which dedup key, over this run and (through the db) every run before it. The first listing to
+    claim a key owns it; a listing from another source claiming it later is a duplicate of that one. Listings of the
+    same source never clash: a site relisting a flat under a new id is left alone.
+    """
+
+    def __init__(self, db_connector: "DbConnOrm", source_of: Callable[[int], Hashable]) -> None:
+        self.db_connector = db_connector
+        self.source_of = source_of
+        self.owners: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def claim(self, key: Optional[str], property_id: int) -> Optional[int]:
+        """
+        The listing of another source this one duplicates, None if it's not a duplicate.
+        """
+        if key is None:
+            return None
+        with self.lock:
+            owner = self.owners.get(key)
+            if owner is None:
+                owner = self.db_connector.find_dedup_keys([key]).get(key)
+            if owner is None:
+                self.owners[key] = property_id
+                return None
+            self.owners[key] = owner
+            if owner == property_id or self.source_of(owner) == self.source_of(property_id):
+                return None
+            return owner
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import Iterator, Optional
+
+from sqlalchemy import Engine, func, select
+from sqlalchemy.orm import Session
+
+from db import DBRawPage
+from search_config import Storage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_EXTENSIONS = {"gzip": "gz", "zstd": "zst"}
+
+
+class RawHtmlStore:
+    """
+    Content addressed store for the raw html we fetch. Each page is compressed and written once under its sha256
+    (so identical pages share a blob) while every fetch gets a row in the raw_pages index in sqlite.
+    That lets us re-run the parsers over everything we ever downloaded without touching the network.
+    """
+
+    def __init__(self, engine: Engine, storage_config: Storage = None) -> None:
+        self.engine = engine
+        self.config = storage_config if storage_config else Storage()
+        self.logger = logging.getLogger()
+        self.codec = self.config.codec
+        if self.codec == "zstd" and zstandard is None:
+            self.logger.warning("zstandard is not installed. Raw html will be stored gzip compressed")
+            self.codec = "gzip"
+        if self.codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"Unknown codec {self.codec}")
+        os.makedirs(self.config.raw_html_dir, exist_ok=True)
+
+    def put(self, url: str, html_doc: str, kind: str, property_id: Optional[int] = None) -> str:
+        data = html_doc.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._path(sha256, self.codec)
+        if not os.path.exists(path):
+            self._write_atomically(path, self._compress(data))
+
+        with Session(self.engine) as session:
+            session.add(DBRawPage(url=url, kind=kind, property_id=property_id, sha256=sha256, codec=self.codec,
+                                  size=len(data), fetched_unix=int(time.time())))
+            session.commit()
+        return sha256
+
+    def get(self, sha256: str, codec: str) -> str:
+        return read_blob(self.config.raw_html_dir, sha256, codec)
+
+    def latest_property_pages(self) -> Iterator[DBRawPage]:
+        """
+        The most recent page stored for every property.
+        """
+        latest = (select(func.max(DBRawPage.id))
+                  .where(DBRawPage.kind == "property")
+                  .group_by(DBRawPage.property_id))
+        with Session(self.engine) as session:
+            for page in session.scalars(select(DBRawPage).where(DBRawPage.id.in_(latest)).order_by(DBRawPage.id)):
+                yield page
+
+    def _path(self, sha256: str, codec: str) -> str:
+        return blob_path(self.config.raw_html_dir, sha256, codec)
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def _write_atomically(path: str, data: bytes) -> None:
+        # another worker might be writing the same blob. whoever renames last wins, both wrote the same bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+def blob_path(raw_html_dir: str, sha256: str, codec: str) -> str:
+    return os.path.join(raw_html_dir, sha256[:2], f"{sha256}.{CODEC_EXTENSIONS[codec]}")
+
+
+def read_blob(raw_html_dir: str, sha256: str, codec: str) -> str:
+    """
+    Reads a page back. Only needs the directory so it can be used from worker processes.
+    """
+    with open(blob_path(raw_html_dir, sha256, codec), "rb") as f:
+        data = f.read()
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is needed to read zstd compressed pages")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return gzip.decompress(data).decode("utf-8")
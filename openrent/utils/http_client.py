@@ -0,0 +1,100 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+
+from rate_limiter import HostRateLimiter, backoff_delay
+from search_config import Crawler
+
+
+@dataclass
+class Validators:
+    """
+    Cache validators returned by the server. Sending them back lets the server answer with a 304 if nothing changed.
+    """
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def as_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def __bool__(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: int
+    text: Optional[str]
+    validators: Validators
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+class HttpClient:
+    """
+    Shared fetch layer. One keep-alive session (so we only pay for the TCP+TLS handshake once per pooled connection),
+    compressed responses, conditional GETs and a configurable retry policy on top of the per host rate limiter.
+    """
+
+    def __init__(self, crawler_config: Crawler = None):
+        self.crawler_config = crawler_config if crawler_config else Crawler()
+        self.http_config = self.crawler_config.http
+        self.logger = logging.getLogger()
+        self.rate_limiter = HostRateLimiter(self.crawler_config.requests_per_second, self.crawler_config.burst)
+
+        self.session = requests.Session()
+        # the retries are handled by us (see get) so they go through the rate limiter as well
+        adapter = HTTPAdapter(pool_connections=self.http_config.pool_connections,
+                              pool_maxsize=self.http_config.pool_maxsize,
+                              max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # gzip/deflate always, br if brotli is installed
+        self.session.headers.update(make_headers(accept_encoding=True, keep_alive=True))
+        if self.http_config.user_agent:
+            self.session.headers["User-Agent"] = self.http_config.user_agent
+
+    def get(self, url: str, validators: Validators = None, params: dict = None) -> FetchResult:
+        headers = validators.as_headers() if validators else {}
+        retry_status_codes = set(self.http_config.retry_status_codes)
+        attempts = self.crawler_config.max_retries + 1
+        for attempt in range(attempts):
+            self.rate_limiter.acquire(url)
+            try:
+                response = self.session.get(url, params=params, headers=headers,
+                                            timeout=self.http_config.timeout_seconds)
+            except (requests.ConnectionError, requests.Timeout):
+                if not self.http_config.retry_on_connection_errors or attempt == attempts - 1:
+                    raise
+                delay = backoff_delay(attempt, self.crawler_config.backoff_seconds)
+                self.logger.warning(f"Connection error for {url}. Retrying in {delay}s", exc_info=True)
+                self.rate_limiter.backoff(url, delay)
+                continue
+
+            if response.status_code not in retry_status_codes or attempt == attempts - 1:
+                break
+            delay = backoff_delay(attempt, self.crawler_config.backoff_seconds, response.headers.get("Retry-After"))
+            self.logger.warning(f"Got {response.status_code} for {url}. Backing off for {delay}s")
+            self.rate_limiter.backoff(url, delay)
+
+        if response.status_code == 304:
+            # nothing was downloaded, keep using what we sent
+            return FetchResult(url, 304, None, validators)
+        response.raise_for_status()
+        return FetchResult(url, response.status_code, response.text,
+                           Validators(response.headers.get("ETag"), response.headers.get("Last-Modified")))
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,169 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+
+# seconds. from a cache hit to a selenium search scrolling through hundreds of results
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60., 120., 300., 600.)
+PREFIX = "dreamhome_"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.value = 0.
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.) -> None:
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # one more for everything above the last bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimated the way prometheus' histogram_quantile does: linear within the bucket the quantile falls in.
+        """
+        with self.lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for idx, count in enumerate(self.counts):
+                if seen + count >= rank and count:
+                    if idx == len(self.buckets):
+                        return self.max
+                    lower = self.buckets[idx - 1] if idx else 0.
+                    upper = min(self.buckets[idx], self.max)
+                    return lower + (upper - lower) * max(0., rank - seen) / count
+                seen += count
+            return self.max
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms for every stage of a run. Anything can record into the process wide METRICS
+    registry below without it being passed around. At the end of a run it's written as a prometheus text file
+    (for node_exporter's textfile collector) and as a json summary with a few quantiles.
+    Values add up over the life of the process: in daemon mode they cover every poll since start up.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        with self.lock:
+            if name not in self.counters:
+                self.counters[name] = Counter(name, help_text)
+            return self.counters[name]
+
+    def histogram(self, name: str, help_text: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(name, help_text, buckets)
+            return self.histograms[name]
+
+    def timer(self, name: str, help_text: str = ""):
+        """
+        with METRICS.timer("property_fetch_seconds"): ...
+        """
+        return self.histogram(name, help_text).time()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.values(), key=lambda metric: metric.name)
+            histograms = sorted(self.histograms.values(), key=lambda metric: metric.name)
+        for counter in counters:
+            name = PREFIX + counter.name
+            lines += [f"# HELP {name} {counter.help_text}", f"# TYPE {name} counter", f"{name} {counter.value:g}"]
+        for histogram in histograms:
+            name = PREFIX + histogram.name
+            lines += [f"# HELP {name} {histogram.help_text}", f"# TYPE {name} histogram"]
+            with histogram.lock:
+                cumulative = 0
+                for upper, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{upper:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum {histogram.sum:g}")
+                lines.append(f"{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        return {
+            'counters': {name: counter.value for name, counter in sorted(counters.items())},
+            'histograms': {name: {
+                'count': histogram.count,
+                'sum': round(histogram.sum, 6),
+                'mean': round(histogram.sum / histogram.count, 6) if histogram.count else None,
+                'p50': _round(histogram.quantile(.5)),
+                'p95': _round(histogram.quantile(.95)),
+                'max': round(histogram.max, 6),
+            } for name, histogram in sorted(histograms.items())},
+        }
+
+    def write(self, prometheus_file: Optional[str], summary_file: Optional[str]) -> None:
+        if prometheus_file:
+            _write_atomically(prometheus_file, self.to_prometheus())
+        if summary_file:
+            _write_atomically(summary_file, json.dumps(self.summary(), indent=2))
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None or math.isnan(value) else round(value, 6)
+
+
+def _write_atomically(path: str, text: str) -> None:
+    # the textfile collector may read at any time. never let it see half a file
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,88 @@
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from search_config import Metrics
+
+# profiles of the threads that ran while profiled() was active, merged into its output. None when not profiling
+_thread_profiles: Optional[List[cProfile.Profile]] = None
+_lock = threading.Lock()
+
+
+@contextmanager
+def profiled(metrics_config: Metrics = None) -> Iterator[None]:
+    """
+    cProfile and tracemalloc around a whole run. Leaves in profile_dir:
+    * run-<time>.prof: load it with pstats or snakeviz
+    * run-<time>.txt: the slowest functions (cumulative time) and the lines that allocated the most memory
+    cProfile only sees the thread that enabled it, so threads whose target is wrapped with profile_thread (the pipeline
+    stages) get a profiler of their own and everything is merged into one .prof. Work sent to other processes isn't
+    profiled: main.py --profile parses on a thread for that reason. tracemalloc sees every thread.
+    """
+    global _thread_profiles
+    config = metrics_config if metrics_config else Metrics()
+    logger = logging.getLogger()
+    os.makedirs(config.profile_dir, exist_ok=True)
+    base_name = os.path.join(config.profile_dir, time.strftime("run-%Y%m%d-%H%M%S"))
+
+    tracemalloc.start(config.tracemalloc_frames)
+    thread_profiles: List[cProfile.Profile] = []
+    with _lock:
+        _thread_profiles = thread_profiles
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _lock:
+            _thread_profiles = None
+            stats = pstats.Stats(profiler, *thread_profiles)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats.dump_stats(f"{base_name}.prof")
+        with open(f"{base_name}.txt", "w") as f:
+            f.write(f"Traced memory: current {current / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB\n")
+            f.write(f"Threads profiled: {len(thread_profiles) + 1}\n\n")
+            stats.stream = f
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(config.profile_top)
+            f.write(f"\nTop {config.profile_top} allocations by line\n")
+            for stat in snapshot.statistics("lineno")[:config.profile_top]:
+                f.write(f"{stat}\n")
+        logger.info(f"Profile written to {base_name}.prof and {base_name}.txt")
+
+
+def profile_thread(target: Callable) -> Callable:
+    """
+    `target` running under a profiler of its own while profiled() is active, for use as a thread's target. Threads
+    still running when profiled() ends aren't in its output.
+    """
+    @functools.wraps(target)
+    def run(*args, **kwargs):
+        with _lock:
+            profiles = _thread_profiles
+        if profiles is None:
+            return target(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # python 3.12+ only allows one cProfile at a time
+            return target(*args, **kwargs)
+        try:
+            return target(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with _lock:
+                profiles.append(profiler)
+
+    return run
@@ -0,0 +1,88 @@
+import re
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# comparisons on the numeric columns. the values are the db columns
+FIELDS = {"score": "score", "price": "price", "bedrooms": "bedrooms", "beds": "bedrooms", "bathrooms": "bathrooms",
+          "baths": "bathrooms"}
+TOKEN = re.compile(r"""\s*(?:
+    (?P<comparison>(?P<field>[a-z]+)\s*(?P<operator>>=|<=|!=|=|>|<)\s*(?P<number>\d+(?:\.\d+)?))
+    |within\s+(?:£(?P<price>[\d,]+(?:\.\d+)?)|(?P<days>\d+)\s+days?)\b
+    |(?P<operator_word>AND|NOT)\b
+    |"(?P<double_quoted>[^"]*)"|'(?P<single_quoted>[^']*)'
+    |(?P<word>[\w-]+)
+    |(?P<other>\S))""", re.VERBOSE | re.IGNORECASE)
+
+
+class QueryError(ValueError):
+    pass
+
+
+@dataclass
+class PropertyQuery:
+    """
+    What query.py asks the db for. Every condition has to hold (they are ANDed).
+    """
+    # (column, operator, value), e.g. ("score", ">", 70)
+    conditions: List[Tuple[str, str, float]] = field(default_factory=list)
+    # words and phrases the title or the description must (not) contain
+    phrases: List[str] = field(default_factory=list)
+    excluded_phrases: List[str] = field(default_factory=list)
+
+    def text_match(self) -> Optional[str]:
+        return _fts_expression(self.phrases, " AND ")
+
+    def text_exclude(self) -> Optional[str]:
+        return _fts_expression(self.excluded_phrases, " OR ")
+
+
+def parse_query(query: str, now: float = None) -> PropertyQuery:
+    """
+    Parses queries like `score > 70 AND 'south facing' within £2200`:
+    * score, price, bedrooms (beds) and bathrooms (baths) compared with a number: > >= < <= = !=
+    * within £2200 is price <= 2200, within 7 days only keeps the properties stored in the last 7 days
+    * 'quoted phrases', "quoted phrases" and bare words are looked up in the title and the description
+    * NOT in front of a phrase or a word excludes it
+    AND between conditions is optional, every condition has to hold anyway.
+    """
+    now = time.time() if now is None else now
+    parsed = PropertyQuery()
+    negate = False
+    for match in TOKEN.finditer(query.strip()):
+        if match.group("other"):
+            raise QueryError(f"Unexpected {match.group('other')!r} in query {query!r}")
+        operator_word = (match.group("operator_word") or "").upper()
+        if operator_word == "NOT":
+            if negate:
+                raise QueryError(f"NOT NOT in query {query!r}")
+            negate = True
+            continue
+        phrase = match.group("double_quoted") or match.group("single_quoted") or match.group("word")
+        if negate and phrase is None:
+            raise QueryError(f"NOT can only exclude a word or a phrase in query {query!r}")
+        if operator_word == "AND":
+            continue
+        if match.group("comparison"):
+            column = FIELDS.get(match.group("field").lower())
+            if column is None:
+                raise QueryError(f"Unknown field {match.group('field')!r} in query {query!r}. "
+                                 f"Use one of {', '.join(FIELDS)}")
+            parsed.conditions.append((column, match.group("operator"), float(match.group("number"))))
+        elif match.group("price"):
+            parsed.conditions.append(("price", "<=", float(match.group("price").replace(",", ""))))
+        elif match.group("days"):
+            parsed.conditions.append(("date_unix", ">=", now - int(match.group("days")) * 24 * 3600))
+        elif phrase is not None and phrase.strip():
+            (parsed.excluded_phrases if negate else parsed.phrases).append(phrase.strip())
+        negate = False
+    if negate:
+        raise QueryError(f"NOT at the end of query {query!r}")
+    return parsed
+
+
+def _fts_expression(phrases: List[str], joiner: str) -> Optional[str]:
+    # every phrase quoted (inner quotes doubled) so nothing in it is taken for FTS5 syntax
+    if not phrases:
+        return None
+    return joiner.join('"' + phrase.replace('"', '""') + '"' for phrase in phrases)
@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+from typing import List
+
+from db import DbConnOrm
+from metrics import METRICS
+from search_config import Storage
+
+
+class PropertyWriter:
+    """
+    Buffers scored properties and upserts them in batches, every write_batch_size properties or write_flush_seconds
+    (whichever comes first, a background thread takes care of the latter). A crash only loses the current batch.
+    """
+
+    def __init__(self, db_connector: DbConnOrm, storage_config: Storage = None) -> None:
+        self.db_connector = db_connector
+        self.config = storage_config if storage_config else Storage()
+        self.logger = logging.getLogger()
+        self.lock = threading.Lock()
+        self.buffer: List = []
+        self.last_flush = time.monotonic()
+        self.written = 0
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._flush_periodically, name="property-writer", daemon=True)
+        self.thread.start()
+
+    def add(self, new_property) -> None:
+        with self.lock:
+            self.buffer.append(new_property)
+            if len(self.buffer) >= self.config.write_batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def close(self) -> None:
+        self.closed.set()
+        self.thread.join()
+        self.flush()
+
+    def _flush(self) -> None:
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        with METRICS.timer("db_write_seconds", "Batched property upserts"):
+            self.db_connector.upsert_properties(self.buffer)
+        METRICS.counter("db_written_properties_total", "Properties upserted").inc(len(self.buffer))
+        self.written += len(self.buffer)
+        self.logger.debug(f"Stored {len(self.buffer)} properties")
+        self.buffer = []
+
+    def _flush_periodically(self) -> None:
+        while not self.closed.wait(min(1., self.config.write_flush_seconds)):
+            with self.lock:
+                if time.monotonic() - self.last_flush >= self.config.write_flush_seconds:
+                    try:
+                        self._flush()
+                    except Exception:
+                        # properties stay in the buffer. the next flush tries again
+                        self.logger.exception("Could not store properties")
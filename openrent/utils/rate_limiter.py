@@ -0,0 +1,86 @@
+import threading
+import time
+import urllib.parse
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    Classic token bucket. Tokens are refilled at `rate` per second up to `capacity`; every request takes one.
+    The bucket can also be paused (e.g. after a 429) so that nobody sharing it sends anything until the pause is over.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = max(1., capacity)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token if there is one and returns 0. Otherwise returns how long until there will be one.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.
+            return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            # don't let a burst go out the moment the pause is over
+            self.tokens = 0
+            self.last_refill = self.paused_until
+
+
+class HostRateLimiter:
+    """
+    Keeps one token bucket per host so all workers talking to the same site share the same budget.
+    """
+
+    def __init__(self, requests_per_second: float, burst: int = 1) -> None:
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        self._bucket(url).acquire()
+
+    def backoff(self, url: str, seconds: float) -> None:
+        self._bucket(url).pause(seconds)
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.requests_per_second, self.burst)
+            return self.buckets[host]
+
+
+def backoff_delay(attempt: int, backoff_seconds: float, retry_after: Optional[str] = None) -> float:
+    """
+    Seconds to wait before retrying. The server's Retry-After wins when it is a number of seconds, otherwise we back off
+    exponentially.
+    """
+    if retry_after:
+        try:
+            return max(0., float(retry_after))
+        except ValueError:
+            pass
+    return backoff_seconds * (2 ** attempt)
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import Engine, delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from db import DBRun, DBRunDiscovered, DBRunLocation
+from search_config import SearchConfig
+
+SEARCHING, SEARCHED, DONE = "searching", "searched", "done"
+
+
+def config_hash(search_config: SearchConfig) -> str:
+    return hashlib.sha256(search_config.to_json(sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class RunJournal:
+    """
+    Keeps track of how far a run got so an interrupted run (crash, selenium dying on the last location, ctrl-c)
+    picks up where it stopped: locations that are done are skipped and the ids a finished search found are reused.
+    Only runs with the same search config are resumed, anything else starts over. With resume=False (the daemon's
+    polls, where a stale search is worse than a repeated one) every run starts over, so nothing is written to the db:
+    the progress is only kept in memory for the run. The ids a finished run discovered are deleted, it's never resumed.
+    """
+
+    def __init__(self, engine: Engine, search_config: SearchConfig, resume: bool = True) -> None:
+        self.engine = engine
+        self.logger = logging.getLogger()
+        self.config_hash = config_hash(search_config)
+        self.resumed = False
+        self.persistent = resume
+        # the progress of a run that isn't persisted
+        self.statuses: Dict[str, str] = {}
+        self.found: Dict[str, Set[int]] = {}
+        self.run_id = self._start(search_config.storage.resume_max_age_hours) if resume else None
+
+    def status(self, location: str) -> Optional[str]:
+        if not self.persistent:
+            return self.statuses.get(location)
+        with Session(self.engine) as session:
+            progress = session.get(DBRunLocation, (self.run_id, location))
+            return progress.status if progress else None
+
+    def set_status(self, location: str, status: str) -> None:
+        if not self.persistent:
+            self.statuses[location] = status
+            return
+        stmt = sqlite_insert(DBRunLocation).values(run_id=self.run_id, location=location, status=status,
+                                                   updated_unix=int(time.time()))
+        stmt = stmt.on_conflict_do_update(index_elements=[DBRunLocation.run_id, DBRunLocation.location],
+                                          set_={'status': stmt.excluded.status,
+                                                'updated_unix': stmt.excluded.updated_unix})
+        with Session(self.engine) as session:
+            session.execute(stmt)
+            session.commit()
+
+    def record_discovered(self, location: str, property_ids: Iterable[int]) -> None:
+        if not self.persistent:
+            self.found.setdefault(location, set()).update(property_ids)
+            return
+        rows = [{'run_id': self.run_id, 'location': location, 'property_id': property_id}
+                for property_id in property_ids]
+        if not rows:
+            return
+        with Session(self.engine) as session:
+            session.execute(sqlite_insert(DBRunDiscovered).on_conflict_do_nothing(), rows)
+            session.commit()
+
+    def discovered(self, location: str) -> Set[int]:
+        if not self.persistent:
+            return set(self.found.get(location, ()))
+        with Session(self.engine) as session:
+            return set(session.scalars(select(DBRunDiscovered.property_id).where(
+                DBRunDiscovered.run_id == self.run_id, DBRunDiscovered.location == location)))
+
+    def finish(self) -> None:
+        if not self.persistent:
+            return
+        with Session(self.engine) as session:
+            session.execute(update(DBRun).where(DBRun.id == self.run_id).values(finished_unix=int(time.time())))
+            session.execute(delete(DBRunDiscovered).where(DBRunDiscovered.run_id == self.run_id))
+            session.commit()
+
+    def _start(self, resume_max_age_hours: int) -> int:
+        now = int(time.time())
+        with Session(self.engine) as session:
+            interrupted = session.scalar(
+                select(DBRun)
+                .where(DBRun.finished_unix.is_(None), DBRun.config_hash == self.config_hash,
+                       DBRun.started_unix >= now - resume_max_age_hours * 3600)
+                .order_by(DBRun.id.desc()).limit(1))
+            if interrupted is not None:
+                self.resumed = True
+                self.logger.info(f"Resuming run {interrupted.id} started at {interrupted.started_unix}")
+                return interrupted.id
+            run = DBRun(config_hash=self.config_hash, started_unix=now)
+            session.add(run)
+            session.commit()
+            return run.id
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from rate_limiter import TokenBucket
+
+OPENRENT, TFL, SLACK = "openrent", "tfl", "slack"
+UPSTREAMS = {OPENRENT: "https://www.openrent.co.uk", TFL: "https://api.tfl.gov.uk"}
+# the services live under their own prefix, openrent at the root so property urls look like the real ones
+TFL_PREFIX, SLACK_PREFIX = "/tfl/", "/slack/api/"
+# never part of a recording key
+SECRET_PARAMS = {"app_id", "app_key", "token"}
+
+STREETS = ["Chapter Road", "Walm Lane", "Anson Road", "Dartmouth Road", "Mapesbury Road", "Teignmouth Road",
+           "Cricklewood Lane", "Olive Road", "Park Avenue North", "Heber Road"]
+POST_CODES = ["NW10 5BU", "NW2 4LT", "NW6 7TJ", "NW10 2RX", "W9 2BT", "NW2 3ED", "NW6 1RP", "W10 4PH"]
+STATIONS = ["Willesden Green", "Dollis Hill", "Kilburn", "Brondesbury Park", "Queen's Park", "Kensal Rise"]
+
+
+@dataclass
+class Behaviour:
+    """
+    How one simulated service misbehaves. Latency is uniform in latency_ms +/- jitter_ms.
+    """
+    latency_ms: float = 0.
+    jitter_ms: float = 0.
+    # share of the requests answered with a 503
+    error_rate: float = 0.
+    # above this the service answers 429 with a Retry-After. 0 for no limit
+    requests_per_second: float = 0.
+
+
+@dataclass
+class ServiceStats:
+    requests: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    not_modified: int = 0
+    replayed: int = 0
+
+
+@dataclass
+class SimulatorConfig:
+    listings_per_search: int = 200
+    # cards per search page and per infinite scroll step
+    page_size: int = 20
+    # 'synthetic' makes everything up, 'record' forwards to the real services and keeps the answers, 'replay' serves
+    # what was recorded (and makes up whatever wasn't)
+    mode: str = "synthetic"
+    record_dir: str = "recordings"
+    seed: int = 0
+    behaviours: Dict[str, Behaviour] = field(default_factory=lambda: {OPENRENT: Behaviour(), TFL: Behaviour(),
+                                                                      SLACK: Behaviour()})
+
+
+class Simulator:
+    """
+    Stand-in for OpenRent, TFL's journey planner and Slack's chat.postMessage, so the crawler can be load tested (and
+    its backoff exercised) without touching the real services. Point crawler.base_url, tfl.base_url and
+    notifications.base_url at it.
+
+    Search results are stable per search term, property pages per id, journeys per (from, to) pair. Property pages
+    carry an ETag and answer a matching If-None-Match with a 304, like the real site.
+    """
+
+    def __init__(self, config: SimulatorConfig = None) -> None:
+        self.config = config if config else SimulatorConfig()
+        self.logger = logging.getLogger()
+        self.lock = threading.Lock()
+        self.stats = {service: ServiceStats() for service in (OPENRENT, TFL, SLACK)}
+        self.slack_messages = 0
+        self.buckets = {service: TokenBucket(behaviour.requests_per_second, behaviour.requests_per_second)
+                        for service, behaviour in self.config.behaviours.items() if behaviour.requests_per_second > 0}
+        self.random = random.Random(self.config.seed)
+
+    def handle(self, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Returns (status, headers, body) for a request.
+        """
+        parsed = urllib.parse.urlsplit(path)
+        if parsed.path == "/_stats":
+            return _json(200, self.stats_summary())
+        service = self._service(parsed.path)
+
+        with self.lock:
+            stats = self.stats[service]
+            stats.requests += 1
+            rejected = self._rate_limited(service)
+            if rejected is not None:
+                stats.rate_limited += 1
+            elif self.random.random() < self.config.behaviours[service].error_rate:
+                stats.errors += 1
+                rejected = 503, {}
+            delay = self._latency(service)
+        time.sleep(delay)
+        if rejected is not None:
+            status, extra_headers = rejected
+            return _error(service, status, extra_headers)
+
+        if service == SLACK:
+            return self._slack(parsed.path, body)
+        if self.config.mode in ("record", "replay"):
+            recorded = self._recorded(service, parsed, headers)
+            if recorded is not None:
+                return recorded
+        if service == TFL:
+            return self._journey(parsed.path[len(TFL_PREFIX) - 1:])
+        return self._openrent(parsed, headers)
+
+    def stats_summary(self) -> Dict:
+        with self.lock:
+            return {'slack_messages': self.slack_messages,
+                    'services': {service: vars(stats).copy() for service, stats in self.stats.items()}}
+
+    @staticmethod
+    def _service(path: str) -> str:
+        if path.startswith(TFL_PREFIX):
+            return TFL
+        if path.startswith(SLACK_PREFIX):
+            return SLACK
+        return OPENRENT
+
+    def _rate_limited(self, service: str) -> Optional[Tuple[int, Dict[str, str]]]:
+        bucket = self.buckets.get(service)
+        wait = bucket.try_acquire() if bucket else 0.
+        if not wait:
+            return None
+        return 429, {'Retry-After': f"{max(1, round(wait))}"}
+
+    def _latency(self, service: str) -> float:
+        behaviour = self.config.behaviours[service]
+        return max(0., behaviour.latency_ms + self.random.uniform(-behaviour.jitter_ms, behaviour.jitter_ms)) / 1000
+
+    def _openrent(self, parsed: urllib.parse.SplitResult, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        if parsed.path.rstrip("/") == "/properties-to-rent":
+            params = urllib.parse.parse_qs(parsed.query)
+            term = params.get("term", [""])[0]
+            skip = int(params.get("skip", ["0"])[0])
+            return _html(200, self._search_page(term, skip, fragment="fragment" in params))
+        property_id = parsed.path.strip("/")
+        if not property_id.isdigit():
+            return _html(404, "<html><body>Not found</body></html>")
+        etag = f'"{property_id}-1"'
+        if headers.get("If-None-Match") == etag:
+            with self.lock:
+                self.stats[OPENRENT].not_modified += 1
+            return 304, {'ETag': etag}, b""
+        status, response_headers, body = _html(200, property_page(int(property_id)))
+        response_headers['ETag'] = etag
+        return status, response_headers, body
+
+    def _search_ids(self, term: str):
+        # stable per search term so repeated searches find the same (already seen) listings
+        base = 1000000 + int(hashlib.md5(term.upper().encode()).hexdigest()[:6], 16) % 500000
+        return [base + idx * 7 for idx in range(self.config.listings_per_search)]
+
+    def _search_page(self, term: str, skip: int, fragment: bool) -> str:
+        ids = self._search_ids(term)[skip:skip + self.config.page_size]
+        cards = "\n".join(_listing_card(property_id) for property_id in ids)
+        if fragment:
+            return cards
+        # the rest of the results come in as the page is scrolled down, like the real infinite scroll
+        return f"""<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Property to Rent in {term} - OpenRent</title>
+<style>.pli {{ display: block; height: 400px; }}</style></head>
+<body>
+<div id="property-data">
+{cards}
+</div>
+<script type="text/javascript">
+var loaded = {skip + len(ids)}; var loading = false; var done = {str(len(ids) < self.config.page_size).lower()};
+window.addEventListener("scroll", function () {{
+  if (loading || done || window.innerHeight + window.pageYOffset < document.body.scrollHeight - 50) return;
+  loading = true;
+  var url = new URL(window.location.href);
+  url.searchParams.set("skip", loaded);
+  url.searchParams.set("fragment", "1");
+  fetch(url).then(function (r) {{ return r.text(); }}).then(function (html) {{
+    var found = (html.match(/class="pli/g) || []).length;
+    document.getElementById("property-data").insertAdjacentHTML("beforeend", html);
+    loaded += found; done = found < {self.config.page_size}; loading = false;
+  }});
+}});
+</script>
+</body>
+</html>
+"""
+
+    def _journey(self, path: str) -> Tuple[int, Dict[str, str], bytes]:
+        # /Journey/JourneyResults/<from>/to/<to>
+        parts = [urllib.parse.unquote(part) for part in path.strip("/").split("/")]
+        if len(parts) != 5 or parts[:2] != ["Journey", "JourneyResults"]:
+            return _json(404, {'message': "No such endpoint"})
+        durations = journey_durations(parts[2], parts[4])
+        return _json(200, {'journeys': [{'duration': duration, 'legs': []} for duration in durations]})
+
+    def _slack(self, path: str, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        if not path.endswith("chat.postMessage"):
+            return _json(200, {'ok': False, 'error': "unknown_method"})
+        with self.lock:
+            self.slack_messages += 1
+        return _json(200, {'ok': True, 'channel': "C0SIMULATOR", 'ts': f"{time.time():.6f}"})
+
+    def _recorded(self, service: str, parsed: urllib.parse.SplitResult,
+                  headers: Dict[str, str]) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        path = parsed.path[len(TFL_PREFIX) - 1:] if service == TFL else parsed.path
+        query = [(key, value) for key, value in urllib.parse.parse_qsl(parsed.query) if key not in SECRET_PARAMS]
+        key = hashlib.sha1(f"{path}?{urllib.parse.urlencode(sorted(query))}".encode()).hexdigest()
+        recording = os.path.join(self.config.record_dir, service, f"{key}.json")
+
+        if os.path.exists(recording):
+            with open(recording) as f:
+                recorded = json.load(f)
+            with self.lock:
+                self.stats[service].replayed += 1
+            return recorded['status'], {'Content-Type': recorded['content_type']}, recorded['body'].encode("utf-8")
+        if self.config.mode != "record":
+            return None
+
+        # the real thing, with the caller's query (api keys included)
+        response = requests.get(f"{UPSTREAMS[service]}{path}", params=urllib.parse.parse_qsl(parsed.query),
+                                headers={'User-Agent': headers.get("User-Agent", "DreamHome")}, timeout=30)
+        content_type = response.headers.get("Content-Type", "text/html")
+        if response.status_code == 200:
+            os.makedirs(os.path.dirname(recording), exist_ok=True)
+            with open(recording, "w") as f:
+                json.dump({'url': f"{path}?{urllib.parse.urlencode(query)}", 'status': response.status_code,
+                           'content_type': content_type, 'body': response.text}, f)
+        return response.status_code, {'Content-Type': content_type}, response.content
+
+
+def property_page(property_id: int) -> str:
+    rng = random.Random(property_id)
+    bedrooms = rng.randint(1, 4)
+    street, post_code = rng.choice(STREETS), rng.choice(POST_CODES)
+    tick = '<i class="fa fa-check"></i>'
+    cross = '<i class="fa fa-times"></i>'
+    stations = "\n".join(f"<tr><td>{station}</td><td>{rng.randint(1, 15) / 10} miles</td></tr>"
+                         for station in rng.sample(STATIONS, 3))
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>{bedrooms} Bed Flat, {street} - OpenRent</title></head>
+<body>
+<h1 class="property-title">{bedrooms} Bed Flat, {street}, {post_code.split()[0]}</h1>
+<div class="description"><p>A bright {bedrooms} bedroom flat on {street}, close to the station.
+{rng.choice(["Private garden to the rear.", "Access to a shared garden.", "Recently refurbished throughout."])}</p></div>
+<div id="Features"><table>
+<tr><td>Available From</td><td>{rng.choice(["Today", "Tomorrow", "01 March, 2025"])}</td></tr>
+<tr><td>EPC Rating</td><td>{rng.choice("BCDE")}</td></tr>
+<tr><td>Garden</td><td>{tick if rng.random() < .4 else cross}</td></tr>
+<tr><td>Parking</td><td>{tick if rng.random() < .3 else cross}</td></tr>
+</table></div>
+<div id="LocalTransport"><table>
+<tr><th>Station</th><th>Distance</th></tr>
+{stations}
+</table></div>
+<a href="/comparebroadband?postCode={urllib.parse.quote(post_code)}">Check broadband speeds</a>
+<div class="card manage-card mb-0">
+<h3 class="price-title">£{rng.randrange(1400, 4200, 25):,}</h3>
+<table>
+<tr><td>Bedrooms</td><td>{bedrooms}</td></tr>
+<tr><td>Bathrooms</td><td>{rng.randint(1, 2)}</td></tr>
+</table>
+</div>
+</body>
+</html>
+"""
+
+
+def journey_durations(start: str, end: str):
+    rng = random.Random(f"{''.join(start.split()).upper()}|{''.join(end.split()).upper()}")
+    fastest = rng.randint(15, 70)
+    return [fastest + rng.randint(0, 15) for _ in range(3)] + [fastest]
+
+
+def _listing_card(property_id: int) -> str:
+    return f'<a class="pli clearfix" href="/{property_id}"><div class="listing-title">Flat {property_id}</div></a>'
+
+
+def _html(status: int, text: str) -> Tuple[int, Dict[str, str], bytes]:
+    return status, {'Content-Type': "text/html; charset=utf-8"}, text.encode("utf-8")
+
+
+def _json(status: int, data) -> Tuple[int, Dict[str, str], bytes]:
+    return status, {'Content-Type': "application/json; charset=utf-8"}, json.dumps(data).encode("utf-8")
+
+
+def _error(service: str, status: int, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+    if service == SLACK:
+        error = "ratelimited" if status == 429 else "service_unavailable"
+        status, response_headers, body = _json(status, {'ok': False, 'error': error})
+    else:
+        status, response_headers, body = _html(status, f"<html><body>{status}</body></html>")
+    response_headers.update(headers)
+    return status, response_headers, body
+
+
+def make_server(simulator: Simulator, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self._respond()
+
+        def do_POST(self):
+            self._respond()
+
+        def _respond(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            status, headers, payload = simulator.handle(self.path, dict(self.headers), body)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            simulator.logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
@@ -1,8 +1,23 @@
 import logging
+import queue
+import threading
+import time
+from typing import List, Optional, TYPE_CHECKING
 
 from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
 
-from property import Property
+from metrics import METRICS
+from rate_limiter import TokenBucket, backoff_delay
+from search_config import Notifications
+
+if TYPE_CHECKING:
+    from property import Property
+
+# block kit limits
+MAX_HEADER_CHARS = 150
+MAX_SECTION_CHARS = 3000
+MAX_DESCRIPTION_CHARS = 1000
 
 
 class Slack:
@@ -10,14 +25,27 @@ class Slack:
     This class allows for sending messages/updates to slack.
     Currently it can send a notification about a newly discovered property that has a score about the notification
     treshold as well as sending individual messages.
+
+    Nothing is sent from the caller's thread: messages go on a queue and a background thread delivers them at the rate
+    slack allows (waiting as long as Retry-After says when we're rate limited anyway). Progress messages are merged
+    into a digest sent every digest_seconds so they don't eat into the budget of the property notifications.
     """
 
-    def __init__(self, token: str, channel: str):
-        self.slack_client = WebClient(token=token)
+    def __init__(self, token: str, channel: str, notifications_config: Notifications = None):
+        self.config = notifications_config if notifications_config else Notifications()
+        self.slack_client = WebClient(token=token, base_url=self.config.base_url)
         self.channel = channel
         self.logger = logging.getLogger()
+        self.bucket = TokenBucket(self.config.messages_per_second, 1)
+        self.queue: queue.Queue = queue.Queue()
+        self.digest: List[str] = []
+        self.digest_lock = threading.Lock()
+        self.last_digest = time.monotonic()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._deliver, name="slack", daemon=True)
+        self.thread.start()
 
-    def notify(self, target_property: Property, notify_at: int) -> bool:
+    def notify(self, target_property: "Property", notify_at: int) -> bool:
         if target_property.score < notify_at:
             self.logger.info(
                 f"Not going to notify for property {target_property.property_id} as its score {target_property.score} is less than threshold {notify_at}")
@@ -25,49 +53,124 @@ class Slack:
 
         self.logger.info(
             f"Sending notification for property {target_property.property_details.url} as score {target_property.score} greater than threshold {notify_at}")
-
-        text = self.get_slack_notification_text(target_property)
-        self.slack_client.chat_postMessage(channel=f"#{self.channel}",
-                                           text=text,
-                                           icon_emoji=':new:')
-
-        self.slack_client.chat_postMessage(channel=f"#{self.channel}",
-                                           text="-----------------------------------------",
-                                           icon_emoji=':new:')
+        self.queue.put({'text': self.get_slack_notification_summary(target_property),
+                        'blocks': self.get_slack_notification_blocks(target_property),
+                        'found_at': target_property.found_at})
         return True
 
     def send_message(self, message: str) -> None:
-        self.slack_client.chat_postMessage(channel=f"#{self.channel}",
-                                           text=message,
-                                           icon_emoji=':new:')
+        """
+        Progress update. Goes out with the next digest.
+        """
+        with self.digest_lock:
+            self.digest.append(message)
+
+    def flush(self) -> None:
+        """
+        Sends the pending digest and waits until everything queued so far has been delivered (or given up on).
+        """
+        self._queue_digest()
+        self.queue.join()
+
+    def close(self) -> None:
+        if self.closed.is_set():
+            return
+        self.flush()
+        self.closed.set()
+        self.queue.put(None)
+        self.thread.join()
 
-    def get_slack_notification_text(self, target_property: Property) -> str:
+    def _queue_digest(self) -> None:
+        with self.digest_lock:
+            self.last_digest = time.monotonic()
+            if not self.digest:
+                return
+            text = "\n".join(self.digest)
+            self.digest = []
+        self.queue.put({'text': text})
+
+    def _deliver(self) -> None:
+        while True:
+            if time.monotonic() - self.last_digest >= self.config.digest_seconds:
+                self._queue_digest()
+            try:
+                message = self.queue.get(timeout=1.)
+            except queue.Empty:
+                continue
+            try:
+                if message is None:
+                    return
+                self._post(message)
+            finally:
+                self.queue.task_done()
+
+    def _post(self, message: dict) -> None:
+        # when the search found the property, for the listing to notification latency
+        found_at = message.pop('found_at', None)
+        for attempt in range(self.config.max_retries):
+            self.bucket.acquire()
+            try:
+                with METRICS.timer("slack_post_seconds", "Slack API calls"):
+                    self.slack_client.chat_postMessage(channel=f"#{self.channel}", icon_emoji=':new:', **message)
+                break
+            except SlackApiError as e:
+                METRICS.counter("slack_errors_total", "Slack API calls that failed").inc()
+                if e.response.status_code != 429 and e.response.status_code < 500:
+                    # channel_not_found, invalid_auth, not_in_channel... the same message would fail every time
+                    METRICS.counter("slack_dropped_total", "Slack messages given up on").inc()
+                    self.logger.error(f"Slack refused a message ({e.response.status_code}, "
+                                      f"{e.response.get('error')}), dropping it: {message['text'][:100]}")
+                    return
+                retry_after = e.response.headers.get("Retry-After") if e.response.status_code == 429 else None
+                delay = backoff_delay(attempt, 1., retry_after)
+                self.logger.warning(f"Slack refused a message ({e.response.status_code}). Retrying in {delay}s")
+                self.bucket.pause(delay)
+            except Exception:
+                METRICS.counter("slack_errors_total", "Slack API calls that failed").inc()
+                self.logger.exception("Could not send slack message")
+                self.bucket.pause(backoff_delay(attempt, 1.))
+        else:
+            METRICS.counter("slack_dropped_total", "Slack messages given up on").inc()
+            self.logger.error(f"Giving up on slack message: {message['text'][:100]}")
+            return
+        if found_at is not None:
+            METRICS.histogram("listing_to_notification_seconds",
+                              "From the search finding a property to its notification being delivered"
+                              ).observe(time.monotonic() - found_at)
+
+    def get_slack_notification_summary(self, target_property: "Property") -> str:
+        # notification text and fallback for clients that can't show blocks
+        property_details = target_property.property_details
+        prefix = "Updated: " if target_property.previous_fingerprint else ""
+        return f"{prefix}{property_details.title} - {property_details.url} - Score: {target_property.score}%"
+
+    def get_slack_notification_blocks(self, target_property: "Property") -> List[dict]:
         property_details = target_property.property_details
         location = property_details.post_code if property_details.post_code else property_details.location
-        text = ("""
-            {title} - {url} - Score: {score}% 
-            Location: {location}
-            Price: {price} 
-            Available from: {av}
-            Bedrooms: {bedrooms} / Bathrooms: {bathrooms} 
-            Garden: {has_garden}
-            Broadband: {broadband}
-            Description: ```{desc}```
-            Score reasons: ```{score_reasons}```
-
-            """
-                ).format(
-            location=location,
-            url=property_details.url,
-            price=property_details.price,
-            desc=property_details.description[:1000],
-            av=property_details.available_from,
-            title=property_details.title,
-            bedrooms=property_details.bedrooms,
-            bathrooms=property_details.bathrooms,
-            has_garden="With garden. " if property_details.has_garden else "No garden",
-            score=target_property.score,
-            broadband=f"https://www.openrent.co.uk/comparebroadband?postCode={property_details.post_code.replace(' ', '')}" if property_details.post_code else "Unknown broadband speeds",
-            score_reasons="\n".join(target_property.score_reasons)
-        )
-        return text
+        broadband = f"<https://www.openrent.co.uk/comparebroadband?postCode={property_details.post_code.replace(' ', '')}|Check speeds>" if property_details.post_code else "Unknown broadband speeds"
+        prefix = "Updated: " if target_property.previous_fingerprint else ""
+        fields = [
+            f"*Score:* {target_property.score}%",
+            f"*Price:* {property_details.price}",
+            f"*Location:* {location}",
+            f"*Available from:* {property_details.available_from}",
+            f"*Bedrooms / Bathrooms:* {property_details.bedrooms} / {property_details.bathrooms}",
+            f"*Garden:* {'With garden' if property_details.has_garden else 'No garden'}",
+            f"*Broadband:* {broadband}",
+        ]
+        return [
+            {'type': "header",
+             'text': {'type': "plain_text", 'text': _truncate(f"{prefix}{property_details.title}", MAX_HEADER_CHARS)}},
+            {'type': "section", 'text': {'type': "mrkdwn", 'text': f"<{property_details.url}>"},
+             'fields': [{'type': "mrkdwn", 'text': field} for field in fields]},
+            {'type': "section", 'text': {'type': "mrkdwn", 'text': _truncate(
+                f"```{property_details.description[:MAX_DESCRIPTION_CHARS]}```", MAX_SECTION_CHARS)}},
+            {'type': "context", 'elements': [{'type': "mrkdwn", 'text': _truncate(
+                "\n".join(target_property.score_reasons), MAX_SECTION_CHARS)}]},
+            {'type': "divider"},
+        ]
+
+
+def _truncate(text: Optional[str], limit: int) -> str:
+    text = text or "-"
+    return text if len(text) <= limit else text[:limit - 1] + "…"
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from search_config import Tfl
+from tfl_cache import TflJourneyCache
+from tfl_helper import TflHelper
+
+
+class AsyncTflHelper(TflHelper):
+    """
+    TflHelper that runs the journey queries on an asyncio loop of its own.
+    All the work locations of a property are queried at once and so are the queries coming from different properties
+    (i.e. different worker threads), within a global concurrency cap. Queries for a route that is already in flight
+    don't go to TFL again, they just wait for the first one to come back (singleflight).
+
+    The TFL client is blocking so each query runs on the loop's executor. Backoff sleeps from @retry only hold up that
+    one query.
+    """
+
+    def __init__(self, app_id: str, app_key: str, tfl_config: Tfl = None, cache: TflJourneyCache = None) -> None:
+        super().__init__(app_id, app_key, tfl_config, cache)
+        self.executor = ThreadPoolExecutor(max_workers=self.config.max_concurrent_requests,
+                                           thread_name_prefix="tfl")
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.executor)
+        self.thread = threading.Thread(target=self.loop.run_forever, name="tfl-loop", daemon=True)
+        self.thread.start()
+        # only touched from the loop thread
+        self.semaphore = None
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    def get_best_time(self, start_location: str, end_location: str) -> int:
+        return self.get_best_times(start_location, [end_location])[end_location]
+
+    def get_best_times(self, start_location: str, end_locations: List[str]) -> Dict[str, int]:
+        future = asyncio.run_coroutine_threadsafe(self.get_best_times_async(start_location, end_locations), self.loop)
+        return future.result()
+
+    async def get_best_times_async(self, start_location: str, end_locations: List[str]) -> Dict[str, int]:
+        durations = await asyncio.gather(
+            *[self._get_best_time_async(start_location, end_location) for end_location in end_locations])
+        return dict(zip(end_locations, durations))
+
+    async def _get_best_time_async(self, start_location: str, end_location: str) -> int:
+        route_key = self.route_key(start_location, end_location)
+        in_flight = self.in_flight.get(route_key)
+        if in_flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(in_flight)
+
+        future = self.loop.create_future()
+        self.in_flight[route_key] = future
+        try:
+            if self.semaphore is None:
+                self.semaphore = asyncio.Semaphore(self.config.max_concurrent_requests)
+            async with self.semaphore:
+                duration = await self.loop.run_in_executor(None, super().get_best_time, start_location,
+                                                           end_location)
+            future.set_result(duration)
+            return duration
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody else waiting on it? then don't warn about an exception that was never retrieved
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[route_key]
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,114 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy import Engine, delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from db import DBTflJourney
+from search_config import Tfl
+
+# how often (in inserts) we check if the cache grew past its max size
+EVICTION_CHECK_EVERY = 100
+
+
+@dataclass
+class TflCacheStats:
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    # time spent calling TFL on misses and the time the hits would have cost us
+    api_seconds: float = 0.
+    saved_seconds: float = 0.
+
+    def __str__(self) -> str:
+        return (f"TFL cache: {self.hits} hits ({self.negative_hits} without a route), {self.misses} misses/API calls, "
+                f"{self.api_seconds:.1f}s spent calling TFL, {self.saved_seconds:.1f}s saved")
+
+
+class TflJourneyCache:
+    """
+    Persistent cache of journey times stored in the sqlite db.
+    Entries are keyed on the normalized postcodes, the transport modes and the departure slot. They expire after a
+    configurable TTL ("no route" answers have their own, usually shorter, TTL) and the least recently used ones are
+    evicted once the cache grows past its max size.
+    """
+
+    def __init__(self, engine: Engine, tfl_config: Tfl = None) -> None:
+        self.engine = engine
+        self.config = tfl_config if tfl_config else Tfl()
+        self.stats = TflCacheStats()
+        self.lock = threading.Lock()
+        self.puts = 0
+
+    @staticmethod
+    def route_key(start_location: str, end_location: str, modes: str, departure_slot: str) -> str:
+        def normalize(location: str) -> str:
+            return "".join(location.split()).upper()
+
+        return "|".join([normalize(start_location), normalize(end_location), modes, departure_slot])
+
+    def get(self, route_key: str) -> Tuple[bool, Optional[int]]:
+        """
+        Returns (found, duration). A found entry with no duration is a cached "no route".
+        """
+        now = int(time.time())
+        with Session(self.engine) as session:
+            entry = session.get(DBTflJourney, route_key)
+            if entry is None or self._expired(entry, now):
+                with self.lock:
+                    self.stats.misses += 1
+                return False, None
+            entry.last_used_unix = now
+            duration, latency_ms = entry.duration, entry.latency_ms
+            session.commit()
+
+        with self.lock:
+            self.stats.hits += 1
+            self.stats.saved_seconds += latency_ms / 1000
+            if duration is None:
+                self.stats.negative_hits += 1
+        return True, duration
+
+    def put(self, route_key: str, duration: Optional[int], latency_seconds: float) -> None:
+        now = int(time.time())
+        # an upsert rather than merge(): two workers missing the same route at once would both try to insert it
+        stmt = sqlite_insert(DBTflJourney).values(route_key=route_key, duration=duration,
+                                                  latency_ms=int(latency_seconds * 1000), created_unix=now,
+                                                  last_used_unix=now)
+        stmt = stmt.on_conflict_do_update(index_elements=[DBTflJourney.route_key],
+                                          set_={column: stmt.excluded[column] for column in
+                                                ('duration', 'latency_ms', 'created_unix', 'last_used_unix')})
+        with Session(self.engine) as session:
+            session.execute(stmt)
+            session.commit()
+
+        with self.lock:
+            self.stats.api_seconds += latency_seconds
+            self.puts += 1
+            check_eviction = self.puts % EVICTION_CHECK_EVERY == 0
+        if check_eviction:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Drops expired entries and then the least recently used ones until we're within the max size.
+        """
+        now = int(time.time())
+        with Session(self.engine) as session:
+            removed = session.execute(delete(DBTflJourney).where(
+                (DBTflJourney.created_unix < now - self.config.cache_ttl_hours * 3600) |
+                ((DBTflJourney.duration.is_(None)) &
+                 (DBTflJourney.created_unix < now - self.config.negative_cache_ttl_hours * 3600)))).rowcount
+            overflow = session.scalar(select(func.count()).select_from(DBTflJourney)) - self.config.cache_max_entries
+            if overflow > 0:
+                oldest = select(DBTflJourney.route_key).order_by(DBTflJourney.last_used_unix).limit(overflow)
+                removed += session.execute(delete(DBTflJourney).where(DBTflJourney.route_key.in_(oldest))).rowcount
+            session.commit()
+        return removed
+
+    def _expired(self, entry: DBTflJourney, now: int) -> bool:
+        ttl_hours = self.config.negative_cache_ttl_hours if entry.duration is None else self.config.cache_ttl_hours
+        return entry.created_unix < now - ttl_hours * 3600
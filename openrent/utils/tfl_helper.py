@@ -2,12 +2,40 @@ import datetime
 import json
 import logging
 import math
+import time
+from typing import Dict, List, Optional
 
+import requests
 from retry import retry
 from tfl.api_token import ApiToken
 from tfl.client import RestClient
 
+from metrics import METRICS
+from search_config import Tfl
+from tfl_cache import TflJourneyCache
 
+# if we can't compute the journey we respond with a long time. humans can then judge.
+NO_ROUTE_MINUTES = 120
+# a busy or failing TFL is not a "no route": retried and, if it keeps failing, the property is retried next run
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+TIMEOUT_SECONDS = 30
+
+
+class TflUnavailable(Exception):
+    pass
+
+
+class TflRestClient(RestClient):
+    """
+    tfl's RestClient with the base url from our config (so it can be pointed at simulator.py) and a timeout.
+    """
+
+    def __init__(self, api_token: ApiToken, base_url: str) -> None:
+        super().__init__(api_token)
+        self.base_url = base_url.rstrip("/") + "/"
+
+    def send_request(self, location, params=None):
+        return requests.get(self.base_url + location + "?" + self._get_query_strings(params), timeout=TIMEOUT_SECONDS)
 
 
 class TflHelper:
@@ -17,31 +45,64 @@ class TflHelper:
     Some more logic could go here in order to understand for example that the shortest journey is 75% walking and 25% tube.
     Or some other similar stuff.
     """
-    def __init__(self, app_id: str, app_key: str) -> None:
-        token = ApiToken(app_id, app_key)
-        self.client = RestClient(token)
+    def __init__(self, app_id: str, app_key: str, tfl_config: Tfl = None, cache: TflJourneyCache = None) -> None:
+        self.config = tfl_config if tfl_config else Tfl()
+        self.client = TflRestClient(ApiToken(app_id, app_key), self.config.base_url)
         self.logger = logging.getLogger()
+        self.cache = cache
 
-    # retry ... just in case
-    @retry(KeyError, delay=1, backoff=2, tries=3)
     def get_best_time(self, start_location: str, end_location: str) -> int:
         # compute next monday since traffic on weekends is less important
         next_monday = self._get_next_working_day_as_string()
 
-        # only select overground/tube since we don't care about other transportation methods
-        resp = self.client.send_request(f"Journey/JourneyResults/{start_location}/to/{end_location}",
-                                        params={'mode': 'overground,tube', 'date': next_monday, 'time': '0800'})
+        if self.cache is None:
+            duration = self._query_best_time(start_location, end_location, next_monday)
+        else:
+            route_key = self.route_key(start_location, end_location)
+            found, duration = self.cache.get(route_key)
+            if not found:
+                start = time.monotonic()
+                duration = self._query_best_time(start_location, end_location, next_monday)
+                self.cache.put(route_key, duration, time.monotonic() - start)
+
+        return NO_ROUTE_MINUTES if duration is None else duration
+
+    def get_best_times(self, start_location: str, end_locations: List[str]) -> Dict[str, int]:
+        """
+        Best time from one place to each of the end locations.
+        """
+        return {end_location: self.get_best_time(start_location, end_location) for end_location in end_locations}
+
+    def route_key(self, start_location: str, end_location: str) -> str:
+        # the date itself is not part of the key: a monday morning journey is a monday morning journey
+        return TflJourneyCache.route_key(start_location, end_location, self.config.modes,
+                                         f"MON-{self.config.departure_time}")
+
+    # retry ... just in case
+    @retry((KeyError, TflUnavailable), delay=1, backoff=2, tries=3)
+    def _query_best_time(self, start_location: str, end_location: str, date: str) -> Optional[int]:
+        # by default only overground/tube since we don't care about other transportation methods
+        with METRICS.timer("tfl_request_seconds", "TFL journey planner calls"):
+            resp = self.client.send_request(f"Journey/JourneyResults/{start_location}/to/{end_location}",
+                                            params={'mode': self.config.modes, 'date': date,
+                                                    'time': self.config.departure_time})
+        if resp.status_code in RETRY_STATUS_CODES:
+            METRICS.counter("tfl_unavailable_total", "TFL answers that were retried (429/5xx)").inc()
+            raise TflUnavailable(f"TFL answered {resp.status_code}")
         journeys_response = json.loads(resp.text)
         min_duration = math.inf
 
-        # if we can't compute the journey let's respond with a long time. humans can then judge.
-        if "journeys" not in journeys_response:
+        if not journeys_response.get("journeys"):
+            METRICS.counter("tfl_no_route_total", "TFL answers without a journey").inc()
             self.logger.error(f"Could not find route from {start_location} to {end_location}")
-            return 120
+            return None
         for journey in journeys_response["journeys"]:
             min_duration = min(min_duration, int(journey['duration']))
         return min_duration
 
+    def close(self) -> None:
+        pass
+
     # I mean sure ... next working day could be a strike but let's assume this will not happen that often
     @staticmethod
     def _get_next_working_day_as_string() -> str:
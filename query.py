@@ -0,0 +1,43 @@
+import datetime
+
+import click
+
+from db import DbConnOrm
+from property_query import QueryError, parse_query
+
+
+@click.command()
+@click.argument("query", default="")
+@click.option("--db_name", help="Name of sqlite db", default="dream_home.db")
+@click.option("--order_by", help="Best score, lowest price or newest first", default="score",
+              type=click.Choice(["score", "price", "date"]))
+@click.option("--limit", help="Most properties to list (0 for all of them)", default=20, type=int)
+def query(query: str, db_name: str, order_by: str, limit: int):
+    """
+    Lists the stored properties matching QUERY, e.g. "score > 70 AND 'south facing' within £2200". See the README for
+    what a query can have in it. No network access needed.
+    """
+    try:
+        parsed = parse_query(query)
+    except QueryError as e:
+        raise click.BadParameter(str(e), param_hint="QUERY")
+
+    db_connector = DbConnOrm(db_name)
+    found = 0
+    for row in db_connector.query_properties(parsed, order_by, limit or None):
+        found += 1
+        stored = datetime.datetime.fromtimestamp(row.date_unix).strftime("%Y-%m-%d")
+        click.echo(f"{row.score:>3} £{row.price:<6,.0f} {row.bedrooms} bed {row.bathrooms} bath  {stored}  "
+                   f"{_url(row.source, row.property_id)}  {row.title or ''}")
+    click.echo(f"{found} properties", err=True)
+
+
+def _url(source: str, property_id: int) -> str:
+    # listings of other providers don't have a url we can build without the provider
+    if source in (None, "openrent"):
+        return f"https://www.openrent.co.uk/{property_id}"
+    return f"{source}:{property_id}"
+
+
+if __name__ == '__main__':
+    query()
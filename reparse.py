@@ -0,0 +1,94 @@
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import click
+import yaml
+
+from db import DbConnOrm
+from html_store import RawHtmlStore, read_blob
+from property_details import ORPropertyDetails
+from provider import ListingProvider, create_providers
+from search_config import Crawler, SearchConfig
+
+LOGGER: logging.Logger = logging.getLogger()
+handler = logging.FileHandler("dream_home.log")
+handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+LOGGER.addHandler(handler)
+
+# the configured providers, once per worker process. a page is parsed by the provider its property id belongs to
+_PROVIDERS: List[ListingProvider] = []
+
+
+def _init_worker(crawler_config: Crawler, provider_names: List[str]) -> None:
+    global _PROVIDERS
+    _PROVIDERS = create_providers(provider_names, crawler_config)
+
+
+def _reparse(page: Tuple[str, int, str, str, str]) -> Tuple[int, Optional[ORPropertyDetails], Optional[str]]:
+    raw_html_dir, property_id, url, sha256, codec = page
+    provider = next((provider for provider in _PROVIDERS if provider.owns(property_id)), None)
+    if provider is None:
+        return property_id, None, "none of the configured providers owns this id"
+    try:
+        return property_id, provider.parse_property_html(property_id, url, read_blob(raw_html_dir, sha256, codec)), None
+    except Exception as e:
+        return property_id, None, repr(e)
+
+
+@click.command()
+@click.option("--db_name", help="Name of sqlite db", default="dream_home.db")
+@click.option("--output", help="Write the parsed properties to this file (json lines)", default=None)
+@click.option("--update_db", default=False, is_flag=True, help="Overwrite the stored fields of existing properties")
+@click.option("--workers", help="Parser processes (defaults to the number of CPUs)", default=None, type=int)
+@click.option("--debug", default=False, is_flag=True)
+def reparse(db_name: str, output: str, update_db: bool, workers: int, debug: bool):
+    """
+    Re-runs the html parser over the latest stored page of every property. No network access needed.
+    Every page goes to the configured provider its property id belongs to, with the configured crawler.parser.
+    """
+    LOGGER.setLevel(logging.INFO)
+    if debug:
+        LOGGER.setLevel(logging.DEBUG)
+
+    with open("config.yaml", "r") as f:
+        data = yaml.safe_load(f)
+        search_config = SearchConfig.from_dict(data)
+
+    db_connector = DbConnOrm(db_name)
+    store = RawHtmlStore(db_connector.engine, search_config.storage)
+    pages = [(search_config.storage.raw_html_dir, page.property_id, page.url, page.sha256, page.codec)
+             for page in store.latest_property_pages()]
+    LOGGER.info(f"Re-parsing {len(pages)} properties")
+
+    parsed, failed, updated = 0, 0, 0
+    batch = []
+    out = open(output, "w") if output else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(search_config.crawler, search_config.providers)) as executor:
+            for property_id, details, error in executor.map(_reparse, pages, chunksize=64):
+                if error:
+                    failed += 1
+                    LOGGER.error(f"Could not parse property {property_id}: {error}")
+                    continue
+                parsed += 1
+                if out:
+                    out.write(json.dumps(details.to_dict()) + "\n")
+                if update_db:
+                    batch.append(details)
+                    if len(batch) >= 1000:
+                        updated += db_connector.update_property_details(batch)
+                        batch = []
+        if batch:
+            updated += db_connector.update_property_details(batch)
+    finally:
+        if out:
+            out.close()
+    LOGGER.info(f"Parsed {parsed} properties, {failed} failed, {updated} updated in the db")
+    click.echo(f"Parsed {parsed} properties, {failed} failed, {updated} updated in the db")
+
+
+if __name__ == '__main__':
+    reparse()
@@ -0,0 +1,73 @@
+import logging
+
+import click
+import yaml
+
+from commute_matrix import PrecomputedCommutes
+from db import DbConnOrm
+from rescoring import RescoreReport, Rescoring
+from search_config import SearchConfig
+
+LOGGER: logging.Logger = logging.getLogger()
+handler = logging.FileHandler("dream_home.log")
+handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+LOGGER.addHandler(handler)
+
+
+def _load_config(path: str) -> SearchConfig:
+    with open(path, "r") as f:
+        return SearchConfig.from_dict(yaml.safe_load(f))
+
+
+@click.command()
+@click.option("--config", help="Search config to apply", default="config.yaml")
+@click.option("--baseline", help="Search config the stored scores were computed with", default="config.yaml")
+@click.option("--db_name", help="Name of sqlite db", default="dream_home.db")
+@click.option("--update_db", default=False, is_flag=True, help="Store the new scores")
+@click.option("--chunk_size", help="Properties scored at once", default=10000, type=int)
+@click.option("--debug", default=False, is_flag=True)
+def rescore(config: str, baseline: str, db_name: str, update_db: bool, chunk_size: int, debug: bool):
+    """
+    Re-applies a search config to every stored property and reports the ones that would now cross (or drop below)
+    notify_at. No network access needed, so weights can be tuned without a new crawl.
+    """
+    LOGGER.setLevel(logging.INFO)
+    if debug:
+        LOGGER.setLevel(logging.DEBUG)
+
+    search_config = _load_config(config)
+    old_notify_at = _load_config(baseline).scoring.notify_at
+
+    db_connector = DbConnOrm(db_name)
+    commute_matrix = None
+    if search_config.tfl.commute_matrix.enabled:
+        commute_matrix = PrecomputedCommutes(db_connector.engine, search_config.tfl.commute_matrix)
+    rescoring = Rescoring(search_config, old_notify_at, commute_matrix)
+
+    report = RescoreReport()
+    for rows in db_connector.iter_scoring_inputs(chunk_size):
+        batch, scores = rescoring.rescore(rows, report)
+        if update_db:
+            db_connector.update_scores(rescoring.score_columns(batch, scores))
+
+    providers = []
+    if report.crossed or report.dropped:
+        # only for the links: ids are offset per provider and only the provider knows its urls
+        from provider import create_providers
+        providers = create_providers(search_config.providers, search_config.crawler)
+    for title, changes in (("Now above", report.crossed), ("Now below", report.dropped)):
+        click.echo(f"{title} notify_at ({search_config.scoring.notify_at}): {len(changes)}")
+        for change in sorted(changes, key=lambda c: -c.new_score):
+            click.echo(f"  {change.url(providers)} {change.old_score} -> {change.new_score}")
+            LOGGER.debug("\n".join(change.reasons))
+    for provider in providers:
+        provider.close()
+    if report.unknown_commutes:
+        click.echo(f"{report.unknown_commutes} properties have no stored commute time to some work location. "
+                   f"Rebuild the commute matrix to score their location")
+    LOGGER.info(f"Re-scored {report.rescored} properties. {len(report.crossed)} crossed notify_at, "
+                f"{len(report.dropped)} dropped below it")
+
+
+if __name__ == '__main__':
+    rescore()
@@ -0,0 +1,59 @@
+import json
+import logging
+
+import click
+
+from service_simulator import OPENRENT, SLACK, TFL, Behaviour, Simulator, SimulatorConfig, make_server
+
+LOGGER: logging.Logger = logging.getLogger()
+LOGGER.addHandler(logging.StreamHandler())
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8765, type=int)
+@click.option("--mode", type=click.Choice(["synthetic", "record", "replay"]), default="synthetic",
+              help="Make pages up, forward to the real services and keep their answers, or serve what was recorded")
+@click.option("--record_dir", default="recordings", help="Where recorded answers are kept")
+@click.option("--listings", default=200, type=int, help="Listings per search")
+@click.option("--page_size", default=20, type=int, help="Listings per search page / infinite scroll step")
+@click.option("--latency_ms", default=0., type=float, help="Added to every answer")
+@click.option("--jitter_ms", default=0., type=float, help="Latency varies by up to this much either way")
+@click.option("--error_rate", default=0., type=float, help="Share of the requests answered with a 503")
+@click.option("--openrent_rps", default=0., type=float, help="Above this OpenRent answers 429. 0 for no limit")
+@click.option("--tfl_rps", default=0., type=float, help="Above this TFL answers 429. 0 for no limit")
+@click.option("--slack_rps", default=0., type=float, help="Above this Slack answers 429. 0 for no limit")
+@click.option("--seed", default=0, type=int, help="Seed for the injected errors and latency")
+@click.option("--debug", default=False, is_flag=True)
+def run(host: str, port: int, mode: str, record_dir: str, listings: int, page_size: int, latency_ms: float,
+        jitter_ms: float, error_rate: float, openrent_rps: float, tfl_rps: float, slack_rps: float, seed: int,
+        debug: bool):
+    """
+    Local stand-in for OpenRent, TFL and Slack, for load tests and for checking how we back off.
+    Counters are served on /_stats.
+    """
+    LOGGER.setLevel(logging.DEBUG if debug else logging.INFO)
+
+    def behaviour(requests_per_second: float) -> Behaviour:
+        return Behaviour(latency_ms, jitter_ms, error_rate, requests_per_second)
+
+    simulator = Simulator(SimulatorConfig(listings_per_search=listings, page_size=page_size, mode=mode,
+                                          record_dir=record_dir, seed=seed,
+                                          behaviours={OPENRENT: behaviour(openrent_rps), TFL: behaviour(tfl_rps),
+                                                      SLACK: behaviour(slack_rps)}))
+    server = make_server(simulator, host, port)
+    base_url = f"http://{host}:{port}"
+    LOGGER.info(f"Simulating on {base_url}. Point your config at it:\n"
+                f"  crawler.base_url: {base_url}\n  tfl.base_url: {base_url}/tfl\n"
+                f"  notifications.base_url: {base_url}/slack/api/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        LOGGER.info(json.dumps(simulator.stats_summary(), indent=2))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,54 @@
+import copy
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import yaml
+
+from app import App
+from app_config import AppConfig
+from search_config import SearchConfig
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+
+
+class TestConfigReload(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.app = App(AppConfig("", "", "token", "channel", os.path.join(directory.name, "test.db")))
+        self.addCleanup(self.app.db_connector.engine.dispose)
+        with open(CONFIG) as f:
+            self.config = SearchConfig.from_dict(yaml.safe_load(f))
+        # as if a first run had built them
+        self.provider, self.slack, self.tfl, self.parse_pool = MagicMock(), MagicMock(), MagicMock(), MagicMock()
+        self.app.providers, self.app.slack, self.app.tfl = [self.provider], self.slack, self.tfl
+        self.app.parse_pool = self.parse_pool
+        self.app._close_outdated_clients(self.config)
+
+    def test_same_config_keeps_the_clients(self):
+        self.app._close_outdated_clients(copy.deepcopy(self.config))
+        self.assertEqual((self.app.providers, self.app.slack, self.app.tfl), ([self.provider], self.slack, self.tfl))
+
+    def test_changed_sections_rebuild_their_clients(self):
+        config = copy.deepcopy(self.config)
+        config.crawler.max_workers += 1
+        config.tfl.cache_ttl_hours += 1
+        self.app._close_outdated_clients(config)
+        self.provider.close.assert_called_once()
+        self.parse_pool.shutdown.assert_called_once()
+        self.tfl.close.assert_called_once()
+        self.assertEqual((self.app.providers, self.app.parse_pool, self.app.tfl), ([], None, None))
+        # notifications didn't change
+        self.assertIs(self.app.slack, self.slack)
+
+        config = copy.deepcopy(config)
+        config.notifications.digest_seconds += 1
+        self.app._close_outdated_clients(config)
+        self.slack.close.assert_called_once()
+        self.assertIsNone(self.app.slack)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import random
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+import yaml
+
+from batch_scoring import BatchScoring, PropertyBatch
+from property_details import ORPropertyDetails
+from scoring import Scoring
+from search_config import KeywordRule, SearchConfig
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+
+
+def _random_property(property_id: int, rng: random.Random) -> ORPropertyDetails:
+    return ORPropertyDetails(
+        property_id=property_id, title="", location=[], price=float(rng.randrange(1200, 3200, 25)),
+        description=rng.choice(["Lovely flat", "Flat with a Shared Garden", "communal garden and parking",
+                                "Modern flat, underfloor heating and a private garden"]),
+        available_from="", epc="C", has_garden=rng.choice([True, False, None]),
+        post_code=rng.choice(["NW10 5BU", ""]), features=[], url="", bedrooms=rng.randint(1, 4),
+        bathrooms=rng.randint(1, 3))
+
+
+class TestBatchScoring(unittest.TestCase):
+    def setUp(self) -> None:
+        with open(CONFIG) as f:
+            self.search_config = SearchConfig.from_dict(yaml.safe_load(f))
+        self.locations = self.search_config.scoring.work_locations.locations
+        rng = random.Random(42)
+        self.properties = [_random_property(property_id, rng) for property_id in range(500)]
+        self.times = [{location: rng.randint(10, 120) for location in self.locations} if p.post_code else None
+                      for p in self.properties]
+
+    def test_matches_scalar_scoring(self):
+        self._assert_matches_scalar_scoring()
+
+    def test_matches_scalar_scoring_with_keywords(self):
+        self.search_config.scoring.keywords = [
+            KeywordRule("heating", '"floor heating" OR underfloor', 3),
+            KeywordRule("private garden", "garden NEAR/2 private", 2),
+            KeywordRule("parking", "parking AND NOT modern", -4),
+        ]
+        self._assert_matches_scalar_scoring()
+
+    def test_matches_scalar_scoring_with_partial_times(self):
+        # no post code, and the stations nearby only have times for some of the work locations in the matrix
+        rng = random.Random(7)
+        self.times = [times if times else {location: rng.randint(10, 120) for location in self.locations
+                                           if rng.random() < 0.5}
+                      for times in self.times]
+        self.assertTrue(any(times and len(times) < len(self.locations) for times in self.times))
+        self._assert_matches_scalar_scoring()
+
+    def _assert_matches_scalar_scoring(self):
+        batch_scoring = BatchScoring(self.search_config)
+        batch = PropertyBatch.from_details(self.properties, self.locations, self.times,
+                                           batch_scoring.scoring.description_matcher)
+        scores = batch_scoring.score(batch)
+
+        for idx, (details, times) in enumerate(zip(self.properties, self.times)):
+            tfl = MagicMock()
+            tfl.get_best_times.side_effect = lambda start, locations: {location: times[location] for location in
+                                                                       locations}
+            commute_matrix = MagicMock()
+            commute_matrix.by_post_code.return_value = None
+            commute_matrix.by_stations.side_effect = lambda stations, location: (times or {}).get(location)
+            new_property = MagicMock()
+            new_property.property_details = details
+            total, reasons = Scoring(self.search_config, "", "", tfl, commute_matrix).compute_likeness_score(
+                new_property)
+            self.assertEqual(scores.total[idx], total)
+            self.assertEqual(batch_scoring.reasons(batch, idx), reasons)
+
+    def test_notify_mask(self):
+        batch = PropertyBatch.from_details(self.properties, self.locations, self.times)
+        batch_scoring = BatchScoring(self.search_config)
+        scores = batch_scoring.score(batch)
+        np.testing.assert_array_equal(batch_scoring.notify_mask(scores),
+                                      scores.total >= self.search_config.scoring.notify_at)
+        self.assertTrue(batch_scoring.notify_mask(scores).any())
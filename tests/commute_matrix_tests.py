@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from sqlalchemy.orm import Session
+
+from commute_matrix import CommuteMatrixBuilder, PrecomputedCommutes, district_key, station_key
+from db import DBCommuteTime, DbConnOrm
+from scoring import Scoring
+
+
+class TestPrecomputedCommutes(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        now = int(time.time())
+        with Session(self.db.engine) as session:
+            session.add_all([
+                DBCommuteTime(origin="district:NW10", destination="N1C4BE", minutes=40, built_unix=now),
+                DBCommuteTime(origin="district:NW10", destination="EC1M4AR", minutes=45, built_unix=now),
+                DBCommuteTime(origin="station:willesden green", destination="N1C4BE", minutes=25, built_unix=now),
+                DBCommuteTime(origin="station:dollis hill", destination="N1C4BE", minutes=28, built_unix=now),
+            ])
+            session.commit()
+        self.commutes = PrecomputedCommutes(self.db.engine)
+
+    def test_keys(self):
+        self.assertEqual(district_key("nw10 5bu"), "district:NW10")
+        self.assertEqual(district_key("N1 5BU"), "district:N1")
+        self.assertEqual(district_key("EC1M"), "district:EC1M")
+        self.assertEqual(station_key("Willesden Green Underground Station"), "station:willesden green")
+
+    def test_lookup_by_post_code(self):
+        self.assertEqual(self.commutes.by_post_code("NW10 5BU", "N1C 4BE"), 40)
+        self.assertIsNone(self.commutes.by_post_code("E14 5AB", "N1C 4BE"))
+        self.assertFalse(self.commutes.is_stale())
+
+    def test_lookup_by_best_station(self):
+        stations = [["Willesden Green Station", "0.5 miles"], ["Dollis Hill", "0.1 miles"], ["Nowhere", "0.1 miles"]]
+        # 25 + 10 minutes walking vs 28 + 2
+        self.assertEqual(self.commutes.by_stations(stations, "N1C 4BE"), 30)
+        self.assertIsNone(self.commutes.by_stations(stations, "EC1M 4AR"))
+
+    def test_scoring_does_not_call_tfl(self):
+        search_config = MagicMock()
+        search_config.scoring.work_locations.locations = ["N1C 4BE", "EC1M 4AR"]
+        search_config.scoring.work_locations.time_to_location_in_minutes = 50
+        search_config.scoring.work_locations.weight = 4
+        tfl = MagicMock()
+        scoring = Scoring(search_config, "", "", tfl, self.commutes)
+        self.assertEqual(scoring._get_location_score("NW10 5BU", [])[0], 4)
+        tfl.get_best_times.assert_not_called()
+
+    def test_partial_times_without_post_code_are_kept(self):
+        search_config = MagicMock()
+        search_config.scoring.work_locations.locations = ["N1C 4BE", "EC1M 4AR"]
+        search_config.scoring.work_locations.time_to_location_in_minutes = 50
+        search_config.scoring.work_locations.weight = 4
+        scoring = Scoring(search_config, "", "", MagicMock(), self.commutes)
+        stations = [["Willesden Green Station", "0.5 miles"]]
+        self.assertEqual(scoring._get_times_to_work("", stations), {"N1C 4BE": 35})
+        # the one known commute gets the whole weight
+        score, reason = scoring._get_location_score("", stations)
+        self.assertEqual(score, 4)
+        self.assertIn("* Trip time to EC1M 4AR is unknown", reason)
+        self.assertIsNone(scoring._get_times_to_work("", [["Nowhere", "0.1 miles"]]))
+
+    def test_builder_asks_the_configured_tfl(self):
+        http_client = MagicMock()
+        http_client.get.return_value.text = json.dumps({"stopPoints": [{"commonName": "Dollis Hill Station",
+                                                                         "lat": 51.5, "lon": -0.2}],
+                                                        "pageSize": 25, "total": 1})
+        builder = CommuteMatrixBuilder(self.db.engine, MagicMock(), http_client, "id", "key")
+        stations = builder._stations("http://localhost:8765/tfl/", 51.5, -0.2, 1000)
+        self.assertEqual(stations, {"station:dollis hill": (51.5, -0.2)})
+        self.assertEqual(http_client.get.call_args[0][0], "http://localhost:8765/tfl/StopPoint")
@@ -0,0 +1,34 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+import dates
+from dates import parse_available_from
+
+
+class TestAvailableFrom(unittest.TestCase):
+    def test_known_formats(self):
+        self.assertEqual(parse_available_from("Today"), str(datetime.date.today()))
+        self.assertEqual(parse_available_from(" 25 March, 2023 "), "2023-03-25")
+        self.assertEqual(parse_available_from("1 Sep 2023"), "2023-09-01")
+
+    def test_known_formats_skip_dateparser(self):
+        with patch.object(dates, "_parse_with_dateparser") as fallback:
+            parse_available_from("Today")
+            parse_available_from("3 April, 2023")
+            fallback.assert_not_called()
+
+    def test_memoized(self):
+        dates._parse_known_format.cache_clear()
+        for _ in range(3):
+            parse_available_from("4 April, 2023")
+        self.assertEqual(dates._parse_known_format.cache_info().hits, 2)
+
+    def test_unknown_strings_go_to_dateparser(self):
+        self.assertEqual(parse_available_from("2023-05-06"), "2023-05-06")
+        self.assertEqual(parse_available_from("Tomorrow"), str(datetime.date.today() + datetime.timedelta(days=1)))
+        self.assertEqual(parse_available_from("Ask the landlord"), "Ask the landlord")
+
+
+if __name__ == '__main__':
+    unittest.main()
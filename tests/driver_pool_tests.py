@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from driver_pool import ChromeDriverPool
+from search_config import Selenium
+
+
+class TestChromeDriverPool(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = patch.object(ChromeDriverPool, "_start_driver", side_effect=lambda: MagicMock())
+        self.start_driver = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = ChromeDriverPool(Selenium(pool_size=1, max_pages_per_driver=2))
+        self.addCleanup(self.pool.close)
+
+    def test_driver_is_reused(self):
+        with self.pool.driver() as first:
+            pass
+        with self.pool.driver() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(self.start_driver.call_count, 1)
+
+    def test_driver_is_recycled_after_max_pages(self):
+        for _ in range(3):
+            with self.pool.driver() as driver:
+                pass
+        self.assertEqual(self.start_driver.call_count, 2)
+        self.assertEqual(self.pool.memory_usage().keys(), {2})
+
+    def test_broken_driver_is_quit(self):
+        with self.assertRaises(ValueError):
+            with self.pool.driver() as driver:
+                raise ValueError()
+        driver.quit.assert_called_once()
+        self.assertEqual(self.pool.memory_usage(), {})
+
+    def test_closed_pool_hands_out_nothing(self):
+        with self.pool.driver() as driver:
+            pass
+        self.pool.close()
+        driver.quit.assert_called_once()
+        with self.assertRaises(RuntimeError):
+            with self.pool.driver():
+                pass
+        self.assertEqual(self.start_driver.call_count, 1)
+
+    def test_driver_started_while_closing_is_quit(self):
+        driver = MagicMock()
+
+        def start_while_closing():
+            self.pool.close()
+            return driver
+
+        self.start_driver.side_effect = start_while_closing
+        with self.assertRaises(RuntimeError):
+            with self.pool.driver():
+                pass
+        driver.quit.assert_called_once()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+from db import DbConnOrm
+from html_store import RawHtmlStore
+from search_config import Storage
+
+
+class TestRawHtmlStore(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        self.raw_html_dir = os.path.join(directory.name, "raw_html")
+        self.store = RawHtmlStore(self.db.engine, Storage(raw_html_dir=self.raw_html_dir))
+
+    def test_round_trip(self):
+        sha256 = self.store.put("https://www.openrent.co.uk/1", "<html>£1,500</html>", "property", 1)
+        self.assertEqual(self.store.get(sha256, "gzip"), "<html>£1,500</html>")
+
+    def test_identical_pages_share_a_blob(self):
+        first = self.store.put("https://www.openrent.co.uk/1", "<html>same</html>", "property", 1)
+        second = self.store.put("https://www.openrent.co.uk/2", "<html>same</html>", "property", 2)
+        self.assertEqual(first, second)
+        blobs = [name for _, _, names in os.walk(self.raw_html_dir) for name in names]
+        self.assertEqual(len(blobs), 1)
+
+    def test_latest_property_pages(self):
+        self.store.put("https://www.openrent.co.uk/1", "<html>old</html>", "property", 1)
+        newest = self.store.put("https://www.openrent.co.uk/1", "<html>new</html>", "property", 1)
+        self.store.put("https://www.openrent.co.uk/properties-to-rent/", "<html>search</html>", "search")
+        self.store.put("https://www.openrent.co.uk/2", "<html>other</html>", "property", 2)
+        pages = list(self.store.latest_property_pages())
+        self.assertEqual([page.property_id for page in pages], [1, 2])
+        self.assertEqual(pages[0].sha256, newest)
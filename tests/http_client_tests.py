@@ -0,0 +1,68 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client import HttpClient, Validators
+from search_config import Crawler
+
+
+class _Handler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers))
+        if self.path == "/flaky" and len([p for p, _ in self.requests_seen if p == "/flaky"]) < 3:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = b"<html>hello</html>"
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        _Handler.requests_seen.clear()
+        self.client = HttpClient(Crawler(requests_per_second=1000, burst=10, backoff_seconds=0.01))
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_conditional_get(self):
+        first = self.client.get(f"{self.base_url}/1")
+        self.assertEqual(first.text, "<html>hello</html>")
+        self.assertEqual(first.validators, Validators('"v1"', None))
+
+        second = self.client.get(f"{self.base_url}/1", validators=first.validators)
+        self.assertTrue(second.not_modified)
+        self.assertIsNone(second.text)
+
+    def test_negotiates_compression(self):
+        self.client.get(f"{self.base_url}/1")
+        self.assertIn("gzip", _Handler.requests_seen[0][1]["Accept-Encoding"])
+
+    def test_retries_on_5xx(self):
+        result = self.client.get(f"{self.base_url}/flaky")
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(len(_Handler.requests_seen), 3)
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CONFIG = os.path.join(ROOT, "config.yaml")
+SOURCE_DIRS = [ROOT] + [os.path.join(ROOT, "openrent", name) for name in ("", "dao", "utils", "html_parsing")]
+
+
+class TestScriptImports(unittest.TestCase):
+    def _imported(self, script: str, modules: list, then: str = "") -> list:
+        """
+        Which of the modules a fresh interpreter has loaded after importing the script (and running `then`).
+        """
+        code = f"import sys, {script}\n{then}\nprint(' '.join(m for m in {modules!r} if m in sys.modules))"
+        with tempfile.TemporaryDirectory() as directory:
+            # cwd: the scripts log to dream_home.log in the working directory
+            output = subprocess.run([sys.executable, "-c", code], cwd=directory, check=True, capture_output=True,
+                                    text=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(SOURCE_DIRS)))
+        return output.stdout.split()
+
+    def test_scripts_only_import_what_they_use(self):
+        heavy = ["dateparser", "selenium", "slack_sdk", "tfl", "bs4", "app"]
+        self.assertEqual(self._imported("main", heavy), [])
+        self.assertEqual(self._imported("rescore", heavy), [])
+        self.assertEqual(self._imported("query", heavy + ["numpy"]), [])
+        # the parsers are only loaded by its worker processes
+        self.assertEqual(self._imported("reparse", heavy), [])
+
+    def test_batch_scoring_does_not_load_the_tfl_client(self):
+        # what rescore.py builds once it has the config
+        then = f"batch_scoring.BatchScoring(search_config.SearchConfig.from_dict(yaml.safe_load(open({CONFIG!r}))))"
+        self.assertEqual(self._imported("yaml, batch_scoring, search_config", ["tfl", "tfl_helper", "requests"], then),
+                         [])
+
+
+if __name__ == '__main__':
+    unittest.main()
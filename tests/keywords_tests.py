@@ -0,0 +1,52 @@
+import unittest
+
+from keywords import KeywordExpressionError, KeywordMatcher
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    def _matches(self, expression: str, text: str) -> bool:
+        return KeywordMatcher([expression]).match(text)[0]
+
+    def test_words_and_phrases(self):
+        self.assertTrue(self._matches("modern", "A MODERN flat"))
+        self.assertFalse(self._matches("modern", "postmodern architecture, modernised kitchen"))
+        self.assertTrue(self._matches('"floor heating"', "Underfloor heating? No: floor\n heating"))
+        self.assertTrue(self._matches('"en suite"', "double bedroom with en-suite"))
+        self.assertFalse(self._matches('"floor heating"', "floor, then heating"))
+
+    def test_boolean_operators(self):
+        expression = '("floor heating" OR underfloor) AND NOT "shared garden"'
+        self.assertTrue(self._matches(expression, "underfloor heating throughout"))
+        self.assertFalse(self._matches(expression, "underfloor heating and a shared garden"))
+        self.assertFalse(self._matches(expression, "gas central heating"))
+        # a space is an AND
+        self.assertTrue(self._matches("modern furnished", "furnished and modern"))
+        self.assertFalse(self._matches("modern furnished", "modern"))
+        # NOT before AND before OR
+        self.assertTrue(self._matches("NOT pets OR garden AND parking", "pets, garden and parking"))
+
+    def test_proximity(self):
+        expression = "garden NEAR/2 private"
+        self.assertTrue(self._matches(expression, "a private garden"))
+        self.assertTrue(self._matches(expression, "the garden is private"))
+        self.assertTrue(self._matches(expression, "private south facing garden"))
+        self.assertFalse(self._matches(expression, "private parking at the back and a garden"))
+
+    def test_overlapping_terms(self):
+        matcher = KeywordMatcher(['"shared garden"', "garden", '"garden flat"', '"garden flat" AND "shared garden"'])
+        self.assertEqual(matcher.match("shared garden flat"), [True, True, True, True])
+        self.assertEqual(matcher.match("kindergarden"), [False, False, False, False])
+
+    def test_one_regex_for_every_expression(self):
+        matcher = KeywordMatcher([f'"term {idx}" OR word{idx}' for idx in range(200)])
+        self.assertEqual(len(matcher.terms), 400)
+        self.assertEqual(sum(matcher.match("has term 150 and word7")), 2)
+
+    def test_bad_expressions(self):
+        for expression in ["", "modern AND", "(modern", "modern )", "garden NEAR/2 (private)", "modern & garden"]:
+            with self.assertRaises(KeywordExpressionError, msg=expression):
+                KeywordMatcher([expression])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from metrics import MetricsRegistry
+from profiling import profiled
+from search_config import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.metrics = MetricsRegistry()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_prometheus_text(self):
+        self.metrics.counter("properties_new_total", "New properties").inc(3)
+        histogram = self.metrics.histogram("property_fetch_seconds", "Downloads", buckets=(.1, 1.))
+        for value in (.05, .1, .5, 2.):
+            histogram.observe(value)
+        lines = self.metrics.to_prometheus().splitlines()
+        self.assertIn("# TYPE dreamhome_properties_new_total counter", lines)
+        self.assertIn("dreamhome_properties_new_total 3", lines)
+        self.assertIn('dreamhome_property_fetch_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('dreamhome_property_fetch_seconds_bucket{le="1"} 3', lines)
+        self.assertIn('dreamhome_property_fetch_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("dreamhome_property_fetch_seconds_count 4", lines)
+        self.assertIn("dreamhome_property_fetch_seconds_sum 2.65", lines)
+
+    def test_quantiles(self):
+        histogram = self.metrics.histogram("scoring_seconds", buckets=(1., 2., 4.))
+        self.assertIsNone(histogram.quantile(.5))
+        for value in (.5, 1.5, 1.5, 3.):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(.5), 1.5)
+        self.assertEqual(histogram.quantile(1.), 3.)
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count, 5)
+
+    def test_write(self):
+        self.metrics.counter("notifications_total").inc()
+        with self.metrics.timer("db_write_seconds"):
+            pass
+        prometheus_file = os.path.join(self.directory, "metrics", "dream_home.prom")
+        summary_file = os.path.join(self.directory, "metrics", "summary.json")
+        self.metrics.write(prometheus_file, summary_file)
+        with open(prometheus_file) as f:
+            self.assertIn("dreamhome_notifications_total 1", f.read())
+        with open(summary_file) as f:
+            summary = json.load(f)
+        self.assertEqual(summary["counters"], {"notifications_total": 1})
+        self.assertEqual(summary["histograms"]["db_write_seconds"]["count"], 1)
+
+    def test_profiled(self):
+        profile_dir = os.path.join(self.directory, "profiles")
+        with profiled(Metrics(profile_dir=profile_dir, profile_top=5)):
+            sorted(str(value) for value in range(1000))
+        files = sorted(os.listdir(profile_dir))
+        self.assertEqual([os.path.splitext(name)[1] for name in files], [".prof", ".txt"])
+        with open(os.path.join(profile_dir, files[1])) as f:
+            report = f.read()
+        self.assertIn("Traced memory", report)
+        self.assertIn("allocations by line", report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import unittest
+
+from openrent_bs import OpenRentBeautifulSoup
+from openrent_fast import OpenRentFastExtractor
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+URL = "https://www.openrent.co.uk/1623907"
+
+
+class TestOpenRentFastExtractor(unittest.TestCase):
+    """
+    The fast extractor must return exactly what the BeautifulSoup parser returns.
+    """
+
+    def setUp(self) -> None:
+        with open(os.path.join(FIXTURES, "property.html")) as f:
+            self.html_doc = f.read()
+        self.soup_parser = OpenRentBeautifulSoup()
+        self.fast_parser = OpenRentFastExtractor()
+
+    def assertParity(self, html_doc: str):
+        expected = self.soup_parser.parse_property_soup(1623907, URL, html_doc)
+        self.assertEqual(self.fast_parser.parse_property_html(1623907, URL, html_doc), expected)
+        return expected
+
+    def test_parity(self):
+        details = self.assertParity(self.html_doc)
+        self.assertEqual(details.post_code, "NW10 5BU")
+        self.assertEqual(details.features[2], ("Garden", "yes"))
+
+    def test_parity_without_garden_or_transport(self):
+        html_doc = self.html_doc.replace('<td>Garden</td><td><i class="fa fa-check"></i></td>',
+                                         '<td>Garden</td><td><i class="fa fa-times"></i></td>')
+        start, end = html_doc.index('<div id="LocalTransport">'), html_doc.index('<a href="/comparebroadband')
+        details = self.assertParity(html_doc[:start] + html_doc[end:])
+        self.assertFalse(details.has_garden)
+        self.assertEqual(details.location, ())
+
+    def test_parity_with_markup_in_description(self):
+        html_doc = self.html_doc.replace("<p>Close to", "<pre>  keep   this  </pre>\n<p><i class=\"fa fa-check\"></i> Close to")
+        self.assertParity(html_doc)
+
+    def test_default_parser_is_fast(self):
+        self.assertEqual(self.soup_parser.parse_property_html(1623907, URL, self.html_doc),
+                         self.fast_parser.parse_property_html(1623907, URL, self.html_doc))
+        self.assertIsNotNone(self.soup_parser.fast_extractor)
@@ -0,0 +1,30 @@
+import unittest
+from unittest.mock import MagicMock
+
+from http_client import FetchResult, Validators
+from openrent_http_search import OpenRentHttpSearch
+
+
+def _page(*ids):
+    links = "".join(f'<a class="pli clearfix" href="/{property_id}">listing</a>' for property_id in ids)
+    return FetchResult("", 200, f"<html><body>{links}</body></html>", Validators())
+
+
+class TestOpenRentHttpSearch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.http_client = MagicMock()
+        self.search_config = MagicMock()
+        self.search_config.get_query_fields.side_effect = lambda: {"term": ""}
+
+    def test_yields_page_by_page_until_no_new_ids(self):
+        self.http_client.get.side_effect = [_page(1, 2), _page(2, 3), _page(3)]
+        pages = list(OpenRentHttpSearch(self.http_client).iter_property_ids(self.search_config, "NW105BU"))
+        self.assertEqual(pages, [{1, 2}, {3}])
+        self.assertIn("skip=3", self.http_client.get.call_args_list[2].args[0])
+
+    def test_uses_embedded_ids(self):
+        self.http_client.get.return_value = FetchResult("", 200, "<script>var PROPERTYIDS = [7, 8, 9];</script>",
+                                                        Validators())
+        pages = list(OpenRentHttpSearch(self.http_client).iter_property_ids(self.search_config, "NW105BU"))
+        self.assertEqual(pages, [{7, 8, 9}])
+        self.assertEqual(self.http_client.get.call_count, 1)
@@ -0,0 +1,109 @@
+import copy
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import MagicMock
+
+import yaml
+
+from db import DbConnOrm
+from http_client import FetchResult, Validators
+from openrent_bs import OpenRentBeautifulSoup
+from pipeline import Pipeline, init_parser_process
+from run_journal import DONE, RunJournal
+from scoring import Scoring
+from search_config import SearchConfig
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "property.html")
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        with open(CONFIG) as f:
+            self.search_config = SearchConfig.from_dict(yaml.safe_load(f))
+        self.search_config.crawler.parse_workers = 0
+        self.search_config.crawler.queue_size = 2
+        with open(FIXTURE) as f:
+            self.html_doc = f.read()
+
+        self.http_client = MagicMock()
+        self.http_client.get.side_effect = lambda url, validators=None, params=None: FetchResult(
+            url, 200, self.html_doc, Validators(etag='"v1"'))
+        tfl = MagicMock()
+        tfl.get_best_times.side_effect = lambda start, locations: {location: 30 for location in locations}
+        self.scoring = Scoring(self.search_config, "", "", tfl)
+        self.slack = MagicMock()
+        self.slack.notify.return_value = False
+
+    def _run(self, search_results, parse_pool=None, search_config=None):
+        search_config = search_config or self.search_config
+        openrent_bs = OpenRentBeautifulSoup(search_config.crawler, self.http_client)
+        openrent_bs.iter_property_ids = lambda search_config, location, headless: iter(search_results[location])
+        pipeline = Pipeline(search_config, [openrent_bs], self.scoring, self.slack, self.db, parse_pool)
+        return pipeline.run(list(search_results), headless=True)
+
+    def _stored_ids(self):
+        return sorted(row.property_id for chunk in self.db.iter_scoring_inputs() for row in chunk)
+
+    def test_streams_every_location_to_the_db(self):
+        stats = self._run({"NW10": [set(range(1, 8)), {8, 9}], "W1": [set(range(5, 15))]})
+        self.assertEqual(self._stored_ids(), list(range(1, 15)))
+        self.assertEqual((stats.new, stats.failed, stats.stored), (14, 0, 14))
+        self.assertFalse(RunJournal(self.db.engine, self.search_config).resumed)
+
+    def test_known_properties_are_only_rechecked(self):
+        self._run({"NW10": [{1, 2}]})
+        self.http_client.get.side_effect = lambda url, validators=None, params=None: FetchResult(
+            url, 304, None, validators) if validators else FetchResult(url, 200, self.html_doc, Validators())
+        # a new config (so a new run) that wants everything re-checked
+        search_config = copy.deepcopy(self.search_config)
+        search_config.crawler.recheck_after_hours = 0
+        stats = self._run({"NW10": [{1, 2, 3}]}, search_config=search_config)
+        self.assertEqual((stats.new, stats.rechecked, stats.changed), (1, 2, 0))
+        self.assertEqual(self._stored_ids(), [1, 2, 3])
+
+    def test_failed_properties_do_not_block_the_run(self):
+        def get(url, validators=None, params=None):
+            if url.endswith("/2"):
+                raise ConnectionError("boom")
+            return FetchResult(url, 200, self.html_doc, Validators())
+        self.http_client.get.side_effect = get
+        stats = self._run({"NW10": [{1, 2, 3}]})
+        self.assertEqual((stats.new, stats.failed), (2, 1))
+        self.assertEqual(self._stored_ids(), [1, 3])
+
+    def test_location_is_finished_when_the_sink_fails(self):
+        self.slack.notify.side_effect = RuntimeError("slack is down")
+        stats = self._run({"NW10": [{1, 2, 3}]})
+        # every item blew up in the sink, but the location was still wrapped up
+        self.assertEqual(stats.found, 3)
+
+    def test_interrupted_search_resumes(self):
+        def search(search_config, location, headless):
+            yield {1, 2}
+            raise RuntimeError("chrome died")
+        openrent_bs = OpenRentBeautifulSoup(self.search_config.crawler, self.http_client)
+        openrent_bs.iter_property_ids = search
+        pipeline = Pipeline(self.search_config, [openrent_bs], self.scoring, self.slack, self.db)
+        with self.assertRaises(RuntimeError):
+            pipeline.run(["NW10", "W1"])
+        # what was found before the crash is stored, and the location is not done
+        self.assertEqual(self._stored_ids(), [1, 2])
+        journal = RunJournal(self.db.engine, self.search_config)
+        self.assertTrue(journal.resumed)
+        self.assertNotEqual(journal.status("NW10"), DONE)
+
+        stats = self._run({"NW10": [{1, 2, 3}], "W1": [{4}]})
+        self.assertEqual(stats.new, 2)
+
+    def test_parses_on_a_process_pool(self):
+        self.search_config.crawler.parse_workers = 2
+        with ProcessPoolExecutor(2, initializer=init_parser_process, initargs=(self.search_config.crawler,)) as pool:
+            stats = self._run({"NW10": [set(range(1, 6))]}, parse_pool=pool)
+        self.assertEqual(stats.stored, 5)
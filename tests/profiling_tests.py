@@ -0,0 +1,31 @@
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+
+from profiling import profile_thread, profiled
+from search_config import Metrics
+
+
+def _busy_in_thread() -> None:
+    sum(range(1000))
+
+
+class TestProfiled(unittest.TestCase):
+    def test_threads_are_merged_into_the_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with profiled(Metrics(profile_dir=directory)):
+                thread = threading.Thread(target=profile_thread(_busy_in_thread))
+                thread.start()
+                thread.join()
+            dump = [name for name in os.listdir(directory) if name.endswith(".prof")]
+            functions = {function for _, _, function in pstats.Stats(os.path.join(directory, dump[0])).stats}
+        self.assertIn("_busy_in_thread", functions)
+
+    def test_wrapped_targets_run_when_not_profiling(self):
+        self.assertEqual(profile_thread(lambda x: x + 1)(1), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
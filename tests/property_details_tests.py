@@ -0,0 +1,60 @@
+import dataclasses
+import pickle
+import unittest
+
+from property_details import EpcRating, ORPropertyDetails
+
+
+def _details(**changes) -> ORPropertyDetails:
+    fields = dict(property_id=1, title="2 Bed Flat, Chapter Road, NW10", location=[["Willesden Junction", "0.3 mi"]],
+                  price=1850., description="Lovely flat with a private garden. " * 20, available_from="2023-03-01",
+                  epc="C", has_garden=True, post_code="NW10 5BU", features=[["Garden", "yes"], ["EPC Rating", "C"]],
+                  url="https://www.openrent.co.uk/1", bedrooms=2, bathrooms=1)
+    fields.update(changes)
+    return ORPropertyDetails(**fields)
+
+
+class TestCompactDetails(unittest.TestCase):
+    def test_description_is_compressed(self):
+        details = _details()
+        self.assertEqual(details.description, "Lovely flat with a private garden. " * 20)
+        self.assertLess(len(details.packed_description), len(details.description) // 4)
+        self.assertNotIn("Lovely", repr(details))
+
+    def test_tables_are_interned_tuples(self):
+        first, second = _details(), _details(property_id=2)
+        self.assertEqual(first.features, (("Garden", "yes"), ("EPC Rating", "C")))
+        self.assertIs(first.features[0][0], second.features[0][0])
+        self.assertIs(first.location[0][0], second.location[0][0])
+
+    def test_epc_rating(self):
+        self.assertIs(_details().epc, EpcRating.C)
+        self.assertEqual(_details().epc, "C")
+        self.assertEqual(f"{_details(epc='c').epc}", "C")
+        self.assertEqual(_details(epc="Ask agent").epc, "Ask agent")
+        self.assertIsNone(_details(epc=None).epc)
+
+    def test_frozen_but_replaceable(self):
+        details = _details()
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            details.price = 1.
+        cheaper = dataclasses.replace(details, price=1800.)
+        self.assertEqual((cheaper.price, cheaper.description), (1800., details.description))
+        self.assertEqual(dataclasses.replace(details, description="Gone").description, "Gone")
+
+    def test_to_dict(self):
+        data = _details().to_dict()
+        self.assertEqual(data["description"], "Lovely flat with a private garden. " * 20)
+        self.assertNotIn("packed_description", data)
+        self.assertEqual((data["epc"], data["features"][0]), ("C", ["Garden", "yes"]))
+        self.assertEqual(ORPropertyDetails(**data), _details())
+
+    def test_survives_pickling(self):
+        # the parse pool ships details between processes
+        details = _details()
+        self.assertEqual(pickle.loads(pickle.dumps(details)), details)
+        self.assertEqual(pickle.loads(pickle.dumps(details)).fingerprint(), details.fingerprint())
+
+
+if __name__ == '__main__':
+    unittest.main()
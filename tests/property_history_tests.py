@@ -0,0 +1,137 @@
+import dataclasses
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import text
+
+from db import DbConnOrm
+from http_client import Validators
+from openrent_bs import OpenRentBeautifulSoup
+from pipeline import Pipeline, PipelineItem
+from property_details import ORPropertyDetails
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _on(day: datetime.date) -> type:
+    class Date(datetime.date):
+        @classmethod
+        def today(cls) -> datetime.date:
+            return day
+
+    return Date
+
+
+def _details(property_id: int, price: float) -> ORPropertyDetails:
+    return ORPropertyDetails(
+        property_id=property_id, title="Flat", location=[], price=price, description="Lovely flat",
+        available_from="Today", epc="C", has_garden=False, post_code="", features=[["Garden", "no"]], url="",
+        bedrooms=2, bathrooms=1)
+
+
+def _property(details: ORPropertyDetails) -> MagicMock:
+    new_property = MagicMock()
+    new_property.property_id = details.property_id
+    new_property.property_details = details
+    new_property.score = 50
+    new_property.score_reasons = []
+    new_property.score_breakdown = None
+    new_property.validators = Validators(etag='"v1"')
+    return new_property
+
+
+class TestPropertyHistory(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+
+    def test_fingerprint_ignores_fields_that_do_not_matter(self):
+        details = _details(1, 2000.)
+        self.assertEqual(details.fingerprint(), dataclasses.replace(details, title="Other title").fingerprint())
+        self.assertNotEqual(details.fingerprint(), dataclasses.replace(details, price=1900.).fingerprint())
+
+    def test_available_today_keeps_its_fingerprint(self):
+        with open(os.path.join(FIXTURES, "property.html")) as f:
+            html_doc = f.read()
+        fingerprints = set()
+        for day in (datetime.date(2026, 3, 1), datetime.date(2026, 3, 2)):
+            with patch("datetime.date", _on(day)):
+                details = OpenRentBeautifulSoup().parse_property_soup(1, "https://www.openrent.co.uk/1", html_doc)
+                self.assertEqual(details.available_from, str(day))
+                fingerprints.add(details.fingerprint())
+        self.assertEqual(len(fingerprints), 1)
+        # still to come: the date itself is part of the content
+        self.assertNotEqual(_details(1, 2000.).fingerprint(),
+                            dataclasses.replace(_details(1, 2000.), available_from="2999-01-01").fingerprint())
+
+    def test_price_drops(self):
+        with patch("time.time", return_value=1000000):
+            self.db.upsert_properties([_property(_details(1, 2000.)), _property(_details(2, 2000.))])
+        with patch("time.time", return_value=1000000 + 3 * 24 * 3600):
+            self.db.upsert_properties([_property(_details(1, 1800.)), _property(_details(2, 2100.))])
+            # an unchanged version only moves last_seen
+            self.db.upsert_properties([_property(_details(1, 1800.))])
+            drops = self.db.price_drops(days=7)
+            self.assertEqual([(row.property_id, row.old_price, row.price) for row in drops], [(1, 2000., 1800.)])
+            self.assertEqual(self.db.price_drops(days=1)[0].property_id, 1)
+        with patch("time.time", return_value=1000000 + 30 * 24 * 3600):
+            self.assertEqual(self.db.price_drops(days=7), [])
+
+    def test_going_back_to_an_earlier_version_is_a_change(self):
+        day = 24 * 3600
+        for days, price in enumerate([2000., 1800., 2000., 1800.]):
+            with patch("time.time", return_value=1000000 + days * day):
+                self.db.upsert_properties([_property(_details(1, price))])
+        with patch("time.time", return_value=1000000 + 4 * day):
+            drops = self.db.price_drops(days=7)
+        self.assertEqual([(row.old_price, row.price, row.changed_unix) for row in drops],
+                         [(2000., 1800., 1000000 + 3 * day), (2000., 1800., 1000000 + day)])
+        with self.db.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT count(*) FROM property_history")).scalar(), 4)
+
+    def test_check_states(self):
+        self.db.upsert_properties([_property(_details(1, 2000.))])
+        state = self.db.get_check_states([1, 2])[1]
+        self.assertEqual((state.fingerprint, state.etag), (_details(1, 2000.).fingerprint(), '"v1"'))
+        self.db.mark_checked([{'property_id': 1, 'etag': '"v2"', 'last_modified': None, 'details': None}])
+        self.assertEqual(self.db.get_check_states([1])[1].etag, '"v2"')
+
+
+class TestRecheck(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pipeline = Pipeline.__new__(Pipeline)
+        self.provider = MagicMock()
+        self.pipeline.providers = [self.provider]
+        self.pipeline.dedup = None
+        self.pipeline.scoring = MagicMock()
+        self.state = MagicMock(fingerprint=_details(1, 2000.).fingerprint(), etag='"v1"', last_modified=None)
+
+    def _recheck(self, details) -> PipelineItem:
+        item = PipelineItem("NW10", 1, recheck_state=self.state, details=details, validators=Validators(etag='"v2"'))
+        self.pipeline._score(item)
+        return item
+
+    def test_not_modified_is_not_rescored(self):
+        self.provider.fetch_property_page.return_value = (None, None, Validators(etag='"v1"'))
+        item = PipelineItem("NW10", 1, recheck_state=self.state)
+        self.pipeline._fetch(item)
+        self.assertEqual(self.provider.fetch_property_page.call_args[0][2], Validators(etag='"v1"'))
+        self.pipeline._score(item)
+        self.assertTrue(item.unchanged)
+        self.pipeline.scoring.compute_score_breakdown.assert_not_called()
+
+    def test_same_content_is_not_rescored(self):
+        self.assertTrue(self._recheck(_details(1, 2000.)).unchanged)
+        self.pipeline.scoring.compute_score_breakdown.assert_not_called()
+
+    def test_changed_content_is_rescored(self):
+        item = self._recheck(_details(1, 1800.))
+        self.assertFalse(item.unchanged)
+        self.assertEqual(item.new_property.property_details.price, 1800.)
+        self.assertEqual(item.new_property.previous_fingerprint, self.state.fingerprint)
+        self.pipeline.scoring.compute_score_breakdown.assert_called_once()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import text
+
+from db import FTS_PROBE_LIMIT, DbConnOrm
+from property_details import ORPropertyDetails
+from property_query import PropertyQuery, QueryError, parse_query
+
+
+def _property(property_id: int, price: float, score: int, description: str, title: str = "Flat") -> MagicMock:
+    new_property = MagicMock()
+    new_property.property_id = property_id
+    new_property.property_details = ORPropertyDetails(
+        property_id=property_id, title=title, location=[], price=price, description=description,
+        available_from="Today", epc="C", has_garden=False, post_code="", features=[], url="", bedrooms=2, bathrooms=1)
+    new_property.score = score
+    new_property.score_reasons = []
+    new_property.score_breakdown = None
+    new_property.validators = None
+    return new_property
+
+
+class TestParseQuery(unittest.TestCase):
+    def test_conditions_and_phrases(self):
+        query = parse_query("score > 70 AND 'south facing' within £2,200 beds>=2 garden NOT \"shared garden\"",
+                            now=100 * 24 * 3600)
+        self.assertEqual(query.conditions, [("score", ">", 70.), ("price", "<=", 2200.), ("bedrooms", ">=", 2.)])
+        self.assertEqual(query.phrases, ["south facing", "garden"])
+        self.assertEqual(query.excluded_phrases, ["shared garden"])
+        self.assertEqual(query.text_match(), '"south facing" AND "garden"')
+        self.assertEqual(parse_query("within 7 days", now=100 * 24 * 3600).conditions,
+                         [("date_unix", ">=", 93 * 24 * 3600)])
+
+    def test_phrases_are_quoted_for_fts(self):
+        self.assertEqual(PropertyQuery(phrases=['say "hi"', "NEAR"]).text_match(), '"say ""hi""" AND "NEAR"')
+        self.assertIsNone(parse_query("score > 1").text_match())
+
+    def test_bad_queries(self):
+        for query in ["score > 70 &", "rent < 100", "NOT score > 3", "garden NOT"]:
+            with self.assertRaises(QueryError, msg=query):
+                parse_query(query)
+
+
+class TestQueryProperties(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        self.db.upsert_properties([
+            _property(1, 2000., 80, "A south facing garden"),
+            _property(2, 2500., 90, "South-facing balcony", title="Penthouse"),
+            _property(3, 1800., 60, "North facing, shared garden"),
+        ])
+
+    def _ids(self, query: str, order_by: str = "score") -> list:
+        return [row.property_id for row in self.db.query_properties(parse_query(query), order_by)]
+
+    def test_filters_and_order(self):
+        self.assertEqual(self._ids(""), [2, 1, 3])
+        self.assertEqual(self._ids("", order_by="price"), [3, 1, 2])
+        self.assertEqual(self._ids("score > 70 AND 'south facing' within £2200"), [1])
+        self.assertEqual(self._ids("'south facing'"), [2, 1])
+        self.assertEqual(self._ids("garden NOT 'shared garden'"), [1])
+        self.assertEqual(self._ids("penthouse"), [2])
+        self.assertEqual(list(self.db.query_properties(parse_query(""), limit=1))[0].title, "Penthouse")
+
+    def test_common_phrases_are_checked_row_by_row(self):
+        # same answer whichever way the text condition is resolved
+        with patch("db.FTS_PROBE_LIMIT", 1):
+            self.assertEqual(self._ids("score > 70 AND 'south facing' within £2200"), [1])
+            self.assertEqual(self._ids("garden", order_by="price"), [3, 1])
+        self.assertGreater(FTS_PROBE_LIMIT, 1)
+
+    def test_index_follows_updates(self):
+        self.db.upsert_properties([_property(1, 2000., 80, "Now with a roof terrace")])
+        self.assertEqual(self._ids("'south facing'"), [2])
+        self.assertEqual(self._ids("terrace"), [1])
+        self.db.update_property_details([ORPropertyDetails(
+            property_id=2, title="Penthouse", location=[], price=2500., description="Roof terrace", has_garden=False)])
+        self.assertEqual(self._ids("terrace"), [2, 1])
+        with self.db.engine.begin() as conn:
+            conn.execute(text("DELETE FROM properties WHERE property_id = 1"))
+        self.assertEqual(self._ids("terrace"), [2])
+
+    def test_within_days_keeps_the_first_stored_date(self):
+        with patch("db.time.time", return_value=time.time() - 30 * 24 * 3600):
+            self.db.upsert_properties([_property(4, 1500., 70, "Studio")])
+        self.assertEqual(self._ids("within 7 days"), [2, 1, 3])
+        # seen again today: still stored 30 days ago
+        self.db.upsert_properties([_property(4, 1400., 75, "Studio")])
+        self.assertEqual(self._ids("within 7 days"), [2, 1, 3])
+        self.assertEqual(self._ids("studio"), [4])
+
+    def test_index_built_for_existing_dbs(self):
+        with self.db.engine.begin() as conn:
+            conn.execute(text("DROP TABLE properties_fts"))
+        db = DbConnOrm(self.db.engine.url.database)
+        self.addCleanup(db.engine.dispose)
+        self.assertEqual([row.property_id for row in db.query_properties(parse_query("'south facing'"))], [2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import dataclasses
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import yaml
+
+from db import DbConnOrm
+from dedup import DedupIndex, dedup_key
+from http_client import FetchResult, Validators
+from openrent_bs import OpenRentBeautifulSoup
+from pipeline import Pipeline
+from provider import ID_RANGE, Listing, create_providers, provider_class
+from scoring import Scoring
+from search_config import Crawler, SearchConfig
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "property.html")
+# what the fixture parses into
+FIXTURE_KEY = dedup_key("2 Bed Flat, Chapter Road, NW10", "NW10 5BU", 1850.)
+
+
+class MirrorProvider(OpenRentBeautifulSoup):
+    """
+    A second site listing the same flats as OpenRent, under its own ids.
+    """
+    name = "mirror"
+    id_offset = ID_RANGE
+
+    def __init__(self, crawler_config: Crawler = None, http_client=None, html_store=None, listings=None):
+        super().__init__(crawler_config, http_client, html_store)
+        self.listings = listings or {}
+
+    def iter_listings(self, search_config, location, headless=True):
+        yield [dataclasses.replace(listing, property_id=listing.property_id + self.id_offset)
+               for listing in self.listings.get(location, [])]
+
+    def property_url(self, property_id: int) -> str:
+        return f"https://mirror.example/{property_id - self.id_offset}"
+
+    def parse_property_html(self, property_id, url, html_doc):
+        return dataclasses.replace(super().parse_property_html(property_id, url, html_doc), source=self.name)
+
+
+class TestDedupKey(unittest.TestCase):
+    def test_same_flat_written_differently(self):
+        self.assertEqual(dedup_key("2 bed flat in Chapter Rd", "nw105bu", 1849.), FIXTURE_KEY)
+        self.assertEqual(FIXTURE_KEY, "NW105BU|chapter road|1850")
+
+    def test_different_flats(self):
+        self.assertNotEqual(dedup_key("2 Bed Flat, Chapter Road, NW10", "NW10 5BU", 2200.), FIXTURE_KEY)
+        self.assertNotEqual(dedup_key("2 Bed Flat, Villiers Road, NW10", "NW10 5BU", 1850.), FIXTURE_KEY)
+
+    def test_not_enough_to_go_on(self):
+        self.assertIsNone(dedup_key("2 Bed Flat, Chapter Road", None, 1850.))
+        self.assertIsNone(dedup_key("2 Bed Flat, NW10", "NW10", 1850.))
+        self.assertIsNone(dedup_key("2 Bed Flat, Chapter Road, NW10", "NW10 5BU", None))
+
+
+class TestProviders(unittest.TestCase):
+    def test_registry(self):
+        self.assertIs(provider_class("openrent"), OpenRentBeautifulSoup)
+        self.assertIs(provider_class("provider_tests.MirrorProvider"), MirrorProvider)
+        with self.assertRaises(ValueError):
+            provider_class("zoopla")
+        with self.assertRaises(ValueError):
+            create_providers(["openrent", "openrent"], Crawler())
+
+    def test_owns(self):
+        openrent, mirror = OpenRentBeautifulSoup(), MirrorProvider()
+        self.assertTrue(openrent.owns(1623907))
+        self.assertFalse(mirror.owns(1623907))
+        self.assertTrue(mirror.owns(ID_RANGE + 1623907))
+
+
+class TestCrossProviderDedup(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        with open(CONFIG) as f:
+            self.search_config = SearchConfig.from_dict(yaml.safe_load(f))
+        self.search_config.crawler.parse_workers = 0
+        with open(FIXTURE) as f:
+            html_doc = f.read()
+        self.http_client = MagicMock()
+        self.http_client.get.side_effect = lambda url, validators=None, params=None: FetchResult(
+            url, 200, html_doc, Validators())
+        self.tfl = MagicMock()
+        self.tfl.get_best_times.side_effect = lambda start, locations: {location: 30 for location in locations}
+        self.slack = MagicMock()
+        self.slack.notify.return_value = True
+
+    def _run(self, openrent_ids, mirror_listings):
+        openrent = OpenRentBeautifulSoup(self.search_config.crawler, self.http_client)
+        openrent.iter_property_ids = lambda search_config, location, headless: iter([openrent_ids])
+        mirror = MirrorProvider(self.search_config.crawler, self.http_client, listings={"NW10": mirror_listings})
+        scoring = Scoring(self.search_config, "", "", self.tfl)
+        pipeline = Pipeline(self.search_config, [openrent, mirror], scoring, self.slack, self.db, resume=False)
+        return pipeline.run(["NW10"])
+
+    def _stored(self):
+        return [(row.property_id, row.score is not None) for chunk in self.db.iter_scoring_inputs() for row in chunk]
+
+    def test_same_flat_on_two_sites_is_scored_and_notified_once(self):
+        stats = self._run({1}, [Listing(7)])
+        self.assertEqual((stats.new, stats.duplicates, stats.notified), (1, 1, 1))
+        self.assertEqual(len(self._stored()), 1)
+        self.assertEqual(self.tfl.get_best_times.call_count, 1)
+        # both pages had to be fetched to find out
+        self.assertEqual(self.http_client.get.call_count, 2)
+        duplicate = ({1, ID_RANGE + 7} - {self._stored()[0][0]}).pop()
+        self.assertEqual(set(self.db.get_aliases([duplicate])), {duplicate})
+
+    def test_duplicate_from_the_search_results_is_not_fetched(self):
+        self._run({1}, [])
+        self.http_client.get.reset_mock()
+        stats = self._run(set(), [Listing(7, FIXTURE_KEY)])
+        self.assertEqual((stats.new, stats.duplicates), (0, 1))
+        self.http_client.get.assert_not_called()
+        self.assertEqual(self.db.get_aliases([ID_RANGE + 7]), {ID_RANGE + 7: 1})
+
+        # and next time it's a known duplicate, whatever the search results say
+        stats = self._run(set(), [Listing(7)])
+        self.assertEqual((stats.new, stats.duplicates), (0, 1))
+        self.http_client.get.assert_not_called()
+
+    def test_dedup_index_ignores_relistings_of_the_same_site(self):
+        index = DedupIndex(self.db, lambda property_id: property_id // ID_RANGE)
+        self.assertIsNone(index.claim(FIXTURE_KEY, 1))
+        self.assertIsNone(index.claim(FIXTURE_KEY, 2))
+        self.assertEqual(index.claim(FIXTURE_KEY, ID_RANGE + 7), 1)
+        self.assertIsNone(index.claim(None, ID_RANGE + 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import time
+import unittest
+
+from rate_limiter import HostRateLimiter, backoff_delay
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_backoff_prefers_retry_after(self):
+        self.assertEqual(backoff_delay(3, 2., "7"), 7.)
+
+    def test_backoff_is_exponential(self):
+        self.assertEqual(backoff_delay(0, 2.), 2.)
+        self.assertEqual(backoff_delay(3, 2., "Wed, 21 Oct 2015 07:28:00 GMT"), 16.)
+
+    def test_burst_then_rate(self):
+        limiter = HostRateLimiter(requests_per_second=20, burst=2)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.acquire("https://www.openrent.co.uk/123")
+        # 2 from the burst, the other 2 at 20/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_hosts_have_separate_budgets(self):
+        limiter = HostRateLimiter(requests_per_second=1, burst=1)
+        limiter.backoff("https://www.openrent.co.uk/1", 60)
+        start = time.monotonic()
+        limiter.acquire("https://api.tfl.gov.uk/Journey")
+        self.assertLess(time.monotonic() - start, 0.5)
@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import yaml
+
+from db import DbConnOrm
+from html_store import RawHtmlStore
+from provider import ID_RANGE
+from search_config import Storage
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SOURCE_DIRS = [ROOT] + [os.path.join(ROOT, "openrent", name) for name in ("", "dao", "utils", "html_parsing")]
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "property.html")
+
+
+# a second site for the test: says which parser setting it was created with
+FAKE_PROVIDER = """
+from property_details import ORPropertyDetails
+from provider import ID_RANGE, ListingProvider
+
+
+class FakeProvider(ListingProvider):
+    name = "fake"
+    id_offset = ID_RANGE
+
+    def __init__(self, crawler_config, html_store=None):
+        self.parser = crawler_config.parser
+
+    def parse_property_html(self, property_id, url, html_doc):
+        return ORPropertyDetails(property_id=property_id, title=self.parser, location=[], price=1., description=html_doc,
+                                 has_garden=False)
+"""
+
+
+class TestReparse(unittest.TestCase):
+    def _reparse(self, pages: list, providers: list = None, parser: str = None) -> list:
+        """
+        Runs reparse.py over the given (url, html, property_id) pages and returns what it wrote to --output.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            # reparse.py reads config.yaml from the working directory
+            with open(os.path.join(ROOT, "config.yaml")) as f:
+                config = yaml.safe_load(f)
+            config["storage"]["raw_html_dir"] = os.path.join(directory, "raw_html")
+            if providers:
+                config["providers"] = providers
+            if parser:
+                config["crawler"]["parser"] = parser
+            with open(os.path.join(directory, "config.yaml"), "w") as f:
+                yaml.safe_dump(config, f)
+            with open(os.path.join(directory, "fake_provider.py"), "w") as f:
+                f.write(FAKE_PROVIDER)
+            db = DbConnOrm(os.path.join(directory, "test.db"))
+            store = RawHtmlStore(db.engine, Storage(raw_html_dir=config["storage"]["raw_html_dir"]))
+            for url, html_doc, property_id in pages:
+                store.put(url, html_doc, "property", property_id)
+            db.engine.dispose()
+
+            subprocess.run([sys.executable, os.path.join(ROOT, "reparse.py"), "--db_name", "test.db",
+                            "--output", "parsed.jsonl", "--workers", "1"], cwd=directory, check=True,
+                           capture_output=True,
+                           env=dict(os.environ, PYTHONPATH=os.pathsep.join(SOURCE_DIRS + [directory])))
+            with open(os.path.join(directory, "parsed.jsonl")) as f:
+                return sorted((json.loads(line) for line in f), key=lambda line: line["property_id"])
+
+    def test_output_has_the_parsed_properties(self):
+        with open(FIXTURE) as f:
+            lines = self._reparse([("https://www.openrent.co.uk/1623907", f.read(), 1623907)])
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["property_id"], 1623907)
+        self.assertIn("garden", lines[0]["description"])
+        self.assertNotIn("packed_description", lines[0])
+        self.assertEqual(lines[0]["epc"], "C")
+
+    def test_pages_go_to_the_provider_that_owns_them(self):
+        with open(FIXTURE) as f:
+            pages = [("https://www.openrent.co.uk/1623907", f.read(), 1623907),
+                     ("https://fake.example/5", "<p>fake</p>", ID_RANGE + 5),
+                     ("https://nobody.example/5", "<p>nobody</p>", 2 * ID_RANGE + 5)]
+        lines = self._reparse(pages, providers=["openrent", "fake_provider.FakeProvider"], parser="beautifulsoup")
+
+        self.assertEqual([line["property_id"] for line in lines], [1623907, ID_RANGE + 5])
+        self.assertEqual(lines[0]["post_code"], "NW10 5BU")
+        self.assertEqual((lines[1]["title"], lines[1]["description"]), ("beautifulsoup", "<p>fake</p>"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import copy
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import yaml
+
+from db import DbConnOrm
+from property_details import ORPropertyDetails
+from openrent_bs import OpenRentBeautifulSoup
+from provider import ID_RANGE
+from rescoring import RescoreReport, Rescoring, ScoreChange
+from scoring import Scoring
+from search_config import Crawler, SearchConfig
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+
+
+def _details(property_id: int, has_garden: bool, post_code: str = "NW10 5BU") -> ORPropertyDetails:
+    return ORPropertyDetails(
+        property_id=property_id, title="Flat", location=[["Willesden Junction", "0.3 mi"]], price=2000.,
+        description="Lovely flat", available_from="Today", epc="C", has_garden=has_garden, post_code=post_code,
+        features=[["Garden", "yes" if has_garden else "no"]], url="", bedrooms=2, bathrooms=1)
+
+
+class TestRescoring(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_name = os.path.join(directory.name, "test.db")
+        with open(CONFIG) as f:
+            self.search_config = SearchConfig.from_dict(yaml.safe_load(f))
+        self.locations = self.search_config.scoring.work_locations.locations
+
+    def _store(self, db: DbConnOrm, all_details) -> None:
+        tfl = MagicMock()
+        tfl.get_best_times.side_effect = lambda start, locations: {location: 30 for location in locations}
+        scoring = Scoring(self.search_config, "", "", tfl)
+        properties = {}
+        for details in all_details:
+            new_property = MagicMock()
+            new_property.property_id = details.property_id
+            new_property.property_details = details
+            new_property.validators = None
+            new_property.score_breakdown = scoring.compute_score_breakdown(new_property)
+            new_property.score = new_property.score_breakdown.total
+            new_property.score_reasons = new_property.score_breakdown.reasons
+            properties[details.property_id] = new_property
+        db.insert_properties(properties)
+
+    def test_stores_inputs_and_components(self):
+        db = DbConnOrm(self.db_name)
+        self.addCleanup(db.engine.dispose)
+        self._store(db, [_details(1, True)])
+        rows = [row for chunk in db.iter_scoring_inputs() for row in chunk]
+        self.assertEqual(rows[0].times_to_work, {location: 30 for location in self.locations})
+        self.assertEqual(rows[0].location, [["Willesden Junction", "0.3 mi"]])
+
+    def test_same_config_changes_nothing(self):
+        db = DbConnOrm(self.db_name)
+        self.addCleanup(db.engine.dispose)
+        self._store(db, [_details(1, True), _details(2, False), _details(3, False, post_code="")])
+        report = RescoreReport()
+        for rows in db.iter_scoring_inputs():
+            batch, scores = Rescoring(self.search_config, self.search_config.scoring.notify_at).rescore(rows, report)
+            self.assertEqual([row.score for row in rows], list(scores.total))
+        self.assertEqual((report.rescored, report.crossed, report.dropped), (3, [], []))
+
+    def test_reports_crossed_and_dropped(self):
+        db = DbConnOrm(self.db_name)
+        self.addCleanup(db.engine.dispose)
+        self._store(db, [_details(1, True), _details(2, False)])
+        rows = [row for chunk in db.iter_scoring_inputs() for row in chunk]
+        garden, no_garden = rows
+        # the property with a garden was above the old threshold but is below the new one
+        new_config = copy.deepcopy(self.search_config)
+        new_config.scoring.notify_at = garden.score + 1
+        report = RescoreReport()
+        batch, scores = Rescoring(new_config, no_garden.score + 1).rescore(rows, report)
+        self.assertEqual([change.property_id for change in report.dropped], [1])
+        self.assertEqual(report.crossed, [])
+
+        new_config.scoring.has_garden.weight = 0
+        new_config.scoring.notify_at = 0
+        report = RescoreReport()
+        batch, scores = Rescoring(new_config, no_garden.score + 1).rescore(rows, report)
+        self.assertEqual([change.property_id for change in report.crossed], [2])
+        self.assertEqual(scores.total[0], scores.total[1])
+
+        db.update_scores(Rescoring(new_config, 0).score_columns(batch, scores))
+        rows = [row for chunk in db.iter_scoring_inputs() for row in chunk]
+        self.assertEqual([row.score for row in rows], list(scores.total))
+
+    def test_change_links_to_the_provider_of_the_id(self):
+        openrent = OpenRentBeautifulSoup(Crawler(base_url="http://localhost:8000/"))
+        other = MagicMock(owns=lambda property_id: property_id >= ID_RANGE)
+        other.property_url.side_effect = lambda property_id: f"https://other.example/{property_id - ID_RANGE}"
+        self.assertEqual(ScoreChange(7, 50, 80, []).url([openrent, other]), "http://localhost:8000/7")
+        self.assertEqual(ScoreChange(ID_RANGE + 7, 50, 80, []).url([openrent, other]), "https://other.example/7")
+        self.assertEqual(ScoreChange(ID_RANGE + 7, 50, 80, []).url([openrent]), str(ID_RANGE + 7))
+
+    def test_adds_missing_columns(self):
+        with sqlite3.connect(self.db_name) as conn:
+            conn.execute("CREATE TABLE properties (property_id INTEGER PRIMARY KEY, price INTEGER, "
+                         "available_from VARCHAR, has_garden BOOLEAN, description VARCHAR, post_code VARCHAR, "
+                         "bedrooms INTEGER, bathrooms INTEGER, score INTEGER, score_reasons VARCHAR, "
+                         "date_unix INTEGER)")
+            conn.execute("INSERT INTO properties VALUES (1, 2000, 'Today', 1, 'Lovely flat', 'NW10 5BU', 2, 1, 80, "
+                         "'', 0)")
+        conn.close()
+        db = DbConnOrm(self.db_name)
+        self.addCleanup(db.engine.dispose)
+        rows = [row for chunk in db.iter_scoring_inputs() for row in chunk]
+        self.assertEqual((rows[0].property_id, rows[0].times_to_work), (1, None))
+
+        report = RescoreReport()
+        Rescoring(self.search_config, self.search_config.scoring.notify_at).rescore(rows, report)
+        self.assertEqual(report.unknown_commutes, 1)
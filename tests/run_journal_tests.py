@@ -0,0 +1,102 @@
+import copy
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import yaml
+from sqlalchemy import text
+
+from db import DbConnOrm
+from property_details import ORPropertyDetails
+from property_writer import PropertyWriter
+from run_journal import DONE, SEARCHED, RunJournal
+from search_config import SearchConfig, Storage
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+
+
+def _property(property_id: int, price: float = 2000.) -> MagicMock:
+    new_property = MagicMock()
+    new_property.property_id = property_id
+    new_property.property_details = ORPropertyDetails(
+        property_id=property_id, title="Flat", location=[], price=price, description="", available_from="",
+        epc="C", has_garden=False, post_code="", features=[], url="", bedrooms=2, bathrooms=1)
+    new_property.score = 50
+    new_property.score_reasons = []
+    new_property.score_breakdown = None
+    new_property.validators = None
+    return new_property
+
+
+class TestRunJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        with open(CONFIG) as f:
+            self.search_config = SearchConfig.from_dict(yaml.safe_load(f))
+
+    def test_wal_mode(self):
+        with self.db.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+
+    def test_upsert_overwrites(self):
+        self.db.upsert_properties([_property(1), _property(2)])
+        self.db.upsert_properties([_property(1, price=1500.)])
+        with self.db.engine.connect() as conn:
+            rows = conn.execute(text("SELECT property_id, price FROM properties ORDER BY property_id")).all()
+        self.assertEqual([tuple(row) for row in rows], [(1, 1500), (2, 2000)])
+
+    def test_interrupted_run_is_resumed(self):
+        journal = RunJournal(self.db.engine, self.search_config)
+        journal.set_status("NW10", DONE)
+        journal.set_status("W1", SEARCHED)
+        journal.record_discovered("W1", {1, 2, 3})
+
+        resumed = RunJournal(self.db.engine, self.search_config)
+        self.assertTrue(resumed.resumed)
+        self.assertEqual((resumed.status("NW10"), resumed.status("W1"), resumed.status("E1")), (DONE, SEARCHED, None))
+        self.assertEqual(resumed.discovered("W1"), {1, 2, 3})
+
+        resumed.finish()
+        self.assertFalse(RunJournal(self.db.engine, self.search_config).resumed)
+
+    def test_finished_runs_forget_their_ids(self):
+        journal = RunJournal(self.db.engine, self.search_config)
+        journal.record_discovered("W1", {1, 2, 3})
+        journal.finish()
+        with self.db.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT count(*) FROM run_discovered")).scalar(), 0)
+
+    def test_polls_without_resume_write_nothing(self):
+        journal = RunJournal(self.db.engine, self.search_config, resume=False)
+        journal.set_status("W1", SEARCHED)
+        journal.record_discovered("W1", iter([1, 2]))
+        self.assertEqual((journal.status("W1"), journal.discovered("W1")), (SEARCHED, {1, 2}))
+        journal.finish()
+        with self.db.engine.connect() as conn:
+            counts = [conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+                      for table in ("runs", "run_locations", "run_discovered")]
+        self.assertEqual(counts, [0, 0, 0])
+
+    def test_other_config_starts_over(self):
+        RunJournal(self.db.engine, self.search_config)
+        other_config = copy.deepcopy(self.search_config)
+        other_config.scoring.notify_at += 1
+        self.assertFalse(RunJournal(self.db.engine, other_config).resumed)
+
+    def test_writer_flushes_in_batches_and_on_time(self):
+        writer = PropertyWriter(self.db, Storage(write_batch_size=2, write_flush_seconds=0.2))
+        self.addCleanup(writer.close)
+        writer.add(_property(1))
+        self.assertEqual(writer.written, 0)
+        writer.add(_property(2))
+        self.assertEqual(writer.written, 2)
+        writer.add(_property(3))
+        deadline = time.monotonic() + 5
+        while writer.written < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(writer.written, 3)
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import yaml
+
+from db import DbConnOrm
+from scheduler import AdaptiveSchedule, hour_of_week, load_config, poll_forever
+from search_config import Daemon
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+
+# a monday, 9:00 local time
+MONDAY_9AM = datetime(2024, 1, 1, 9).timestamp()
+
+
+class TestAdaptiveSchedule(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        self.config = Daemon(min_interval_minutes=10, max_interval_minutes=240, initial_interval_minutes=60,
+                             target_new_per_poll=2, ewma_alpha=0.5)
+        self.schedule = AdaptiveSchedule(self.db.engine, self.config)
+
+    def test_hour_of_week(self):
+        self.assertEqual(hour_of_week(MONDAY_9AM), 9)
+        self.assertEqual(hour_of_week(MONDAY_9AM + 24 * 3600), 33)
+
+    def test_new_locations_are_due_now(self):
+        self.schedule.set_locations(["NW10", "W1"], now=MONDAY_9AM)
+        self.schedule.record_poll("NW10", 3, now=MONDAY_9AM)
+        self.assertEqual(self.schedule.next_due(), ("W1", MONDAY_9AM))
+        self.schedule.set_locations(["NW10"], now=MONDAY_9AM)
+        self.assertEqual(self.schedule.next_due()[0], "NW10")
+
+    def test_first_poll_uses_the_initial_interval(self):
+        due = self.schedule.record_poll("NW10", 10, now=MONDAY_9AM)
+        self.assertEqual(due - MONDAY_9AM, 60 * 60)
+        self.assertEqual(self.schedule.rates, {})
+
+    def test_interval_follows_the_rate(self):
+        self.schedule.record_poll("NW10", 0, now=MONDAY_9AM)
+        # 4 listings in the half hour: 8 an hour, poll every 15 minutes for 2 of them
+        self.schedule.record_poll("NW10", 4, now=MONDAY_9AM + 1800)
+        self.assertEqual(self.schedule.rates[("NW10", 9)], (8., 1))
+        self.assertEqual(self.schedule.interval_seconds("NW10", MONDAY_9AM + 1800), 15 * 60)
+        # an hour of week we know nothing about
+        self.assertEqual(self.schedule.interval_seconds("NW10", MONDAY_9AM + 3 * 3600), 60 * 60)
+
+    def test_interval_is_clamped(self):
+        self.schedule.rates[("NW10", 9)] = (1000., 1)
+        self.assertEqual(self.schedule.interval_seconds("NW10", MONDAY_9AM), 10 * 60)
+        self.schedule.rates[("NW10", 9)] = (0., 1)
+        self.assertEqual(self.schedule.interval_seconds("NW10", MONDAY_9AM), 240 * 60)
+
+    def test_rates_are_averaged_and_persisted(self):
+        self.schedule.record_poll("NW10", 0, now=MONDAY_9AM)
+        self.schedule.record_poll("NW10", 2, now=MONDAY_9AM + 1200)
+        # a failed poll doesn't count as a quiet one
+        self.schedule.record_poll("NW10", None, now=MONDAY_9AM + 1800)
+        self.schedule.record_poll("NW10", 1, now=MONDAY_9AM + 2400)
+        self.assertEqual(self.schedule.rates[("NW10", 9)], (4.5, 2))
+        self.assertEqual(AdaptiveSchedule(self.db.engine, self.config).rates, self.schedule.rates)
+
+
+
+class TestPollForever(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        self.config_path = os.path.join(directory.name, "config.yaml")
+        self.version = 0
+
+    def _write_config(self, seed_locations: list) -> None:
+        with open(CONFIG) as f:
+            config = yaml.safe_load(f)
+        config["search_fields"]["areas"]["seed_locations"] = seed_locations
+        with open(self.config_path, "w") as f:
+            yaml.safe_dump(config, f)
+        # a new mtime even when the writes land in the same clock tick
+        self.version += 1
+        os.utime(self.config_path, (self.version, self.version))
+
+    def test_reload_to_no_locations(self):
+        self._write_config(["NW10"])
+        search_config = load_config(self.config_path)
+        stop = MagicMock(spec=threading.Event)
+        stop.is_set.return_value = False
+        app = MagicMock()
+        # the poll happens, then the config loses every location
+        app.search_properties.side_effect = lambda *args, **kwargs: self._write_config([]) or MagicMock(new=1)
+
+        def wait(seconds):
+            # nothing due: the loop only waits for the config to change. stopped on the second wait
+            self.assertEqual(seconds, search_config.daemon.reload_check_seconds)
+            stop.is_set.return_value = stop.wait.call_count > 1
+        stop.wait.side_effect = wait
+
+        poll_forever(app, AdaptiveSchedule(self.db.engine), self.config_path, search_config, stop)
+        self.assertEqual(app.search_properties.call_count, 1)
+        self.assertEqual(app.search_properties.call_args.kwargs["locations"], ["NW10"])
+        self.assertEqual(stop.wait.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,13 @@
+import os
 import unittest
 from unittest.mock import MagicMock
 
-from scoring import Scoring
+import yaml
+
+from scoring import DescriptionMatcher, Scoring
+from search_config import SearchConfig
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
 
 
 class TestScoring(unittest.TestCase):
@@ -9,19 +15,30 @@ class TestScoring(unittest.TestCase):
         self.search_criteria = MagicMock()
 
     def test_price_scoring_higher_than_sweetspot(self):
-        self.search_criteria.price_sweetspot = 100
-        self.search_criteria.price_weight = 10
+        self.search_criteria.search_fields.price.sweet_spot = 100
+        self.search_criteria.search_fields.price.weight = 10
         scoring = Scoring(self.search_criteria, "", "")
         self.assertEqual(scoring._get_price_score(125)[0], 7.5)
 
     def test_price_scoring_much_higher_than_sweetspot(self):
-        self.search_criteria.price_sweetspot = 100
-        self.search_criteria.price_weight = 10
+        self.search_criteria.search_fields.price.sweet_spot = 100
+        self.search_criteria.search_fields.price.weight = 10
         scoring = Scoring(self.search_criteria, "", "")
         self.assertEqual(scoring._get_price_score(500)[0], 0)
 
     def test_price_scoring_lower_than_sweetspot(self):
-        self.search_criteria.price_sweetspot = 100
-        self.search_criteria.price_weight = 10
+        self.search_criteria.search_fields.price.sweet_spot = 100
+        self.search_criteria.search_fields.price.weight = 10
         scoring = Scoring(self.search_criteria, "", "")
         self.assertEqual(scoring._get_price_score(50)[0], 10)
+
+
+class TestDescriptionMatcher(unittest.TestCase):
+    def test_shared_and_communal_gardens(self):
+        with open(CONFIG) as f:
+            not_private = SearchConfig.from_dict(yaml.safe_load(f)).scoring.has_garden.not_private
+        for matcher in (DescriptionMatcher(), DescriptionMatcher(not_private)):
+            for description in ["Access to communal gardens at the rear", "Shared gardens", "Shared garden",
+                                "A communal garden"]:
+                self.assertFalse(matcher.match(description)[0], msg=description)
+            self.assertTrue(matcher.match("Private garden")[0])
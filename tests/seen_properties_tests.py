@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy.orm import Session
+
+from db import DBProperty, DbConnOrm
+from seen_properties import BloomFilter, SeenProperties
+
+
+def _property(property_id: int) -> DBProperty:
+    return DBProperty(property_id=property_id, price=2000, available_from="", has_garden=False, description="",
+                      post_code="", bedrooms=2, bathrooms=1, score=50, score_reasons="", date_unix=0)
+
+
+class TestSeenProperties(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+
+    def _insert(self, property_ids) -> None:
+        with Session(self.db.engine) as session:
+            session.add_all([_property(property_id) for property_id in property_ids])
+            session.commit()
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        for item in range(0, 2000, 2):
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in range(0, 2000, 2)))
+        false_positives = sum(1 for item in range(1, 20001, 2) if item in bloom)
+        self.assertLess(false_positives, 10000 * 0.03)
+
+    def test_contains_many(self):
+        self._insert(range(1, 100))
+        seen = SeenProperties(self.db.engine)
+        self.assertEqual(seen.contains_many([5, 50, 500, 5000]), {5, 50})
+
+    def test_filter_is_persisted_and_kept_in_sync(self):
+        self._insert([1, 2])
+        seen = SeenProperties(self.db.engine)
+        self._insert([3])
+        seen.add_many([3])
+        seen.save()
+        self.assertEqual(SeenProperties(self.db.engine).contains_many([1, 2, 3, 4]), {1, 2, 3})
+
+    def test_rebuilds_when_table_changed(self):
+        SeenProperties(self.db.engine)
+        # written by someone that didn't update the filter
+        self._insert([7])
+        self.assertEqual(SeenProperties(self.db.engine).contains_many([7]), {7})
@@ -0,0 +1,79 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from http_client import HttpClient, Validators
+from openrent_bs import OpenRentBeautifulSoup
+from openrent_http_search import OpenRentHttpSearch
+from search_config import Crawler, Notifications, Tfl
+from service_simulator import OPENRENT, SLACK, TFL, Behaviour, Simulator, SimulatorConfig, make_server
+from slack_client import Slack
+from tfl_helper import TflHelper, TflUnavailable
+
+
+class TestServiceSimulator(unittest.TestCase):
+    def _serve(self, config: SimulatorConfig) -> str:
+        self.simulator = Simulator(config)
+        server = make_server(self.simulator, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def test_crawl_against_the_simulator(self):
+        base_url = self._serve(SimulatorConfig(listings_per_search=45, page_size=20))
+        crawler = Crawler(base_url=base_url, requests_per_second=1000, burst=1000)
+        http_client = HttpClient(crawler)
+        self.addCleanup(http_client.close)
+        search_config = MagicMock()
+        search_config.crawler = crawler
+        search_config.get_query_fields.side_effect = lambda: {}
+
+        pages = list(OpenRentHttpSearch(http_client, crawler).iter_property_ids(search_config, "NW10"))
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+
+        openrent_bs = OpenRentBeautifulSoup(crawler, http_client)
+        property_id = next(iter(pages[0]))
+        url = openrent_bs.property_url(property_id)
+        self.assertTrue(url.startswith(base_url))
+        details, validators = openrent_bs.fetch_property(property_id, url)
+        self.assertEqual(details.property_id, property_id)
+        self.assertTrue(details.post_code)
+        # the page didn't change: 304
+        openrent_bs.conditional_cache.clear()
+        self.assertIsNone(openrent_bs.fetch_property(property_id, url, validators)[0])
+        self.assertEqual(self.simulator.stats_summary()['services'][OPENRENT]['not_modified'], 1)
+
+    def test_tfl_and_slack(self):
+        base_url = self._serve(SimulatorConfig())
+        tfl = TflHelper("id", "key", Tfl(base_url=f"{base_url}/tfl"))
+        self.assertEqual(tfl.get_best_time("NW10 5BU", "EC1M 4AR"), tfl.get_best_time("nw105bu", "EC1M4AR"))
+
+        slack = Slack("token", "channel", Notifications(base_url=f"{base_url}/slack/api/", digest_seconds=3600))
+        slack.send_message("hello")
+        slack.close()
+        self.assertEqual(self.simulator.stats_summary()['slack_messages'], 1)
+
+    def test_rate_limits_and_errors(self):
+        base_url = self._serve(SimulatorConfig(behaviours={
+            OPENRENT: Behaviour(error_rate=1.), TFL: Behaviour(requests_per_second=.01), SLACK: Behaviour()}))
+        # 503s are retried with backoff, then given up on
+        crawler = Crawler(base_url=base_url, requests_per_second=1000, burst=1000, max_retries=2, backoff_seconds=.01)
+        http_client = HttpClient(crawler)
+        self.addCleanup(http_client.close)
+        with self.assertRaises(requests.HTTPError):
+            http_client.get(f"{base_url}/1")
+        self.assertEqual(self.simulator.stats_summary()['services'][OPENRENT]['errors'], 3)
+
+        # a 429 from TFL is retried too and never taken for "no route"
+        tfl = TflHelper("id", "key", Tfl(base_url=f"{base_url}/tfl"))
+        tfl.get_best_time("NW10 5BU", "EC1M 4AR")
+        with patch("retry.api.time.sleep"), self.assertRaises(TflUnavailable):
+            tfl.get_best_time("NW10 5BU", "N1C 4BE")
+        self.assertEqual(self.simulator.stats_summary()['services'][TFL]['rate_limited'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from slack_sdk.errors import SlackApiError
+
+from property_details import ORPropertyDetails
+from metrics import METRICS
+from search_config import Notifications
+from slack_client import Slack
+
+
+def _property(score: int) -> MagicMock:
+    target_property = MagicMock()
+    target_property.property_id = 1
+    target_property.score = score
+    target_property.score_reasons = ["* Has garden"]
+    target_property.previous_fingerprint = None
+    target_property.found_at = time.monotonic()
+    target_property.property_details = ORPropertyDetails(
+        property_id=1, title="Lovely flat", location=[], price=2000., description="x" * 5000, available_from="Today",
+        epc="C", has_garden=True, post_code="NW10 5BU", features=[], url="https://www.openrent.co.uk/1", bedrooms=2,
+        bathrooms=1)
+    return target_property
+
+
+class TestSlack(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = patch("slack_client.WebClient")
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.slack = Slack("token", "channel", Notifications(messages_per_second=1000, digest_seconds=3600))
+        self.addCleanup(self.slack.close)
+
+    def test_one_block_kit_message_per_property(self):
+        self.assertTrue(self.slack.notify(_property(80), 75))
+        self.assertFalse(self.slack.notify(_property(70), 75))
+        self.slack.flush()
+        self.assertEqual(self.client.chat_postMessage.call_count, 1)
+        kwargs = self.client.chat_postMessage.call_args.kwargs
+        self.assertNotIn("found_at", kwargs)
+        self.assertGreater(METRICS.histogram("listing_to_notification_seconds").count, 0)
+        self.assertEqual(kwargs["blocks"][0]["text"]["text"], "Lovely flat")
+        self.assertTrue(all(len(block.get("text", {}).get("text", "")) <= 3000 for block in kwargs["blocks"]))
+
+    def test_progress_messages_are_merged(self):
+        self.slack.send_message("first")
+        self.slack.send_message("second")
+        self.client.chat_postMessage.assert_not_called()
+        self.slack.flush()
+        self.client.chat_postMessage.assert_called_once()
+        self.assertEqual(self.client.chat_postMessage.call_args.kwargs["text"], "first\nsecond")
+
+    def test_retries_after_rate_limit(self):
+        response = MagicMock(status_code=429, headers={"Retry-After": "0"})
+        self.client.chat_postMessage.side_effect = [SlackApiError("ratelimited", response), None]
+        self.slack.send_message("hello")
+        self.slack.flush()
+        self.assertEqual(self.client.chat_postMessage.call_count, 2)
+
+    def test_errors_that_would_fail_again_are_not_retried(self):
+        dropped = METRICS.counter("slack_dropped_total").value
+        for status_code in (200, 403, 404):
+            response = MagicMock(status_code=status_code, headers={})
+            response.get.return_value = "channel_not_found"
+            self.client.chat_postMessage.side_effect = [SlackApiError("channel_not_found", response), None]
+            self.slack.send_message("hello")
+            self.slack.flush()
+            self.assertEqual(self.client.chat_postMessage.call_count, 1, msg=status_code)
+            self.client.chat_postMessage.reset_mock()
+        self.assertEqual(METRICS.counter("slack_dropped_total").value, dropped + 3)
+
+    def test_server_errors_are_retried(self):
+        response = MagicMock(status_code=503, headers={})
+        self.client.chat_postMessage.side_effect = [SlackApiError("unavailable", response), None]
+        with patch("slack_client.backoff_delay", return_value=0):
+            self.slack.send_message("hello")
+            self.slack.flush()
+        self.assertEqual(self.client.chat_postMessage.call_count, 2)
@@ -0,0 +1,44 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from search_config import Tfl
+from tfl_async import AsyncTflHelper
+from tfl_helper import TflHelper
+
+
+class TestAsyncTflHelper(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tfl = AsyncTflHelper("", "", Tfl(max_concurrent_requests=4))
+        self.addCleanup(self.tfl.close)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _slow_query(self, start_location, end_location, date):
+        with self.lock:
+            self.calls.append((start_location, end_location))
+        time.sleep(0.2)
+        return len(end_location)
+
+    def test_work_locations_are_queried_concurrently(self):
+        with patch.object(TflHelper, "_query_best_time", side_effect=self._slow_query):
+            start = time.monotonic()
+            times = self.tfl.get_best_times("NW10 5BU", ["N1C 4BE", "EC1M 4AR", "E14"])
+            elapsed = time.monotonic() - start
+        self.assertEqual(times, {"N1C 4BE": 7, "EC1M 4AR": 8, "E14": 3})
+        self.assertLess(elapsed, 0.5)
+
+    def test_duplicate_routes_are_coalesced(self):
+        with patch.object(TflHelper, "_query_best_time", side_effect=self._slow_query):
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                results = list(executor.map(lambda _: self.tfl.get_best_time("NW10 5BU", "N1C 4BE"), range(5)))
+        self.assertEqual(results, [7] * 5)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.tfl.coalesced, 4)
+
+    def test_errors_reach_every_waiter(self):
+        with patch.object(TflHelper, "_query_best_time", side_effect=ValueError()):
+            with self.assertRaises(ValueError):
+                self.tfl.get_best_time("NW10 5BU", "N1C 4BE")
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from db import DbConnOrm
+from search_config import Tfl
+from tfl_cache import TflJourneyCache
+from tfl_helper import NO_ROUTE_MINUTES, TflHelper
+
+
+class TestTflJourneyCache(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = DbConnOrm(os.path.join(directory.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        self.cache = TflJourneyCache(self.db.engine, Tfl(cache_max_entries=2))
+        self.tfl = TflHelper("", "", cache=self.cache)
+
+    def test_route_key_is_normalized(self):
+        self.assertEqual(TflJourneyCache.route_key("nw10 5bu", "N1C 4BE", "tube", "MON-0800"),
+                         TflJourneyCache.route_key("NW105BU", "n1c4be", "tube", "MON-0800"))
+
+    def test_second_call_is_a_hit(self):
+        with patch.object(TflHelper, "_query_best_time", return_value=35) as query:
+            self.assertEqual(self.tfl.get_best_time("NW10 5BU", "N1C 4BE"), 35)
+            self.assertEqual(self.tfl.get_best_time("nw105bu", "N1C4BE"), 35)
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual((self.cache.stats.hits, self.cache.stats.misses), (1, 1))
+
+    def test_no_route_is_cached(self):
+        with patch.object(TflHelper, "_query_best_time", return_value=None) as query:
+            self.assertEqual(self.tfl.get_best_time("NW10 5BU", "N1C 4BE"), NO_ROUTE_MINUTES)
+            self.assertEqual(self.tfl.get_best_time("NW10 5BU", "N1C 4BE"), NO_ROUTE_MINUTES)
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual(self.cache.stats.negative_hits, 1)
+
+    def test_expired_entries_are_misses(self):
+        self.cache.put("key", 10, 0.1)
+        with patch("tfl_cache.time.time", return_value=10 ** 12):
+            self.assertEqual(self.cache.get("key"), (False, None))
+
+    def test_least_recently_used_are_evicted(self):
+        with patch("tfl_cache.time.time") as now:
+            for second, key in enumerate(["a", "b", "c"]):
+                now.return_value = 1000 + second
+                self.cache.put(key, 10, 0.1)
+            now.return_value = 1010
+            self.cache.get("a")
+            self.assertEqual(self.cache.evict(), 1)
+            self.assertTrue(self.cache.get("a")[0])
+            self.assertFalse(self.cache.get("b")[0])
+
+    def test_concurrent_puts_of_the_same_route(self):
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda duration: self.cache.put("key", duration, 0.1), range(32)))
+        found, duration = self.cache.get("key")
+        self.assertTrue(found)
+        self.assertIn(duration, range(32))